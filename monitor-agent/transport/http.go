@@ -14,6 +14,10 @@ import (
 	"time"
 )
 
+// AgentVersion is reported to the host with every upload; set it at build time
+// with -ldflags "-X employeemonitoring/monitor-agent/transport.AgentVersion=1.2.3".
+var AgentVersion = "dev"
+
 type MonitoringData struct {
 	AppUsage      []map[string]interface{} `json:"app_usage"`
 	WebsiteVisits []map[string]interface{} `json:"website_visits"`
@@ -110,6 +114,24 @@ func (c *HTTPClient) SendBulkData() error {
 		return nil
 	}
 
+	// Give each activity record whose screenshot is on disk a file part of its
+	// own; the host attaches a part to the records naming it in screenshot_part
+	var parts []screenshotPart
+	for i, activityLog := range c.data.ActivityLogs {
+		delete(activityLog, "screenshot_part")
+		screenshot, ok := activityLog["screenshot"].(string)
+		if !ok || screenshot == "" {
+			continue
+		}
+		if _, err := os.Stat(screenshot); err != nil {
+			log.Printf("Screenshot file %s is not readable: %v", screenshot, err)
+			continue
+		}
+		field := fmt.Sprintf("screenshot-%d", i)
+		activityLog["screenshot_part"] = field
+		parts = append(parts, screenshotPart{field: field, path: screenshot})
+	}
+
 	// Create multipart form data
 	body := &bytes.Buffer{}
 	writer := multipart.NewWriter(body)
@@ -137,63 +159,10 @@ func (c *HTTPClient) SendBulkData() error {
 	}
 	jsonPart.Write(jsonData)
 
-	// Add screenshots
-	for _, activityLog := range c.data.ActivityLogs {
-		if screenshot, ok := activityLog["screenshot"].(string); ok && screenshot != "" {
-			// Use the filename as the form field name to match server expectations
-			filename := filepath.Base(screenshot)
-			log.Printf("Processing screenshot file: %s (full path: %s)", filename, screenshot)
-
-			// Check if file exists
-			if _, err := os.Stat(screenshot); os.IsNotExist(err) {
-				log.Printf("Screenshot file does not exist: %s", screenshot)
-				continue
-			}
-
-			file, err := os.Open(screenshot)
-			if err != nil {
-				log.Printf("Error opening screenshot file %s: %v", screenshot, err)
-				continue
-			}
-			defer file.Close()
-
-			// Get file size for logging
-			fileInfo, err := file.Stat()
-			if err == nil {
-				log.Printf("Screenshot file size: %d bytes", fileInfo.Size())
-			}
-
-			// Read file content for verification
-			fileContent, err := io.ReadAll(file)
-			if err != nil {
-				log.Printf("Error reading file content: %v", err)
-				continue
-			}
-			log.Printf("File content length: %d bytes", len(fileContent))
-
-			// Reset file pointer to beginning
-			_, err = file.Seek(0, 0)
-			if err != nil {
-				log.Printf("Error resetting file pointer: %v", err)
-				continue
-			}
-
-			// Create form file with "screenshot" as the field name
-			part, err := writer.CreateFormFile("screenshot", filepath.Base(screenshot))
-			if err != nil {
-				log.Printf("Error creating form file for %s: %v", screenshot, err)
-				continue
-			}
-
-			// Copy file content to form part
-			if _, err := io.Copy(part, file); err != nil {
-				log.Printf("Error copying file %s: %v", screenshot, err)
-				continue
-			}
-			log.Printf("Successfully attached screenshot %s to form", filename)
-
-			// Close the file explicitly
-			file.Close()
+	// Add screenshots, one file part per record naming it
+	for _, part := range parts {
+		if err := attachFile(writer, part.field, part.path); err != nil {
+			log.Printf("Error attaching screenshot %s: %v", part.path, err)
 		}
 	}
 
@@ -216,6 +185,7 @@ func (c *HTTPClient) SendBulkData() error {
 	log.Printf("Content-Type: %s", contentType)
 	req.Header.Set("Content-Type", contentType)
 	req.Header.Set("X-API-Key", c.apiKey)
+	req.Header.Set("X-Agent-Version", AgentVersion)
 
 	// Send request
 	client := &http.Client{
@@ -240,7 +210,8 @@ func (c *HTTPClient) SendBulkData() error {
 		log.Printf("Response Body: %s", string(respBody))
 	}
 
-	if resp.StatusCode != http.StatusCreated {
+	// 202: the server spooled the batch to disk and loads it shortly
+	if resp.StatusCode != http.StatusCreated && resp.StatusCode != http.StatusAccepted {
 		return fmt.Errorf("unexpected status code: %d, body: %s", resp.StatusCode, string(respBody))
 	}
 
@@ -256,6 +227,31 @@ func (c *HTTPClient) SendBulkData() error {
 	return nil
 }
 
+type screenshotPart struct {
+	field string
+	path  string
+}
+
+// attachFile streams the file at path into a new file part of the form
+func attachFile(writer *multipart.Writer, field, path string) error {
+	file, err := os.Open(path)
+	if err != nil {
+		return err
+	}
+	defer file.Close()
+
+	part, err := writer.CreateFormFile(field, filepath.Base(path))
+	if err != nil {
+		return err
+	}
+	size, err := io.Copy(part, file)
+	if err != nil {
+		return err
+	}
+	log.Printf("Attached screenshot %s (%d bytes) as %s", filepath.Base(path), size, field)
+	return nil
+}
+
 func (c *HTTPClient) SendFinalData() {
 	if err := c.SendBulkData(); err != nil {
 		log.Printf("Error sending final data: %v", err)
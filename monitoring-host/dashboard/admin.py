@@ -1,7 +1,14 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
+from django.contrib.admin.views.main import ChangeList
 from .models import BaseLog, ActivityLog, AppUsageLog, WebsiteVisitLog, FileAccessLog, USBDeviceLog
+from .loaders import LOG_DETAIL_FIELDS, attach_log_details
+
+class BaseLogChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = attach_log_details(self.result_list)
 
 @admin.register(BaseLog)
 class BaseLogAdmin(admin.ModelAdmin):
@@ -13,26 +20,17 @@ class BaseLogAdmin(admin.ModelAdmin):
     list_per_page = 50
     date_hierarchy = 'timestamp'
 
+    def get_changelist(self, request, **kwargs):
+        return BaseLogChangeList
+
     def get_details_link(self, obj):
-        # Map of log types to their model names for URL construction
-        model_map = {
-            'activity': ('activitylog', ActivityLog),
-            'app_usage': ('appusagelog', AppUsageLog),
-            'website_visit': ('websitevisitlog', WebsiteVisitLog),
-            'file_access': ('fileaccesslog', FileAccessLog),
-            'usb_device': ('usbdevicelog', USBDeviceLog),
-        }
-        
-        if obj.log_type in model_map:
-            # Get the model name and class
-            model_name, model_class = model_map[obj.log_type]
-            try:
-                specific_obj = model_class.objects.get(baselog_ptr_id=obj.id)
-                url = reverse(f'admin:dashboard_{model_name}_change', args=[specific_obj.id])
-                return format_html('<a href="{}" target="_blank">View Details</a>', url)
-            except model_class.DoesNotExist:
-                return ''
-        return ''
+        # The child rows of the whole page were loaded in one query per log type
+        # by BaseLogChangeList; the child shares its primary key with the BaseLog.
+        if getattr(obj, 'details', None) is None:
+            return ''
+        model_class = LOG_DETAIL_FIELDS[obj.log_type][0]
+        url = reverse(f'admin:dashboard_{model_class._meta.model_name}_change', args=[obj.id])
+        return format_html('<a href="{}" target="_blank">View Details</a>', url)
     get_details_link.short_description = 'Details'
 
 @admin.register(ActivityLog)
@@ -41,6 +39,7 @@ class ActivityLogAdmin(admin.ModelAdmin):
     list_filter = ('is_flagged', 'device_identifier', 'timestamp')
     search_fields = ('window_title', 'clipboard', 'analysis', 'device_identifier')
     readonly_fields = ('timestamp', 'log_type', 'colored_analysis', 'has_screenshot_link')
+    raw_id_fields = ('screenshot_blob',)
     ordering = ('-timestamp',)
     list_per_page = 50
     date_hierarchy = 'timestamp'
@@ -65,8 +64,10 @@ class ActivityLogAdmin(admin.ModelAdmin):
 @admin.register(AppUsageLog)
 class AppUsageLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'device_identifier', 'app_name', 'window_title', 'formatted_duration', 'active_status')
-    list_filter = ('is_active', 'app_name', 'device_identifier', 'timestamp')
-    search_fields = ('app_name', 'window_title', 'device_identifier')
+    list_filter = ('is_active', ('app_name', admin.RelatedOnlyFieldListFilter), 'device_identifier', 'timestamp')
+    search_fields = ('app_name__value', 'window_title__value', 'device_identifier')
+    list_select_related = ('app_name', 'window_title')
+    raw_id_fields = ('app_name', 'window_title')
     readonly_fields = ('timestamp', 'log_type', 'formatted_duration')
     ordering = ('-timestamp',)
     list_per_page = 50
@@ -90,14 +91,17 @@ class AppUsageLogAdmin(admin.ModelAdmin):
 class WebsiteVisitLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'device_identifier', 'title', 'formatted_url', 'formatted_duration')
     list_filter = ('device_identifier', 'timestamp')
-    search_fields = ('url', 'title', 'device_identifier')
+    search_fields = ('url__value', 'title__value', 'device_identifier')
+    list_select_related = ('url', 'title')
+    raw_id_fields = ('url', 'title')
     readonly_fields = ('timestamp', 'log_type', 'formatted_duration')
     ordering = ('-timestamp',)
     list_per_page = 50
     date_hierarchy = 'timestamp'
 
     def formatted_url(self, obj):
-        return format_html('<a href="{}" target="_blank">{}</a>', obj.url, obj.url[:50] + '...' if len(obj.url) > 50 else obj.url)
+        url = obj.url.value
+        return format_html('<a href="{}" target="_blank">{}</a>', url, url[:50] + '...' if len(url) > 50 else url)
     formatted_url.short_description = 'URL'
 
     def formatted_duration(self, obj):
@@ -111,8 +115,10 @@ class WebsiteVisitLogAdmin(admin.ModelAdmin):
 @admin.register(FileAccessLog)
 class FileAccessLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'device_identifier', 'file_path', 'colored_operation', 'process_name')
-    list_filter = ('operation', 'process_name', 'device_identifier', 'timestamp')
-    search_fields = ('file_path', 'process_name', 'device_identifier')
+    list_filter = ('operation', ('process_name', admin.RelatedOnlyFieldListFilter), 'device_identifier', 'timestamp')
+    search_fields = ('file_path__value', 'process_name__value', 'device_identifier')
+    list_select_related = ('file_path', 'process_name')
+    raw_id_fields = ('file_path', 'process_name')
     readonly_fields = ('timestamp', 'log_type')
     ordering = ('-timestamp',)
     list_per_page = 50
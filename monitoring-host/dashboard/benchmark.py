@@ -0,0 +1,295 @@
+import io
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .ingest import BulkIngestor
+from .models import BaseLog, LiveEvent
+from .validation import get_bulk_validator
+
+APPS = {
+    'Code': ['main.go - monitor-agent', 'views.py - monitoring-host', 'README.md'],
+    'firefox': ['Inbox - Mail', 'Pull requests', 'Quarterly report - Docs'],
+    'Slack': ['#general', '#engineering', 'Direct message'],
+    'Terminal': ['bash', 'htop', 'ssh build-01'],
+    'Excel': ['budget.xlsx', 'salaries.xlsx'],
+    'Zoom': ['Weekly sync'],
+}
+SITES = [
+    ('https://github.com/pulls', 'Pull requests'),
+    ('https://mail.example.com/inbox', 'Inbox - Mail'),
+    ('https://docs.example.com/d/quarterly', 'Quarterly report - Docs'),
+    ('https://news.ycombinator.com/', 'Hacker News'),
+    ('https://www.youtube.com/watch', 'YouTube'),
+    ('https://drive.example.com/export', 'Export - Drive'),
+]
+USB_DEVICES = [
+    ('SanDisk Ultra', '0781', '5581'),
+    ('Logitech Receiver', '046d', 'c52b'),
+    ('Kingston DataTraveler', '0951', '1666'),
+]
+KEYWORDS = ['salary', 'confidential', 'export', 'password', 'resume', 'offer']
+
+# Mean records one agent queues between two sends: app switches, website
+# visits, files, USB events and screenshot activity
+RECORDS_PER_SEND = 5 + 3 + 2 + 0.05 + 0.5
+
+
+class FleetGenerator:
+    """
+    Synthetic fleet of agents producing the payloads of transport.HTTPClient.
+
+    Each send holds what a device's monitors queued since the previous one:
+    app switches and website visits with their durations, files touched,
+    screenshot activity records and, like the agent, only the latest USB
+    event. Every record carries the device identifier and an RFC 3339
+    timestamp, and so does the payload. USB events use the field names the
+    server validates (``name`` as an alias of ``device_name``).
+    """
+
+    def __init__(self, devices=50, seed=0):
+        self.devices = [f'bench-{number:05d}' for number in range(devices)]
+        self.rng = random.Random(seed)
+
+    def payload(self, device, when):
+        rng = self.rng
+        stamp = {'device_identifier': device, 'timestamp': when.strftime('%Y-%m-%dT%H:%M:%SZ')}
+        app_usage = []
+        for _ in range(rng.randint(2, 8)):
+            app = rng.choice(list(APPS))
+            app_usage.append(dict(stamp, app_name=app, window_title=rng.choice(APPS[app]),
+                                  duration=rng.randint(1, 900), is_active=rng.random() < 0.8))
+        website_visits = [
+            dict(stamp, url=url, title=title, duration=rng.randint(1, 600))
+            for url, title in rng.choices(SITES, k=rng.randint(1, 5))
+        ]
+        file_access = [
+            dict(stamp, file_path=f'/home/{device}/Documents/file-{rng.randint(0, 500)}.txt',
+                 operation='read', process_name='unknown')
+            for _ in range(rng.randint(0, 4))
+        ]
+        usb_devices = []
+        if rng.random() < 0.05:
+            name, vendor_id, product_id = rng.choice(USB_DEVICES)
+            usb_devices.append(dict(stamp, name=name, vendor_id=vendor_id, product_id=product_id,
+                                    serial_number=f'SN{rng.randint(0, 99999):05d}',
+                                    action=rng.choice(['connected', 'disconnected'])))
+        activity_logs = []
+        if rng.random() < 0.5:
+            flagged = rng.random() < 0.1
+            keywords = rng.sample(KEYWORDS, rng.randint(1, 3)) if flagged else []
+            activity_logs.append(dict(stamp, window_title=rng.choice(APPS[rng.choice(list(APPS))]), clipboard='',
+                                      screenshot=f'/tmp/screenshots/{device}-{when:%H%M%S}.png',
+                                      analysis='Sensitive content on screen' if flagged else 'Routine work',
+                                      is_flagged=flagged, keywords=keywords,
+                                      confidence=round(rng.uniform(0.6, 0.99) if flagged else rng.random() / 2, 2)))
+        return {
+            'app_usage': app_usage,
+            'website_visits': website_visits,
+            'file_access': file_access,
+            'usb_devices': usb_devices,
+            'activity_logs': activity_logs,
+            'device_identifier': device,
+        }
+
+    def sends(self, when=None):
+        """One payload from each device, in a shuffled order"""
+        when = when or timezone.now()
+        devices = list(self.devices)
+        self.rng.shuffle(devices)
+        return [self.payload(device, when) for device in devices]
+
+
+def payload_rows(payload):
+    return sum(len(records) for records in payload.values() if isinstance(records, list))
+
+
+def parse_size(value):
+    """'10k' -> 10000, '1m' -> 1000000"""
+    value = value.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def seed_logs(generator, rows, days=7, chunk_rows=5000, now=None):
+    """
+    Ingest the fleet's history until the log tables hold ``rows`` rows.
+
+    The sends are spread over the ``days`` before ``now`` and written through
+    BulkIngestor with the clock set to their time, so the rollups, search
+    documents and device registry match what live ingest would have built.
+    Consecutive sends are ingested together, about ``chunk_rows`` rows at a
+    time sharing one timestamp: rollup upserts cost per key, and a chunk
+    updates the same keys as a single send. Returns ``(rows written, seconds)``.
+    """
+    now = now or timezone.now()
+    missing = rows - BaseLog.objects.count()
+    if missing <= 0:
+        return 0, 0.0
+    rows_per_send = RECORDS_PER_SEND * len(generator.devices)
+    sends_per_chunk = max(1, round(chunk_rows / rows_per_send))
+    chunks = max(1, int(missing / (rows_per_send * sends_per_chunk)))
+    interval = timedelta(days=days) / chunks
+    when = now - timedelta(days=days)
+    validator = get_bulk_validator()
+    ingestor = BulkIngestor(agent_version='benchmark')
+    written = 0
+    started = time.perf_counter()
+    while written < missing:
+        merged = defaultdict(list)
+        for send in range(sends_per_chunk):
+            for payload in generator.sends(when + interval * send / sends_per_chunk):
+                for key, records in payload.items():
+                    if isinstance(records, list):
+                        merged[key] += records
+        left = missing - written
+        for key in merged:
+            merged[key], left = merged[key][:left], max(0, left - len(merged[key]))
+        # Logs are stamped explicitly, like the spool loader does; the patched clock covers the rest
+        validated = validator.validate(dict(merged))
+        validated = {key: [dict(record, timestamp=when) for record in records] for key, records in validated.items()}
+        with mock.patch('django.utils.timezone.now', return_value=when):
+            logs = ingestor.ingest(validated)
+        written += sum(len(rows) for rows in logs.values())
+        when = min(when + interval, now)
+    # Nobody streamed the seeding's live events
+    LiveEvent.objects.all().delete()
+    return written, time.perf_counter() - started
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(request, requests, concurrency=1):
+    """
+    Run ``request(client, number)`` ``requests`` times from ``concurrency`` threads.
+
+    ``request`` returns the response and the number of log rows it wrote.
+    Returns the latency percentiles in milliseconds, the mean number of
+    queries per request, the error count and the rows and requests per second.
+    """
+    latencies = []
+    queries = []
+    errors = []
+    rows = []
+    lock = threading.Lock()
+
+    def worker(numbers):
+        client = Client()
+        try:
+            for number in numbers:
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response, written = request(client, number)
+                    elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(len(captured))
+                    rows.append(written)
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        worker(range(requests))
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(worker, range(offset, requests, concurrency)) for offset in range(concurrency)]:
+                future.result()
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'latency_ms': {
+            'p50': _ms(percentile(ordered, 0.50)),
+            'p95': _ms(percentile(ordered, 0.95)),
+            'p99': _ms(percentile(ordered, 0.99)),
+            'mean': _ms(sum(ordered) / len(ordered)) if ordered else None,
+        },
+        'queries_per_request': round(sum(queries) / len(queries), 1) if queries else None,
+        'rows_per_second': round(sum(rows) / wall, 1) if wall and sum(rows) else None,
+        'requests_per_second': round(len(latencies) / wall, 1) if wall else None,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def bulk_request(generator, screenshots=()):
+    """Request function POSTing one agent send to bulk_ingest_view, multipart like the agent"""
+    lock = threading.Lock()
+
+    def request(client, number):
+        with lock:
+            payload = generator.payload(generator.devices[number % len(generator.devices)], timezone.now())
+        form = {}
+        if screenshots:
+            # One file part per activity record, named by the record like the agent does
+            for index, record in enumerate(payload['activity_logs']):
+                image = io.BytesIO(screenshots[(number + index) % len(screenshots)])
+                image.name = f'screenshot-{number}-{index}.png'
+                part = f'screenshot-{index}'
+                record['screenshot_part'] = part
+                form[part] = image
+        form['data'] = json.dumps(payload)
+        response = client.post('/api/bulk/', form, secure=True, headers={'X-Agent-Version': 'benchmark'})
+        # 202: accepted into the ingest spool
+        return response, payload_rows(payload) if response.status_code in (201, 202) else 0
+
+    return request
+
+
+def page_request(paths):
+    """Request function GETting ``paths`` in turn"""
+    def request(client, number):
+        return client.get(paths[number % len(paths)], secure=True), 0
+    return request
+
+
+def explorer_paths(device):
+    today = timezone.now().date()
+    return [
+        '/logs/',
+        '/logs/?log_type=app_usage',
+        f'/logs/?date_from={today - timedelta(days=1)}&date_to={today}',
+        '/logs/?flagged_only=true',
+        '/logs/?keyword=salary',
+        f'/logs/?keyword={device}&sort=device_identifier',
+    ]
+
+
+def compare(previous, current):
+    """(scenario, dataset rows, p95 before, p95 after, rows/s before, rows/s after) for matching scenarios"""
+    before = {(result['scenario'], result['dataset_rows']): result for result in previous['results']}
+    rows = []
+    for result in current['results']:
+        old = before.get((result['scenario'], result['dataset_rows']))
+        if old:
+            rows.append((
+                result['scenario'], result['dataset_rows'],
+                old.get('latency_ms', {}).get('p95'), result.get('latency_ms', {}).get('p95'),
+                old['rows_per_second'], result['rows_per_second'],
+            ))
+    return rows
@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import AppUsageLog, FileAccessLog, WebsiteVisitLog
+
+# Log model -> its fields stored as ids of a dimension table (see models.Dimension)
+DIMENSION_FIELDS = {
+    AppUsageLog: ('app_name', 'window_title'),
+    WebsiteVisitLog: ('url', 'title'),
+    FileAccessLog: ('file_path', 'process_name'),
+}
+
+# Values per lookup query, below SQLite's limit on query parameters
+LOOKUP_BATCH_SIZE = 500
+
+
+class InternCache:
+    """
+    Bounded least-recently-used map of (dimension model, value) to row id.
+
+    One per worker process, shared by its threads. Dimension rows are never
+    deleted, so an entry never goes stale; the least recently used ones are
+    dropped beyond ``maxsize`` entries (0 disables the cache).
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.ids = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model, values):
+        """``{value: id}`` for the ``values`` of ``model`` in the cache"""
+        found = {}
+        with self.lock:
+            for value in values:
+                key = (model, value)
+                pk = self.ids.get(key)
+                if pk is not None:
+                    self.ids.move_to_end(key)
+                    found[value] = pk
+            self.hits += len(found)
+            self.misses += len(values) - len(found)
+        return found
+
+    def set_many(self, model, ids):
+        with self.lock:
+            for value, pk in ids.items():
+                self.ids[(model, value)] = pk
+                self.ids.move_to_end((model, value))
+            while len(self.ids) > self.maxsize:
+                self.ids.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.ids.clear()
+            self.hits = self.misses = 0
+
+
+_cache = None
+
+
+def get_intern_cache():
+    global _cache
+    if _cache is None:
+        _cache = InternCache(settings.DIMENSION_CACHE_SIZE)
+    return _cache
+
+
+def intern(model, values):
+    """
+    Rows of the dimension ``model`` for ``values``, created as needed: ``{value: instance}``.
+
+    Ids are served from the worker's cache. The misses are looked up in one
+    query per few hundred values, and the strings seen for the first time
+    inserted with a single INSERT ... ON CONFLICT DO NOTHING and read back,
+    so workers interning the same new string concurrently share one row.
+    Misses enter the cache only once the transaction commits: a rolled back
+    insert must not leave an id behind that names nothing.
+    """
+    values = set(values)
+    cache = get_intern_cache()
+    ids = cache.get_many(model, values)
+    missing = sorted(values - ids.keys())
+    if missing:
+        found = _lookup(model, missing)
+        new = [value for value in missing if value not in found]
+        if new:
+            model.objects.bulk_create([model(value=value) for value in new], ignore_conflicts=True)
+            found.update(_lookup(model, new))
+        ids.update(found)
+        transaction.on_commit(partial(cache.set_many, model, found))
+    return {value: model(pk=ids[value], value=value) for value in values}
+
+
+def _lookup(model, values):
+    ids = {}
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        ids.update(model.objects.filter(value__in=values[start:start + LOOKUP_BATCH_SIZE]).values_list('value', 'pk'))
+    return ids
+
+
+def intern_records(model, records):
+    """Copies of the validated ``records`` of ``model`` with their dimension strings replaced by rows"""
+    fields = DIMENSION_FIELDS.get(model)
+    if not fields or not records:
+        return records
+    rows = {
+        field: intern(
+            model._meta.get_field(field).related_model,
+            [record[field] for record in records if field in record],
+        )
+        for field in fields
+    }
+    return [
+        {**record, **{field: rows[field][record[field]] for field in fields if field in record}}
+        for record in records
+    ]
+
+
+def value_lookups(model, fields):
+    """``fields`` of ``model`` as values()/values_list() lookups reading the strings behind dimension ids"""
+    dimensions = DIMENSION_FIELDS.get(model, ())
+    return [f'{field}__value' if field in dimensions else field for field in fields]
+
+
+def dimension_values(model, ids):
+    """``{id: value}`` of the dimension rows ``ids``"""
+    return dict(model.objects.filter(pk__in=set(ids)).values_list('pk', 'value'))
+
+
+async def adimension_values(model, ids):
+    return {pk: value async for pk, value in model.objects.filter(pk__in=set(ids)).values_list('pk', 'value')}
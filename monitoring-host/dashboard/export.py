@@ -0,0 +1,209 @@
+import logging
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional, only needed for exports
+    pyarrow = None
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .dimensions import value_lookups
+from .models import ActivityLog, AppUsageLog, WebsiteVisitLog, FileAccessLog, USBDeviceLog
+from .partitions import prune_by_time
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+COMMON_COLUMNS = ['id', 'timestamp', 'device_identifier', 'log_type', 'description']
+
+# BaseLog.log_type -> child model and the columns it fills; columns shared by
+# several types (window_title, duration) hold the same kind of value
+EXPORT_COLUMNS = {
+    'activity': (ActivityLog, ['window_title', 'clipboard', 'screenshot', 'is_flagged', 'confidence', 'analysis', 'keywords']),
+    'app_usage': (AppUsageLog, ['app_name', 'window_title', 'duration', 'is_active', 'ended_at', 'samples']),
+    'website_visit': (WebsiteVisitLog, ['url', 'title', 'duration', 'ended_at', 'samples']),
+    'file_access': (FileAccessLog, ['file_path', 'operation', 'process_name']),
+    'usb_device': (USBDeviceLog, ['device_name', 'vendor_id', 'product_id', 'serial_number', 'action']),
+}
+
+
+class ExportUnavailable(Exception):
+    """Raised when the optional pyarrow package is missing"""
+
+
+def export_schema():
+    """One wide schema for every log type; the columns of other types are null"""
+    types = {
+        'id': pyarrow.int64(),
+        'timestamp': pyarrow.timestamp('us', tz='UTC'),
+        'is_flagged': pyarrow.bool_(),
+        'is_active': pyarrow.bool_(),
+        'confidence': pyarrow.float64(),
+        'duration': pyarrow.int64(),
+        'ended_at': pyarrow.timestamp('us', tz='UTC'),
+        'samples': pyarrow.int64(),
+        'keywords': pyarrow.list_(pyarrow.string()),
+    }
+    names = list(COMMON_COLUMNS)
+    for _, columns in EXPORT_COLUMNS.values():
+        names += [name for name in columns if name not in names]
+    return pyarrow.schema([(name, types.get(name, pyarrow.string())) for name in names])
+
+
+def parse_bound(value, end=False):
+    """
+    Datetime for a ``since``/``until`` argument: an ISO datetime, or a date
+    meaning its midnight (UTC), or the next midnight when it ends a range.
+    """
+    if not value:
+        return None
+    day = parse_date(value) if len(value) == 10 else None
+    if day is not None:
+        bound = datetime.combine(day + timedelta(days=1) if end else day, dt_time.min)
+    else:
+        bound = parse_datetime(value)
+        if bound is None:
+            raise ValueError(f"Invalid date or datetime: {value!r}")
+    if timezone.is_naive(bound):
+        bound = timezone.make_aware(bound, dt_timezone.utc)
+    return bound
+
+
+class StreamSink:
+    """Write-only file object handing out what the Arrow writers wrote since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class LogExporter:
+    """
+    Columnar export of the logs in [since, until), for a set of devices and log types.
+
+    Each log type is read from its child table with a server-side cursor and
+    turned into record batches of ``batch_size`` rows, so at most one batch
+    is ever held in memory whatever the size of the range. Batches are
+    written as Parquet row groups or as Arrow IPC stream messages.
+    """
+
+    def __init__(self, since=None, until=None, device_identifiers=None, log_types=None, batch_size=10000):
+        if pyarrow is None:
+            raise ExportUnavailable("Exports need the 'pyarrow' package on the server")
+        unknown = set(log_types or ()) - set(EXPORT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown log types: {', '.join(sorted(unknown))}")
+        self.since = since
+        self.until = until
+        self.device_identifiers = device_identifiers
+        self.log_types = list(log_types or EXPORT_COLUMNS)
+        self.batch_size = batch_size
+        self.schema = export_schema()
+        self.rows = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def querysets(self):
+        querysets = []
+        for log_type in self.log_types:
+            model, columns = EXPORT_COLUMNS[log_type]
+            queryset = model.objects.all()
+            if self.since:
+                queryset = queryset.filter(timestamp__gte=self.since)
+            if self.until:
+                queryset = queryset.filter(timestamp__lt=self.until)
+            if self.device_identifiers:
+                queryset = queryset.filter(device_identifier__in=self.device_identifiers)
+            querysets.append(queryset)
+        querysets = prune_by_time(querysets, self.since, self.until)
+        return [
+            (log_type, queryset.order_by('pk').values_list(*COMMON_COLUMNS, *value_lookups(*EXPORT_COLUMNS[log_type])))
+            for log_type, queryset in zip(self.log_types, querysets)
+        ]
+
+    def batches(self):
+        """Yield RecordBatches of at most ``batch_size`` rows, one log type at a time"""
+        for log_type, rows in self.querysets():
+            names = [*COMMON_COLUMNS, *EXPORT_COLUMNS[log_type][1]]
+            batch = []
+            for row in rows.iterator(chunk_size=self.batch_size):
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    yield self.record_batch(names, batch)
+                    batch = []
+            if batch:
+                yield self.record_batch(names, batch)
+
+    def record_batch(self, names, rows):
+        columns = dict(zip(names, zip(*rows)))
+        arrays = [
+            pyarrow.array(columns[field.name], type=field.type) if field.name in columns
+            else pyarrow.nulls(len(rows), type=field.type)
+            for field in self.schema
+        ]
+        self.rows += len(rows)
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def open_writer(self, sink, fmt):
+        if fmt == 'parquet':
+            return pyarrow.parquet.ParquetWriter(sink, self.schema, compression='zstd')
+        if fmt == 'arrow':
+            return pyarrow.ipc.new_stream(sink, self.schema)
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    def write(self, path, fmt='parquet'):
+        """Export to the file at ``path``; returns the number of rows written"""
+        started = time.perf_counter()
+        with self.open_writer(path, fmt) as writer:
+            for batch in self.batches():
+                writer.write_batch(batch)
+        self.seconds = time.perf_counter() - started
+        return self.rows
+
+    def stream(self, fmt='parquet'):
+        """Yield the encoded export piece by piece, one batch's worth at a time"""
+        started = time.perf_counter()
+        sink = StreamSink()
+        writer = self.open_writer(sink, fmt)
+        for batch in self.batches():
+            writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+        writer.close()
+        yield sink.drain()
+        self.seconds = time.perf_counter() - started
+        logger.info("Exported %d rows as %s in %.1fs (%.0f rows/s)", self.rows, fmt, self.seconds, self.rows_per_second)
@@ -0,0 +1,136 @@
+import logging
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import BaseLog
+
+logger = logging.getLogger(__name__)
+
+ALL_LOG_TYPES = tuple(log_type for log_type, _ in BaseLog.LOG_TYPES)
+
+
+def get_cache():
+    return caches[settings.DASHBOARD_CACHE_ALIAS]
+
+
+def _generation_key(log_type):
+    return f'dashboard:generation:{log_type}'
+
+
+def bump_generations(log_types):
+    """
+    Invalidate the cached sections that depend on ``log_types``.
+
+    Every bump stores a new random generation instead of incrementing the
+    old one: ``set`` is atomic on every cache backend, while the database
+    and file caches implement ``incr`` as a read then a write, so two
+    concurrent bumps could store the same generation and keep a section
+    computed between them.
+    """
+    generations = {_generation_key(log_type): secrets.token_hex(6) for log_type in set(log_types)}
+    get_cache().set_many(generations, timeout=None)
+
+
+def bump_generations_on_commit(log_types):
+    """bump_generations once the current transaction commits, so readers never cache the old rows again"""
+    log_types = set(log_types)
+    if log_types:
+        transaction.on_commit(lambda: bump_generations(log_types))
+
+
+def current_generations(log_types):
+    cache = get_cache()
+    keys = [_generation_key(log_type) for log_type in log_types]
+    generations = cache.get_many(keys)
+    return '.'.join(str(generations.get(key, 0)) for key in keys)
+
+
+class CachedSection:
+    """
+    One dashboard section cached under the generations of the log types it reads.
+
+    A write to any of those log types bumps its generation and so moves the
+    section to a new key; otherwise the value expires after ``ttl`` seconds
+    (DASHBOARD_CACHE_TTL when None).
+    On a miss, only the caller that wins a ``cache.add`` lock computes the
+    value. The others are served the previous value while it is recomputed,
+    or wait for the winner when there is none. FileBasedCache's ``add`` is
+    not atomic, so threads of one process also take a local lock first.
+    """
+
+    def __init__(self, compute, log_types, ttl=None, lock_timeout=30, poll_interval=0.05):
+        self.compute = compute
+        self.name = compute.__name__
+        self.log_types = tuple(sorted(log_types))
+        self.default_ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._local_lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        if not settings.DASHBOARD_CACHE_TTL:
+            return 0
+        default = self.default_ttl if self.default_ttl is not None else settings.DASHBOARD_CACHE_TTL
+        return settings.DASHBOARD_CACHE_TTLS.get(self.name, default)
+
+    def __call__(self):
+        ttl = self.ttl
+        if not ttl:
+            return self.compute()
+
+        cache = get_cache()
+        key = f'dashboard:section:{self.name}:{current_generations(self.log_types)}'
+        latest_key = f'dashboard:section:{self.name}:latest'
+        lock_key = f'{key}:lock'
+        missing = object()
+
+        value = cache.get(key, missing)
+        if value is not missing:
+            return value
+
+        deadline = time.monotonic() + self.lock_timeout
+        locked = self._lock(cache, lock_key)
+        while not locked:
+            stale = cache.get(latest_key, missing)
+            if stale is not missing:
+                return stale
+            time.sleep(self.poll_interval)
+            value = cache.get(key, missing)
+            if value is not missing:
+                return value
+            if time.monotonic() > deadline:
+                logger.warning("Gave up waiting for dashboard section %s, computing it again", self.name)
+                break
+            locked = self._lock(cache, lock_key)
+
+        try:
+            value = self.compute()
+            cache.set(key, value, timeout=ttl)
+            # Outlives the section so concurrent viewers have something to show during recomputes
+            cache.set(latest_key, value, timeout=ttl * 10)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+                self._local_lock.release()
+        return value
+
+    def _lock(self, cache, lock_key):
+        if not self._local_lock.acquire(blocking=False):
+            return False
+        if cache.add(lock_key, True, timeout=self.lock_timeout):
+            return True
+        self._local_lock.release()
+        return False
+
+
+def cached_section(log_types=ALL_LOG_TYPES, ttl=None):
+    """Cache the decorated dashboard section; see CachedSection"""
+    def decorator(compute):
+        return CachedSection(compute, log_types, ttl)
+    return decorator
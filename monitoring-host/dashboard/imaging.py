@@ -0,0 +1,85 @@
+import hashlib
+import io
+import zlib
+
+from PIL import Image, ImageChops
+
+# Field name on ActivityLog/ScreenshotBlob -> longest edge in pixels of the pre-rendered JPEG
+THUMBNAIL_SIZES = {
+    'thumbnail': 320,  # dashboard grid tiles (128px tall, 2x for high-DPI screens)
+    'preview': 1280,   # detail modals
+}
+
+
+def sha256_file(f, chunk_size=65536):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dhash(image, hash_size=16):
+    """
+    Difference hash of ``image`` as hex, hash_size² bits (256 by default).
+
+    The image is shrunk to (hash_size + 1) x hash_size greyscale pixels and
+    each bit records whether a pixel is brighter than its right neighbour,
+    so re-encoding, a blinking cursor or a clock tick barely move the hash.
+    Screenshots need more bits than photos: at 8x8 a changed paragraph of
+    text usually leaves the hash untouched.
+    """
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f'{bits:0{hash_size * hash_size // 4}x}'
+
+
+def hamming_distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+# Colour grid compared pixel by pixel to confirm a perceptual-hash match. The hash is
+# greyscale, so frames that differ only in hue (solid red and solid green) share it
+SIGNATURE_SIZE = (256, 160)
+SIGNATURE_TOLERANCE = 8
+
+
+def signature(image):
+    """zlib-compressed SIGNATURE_SIZE RGB rendering of ``image``"""
+    small = image.convert('RGB').resize(SIGNATURE_SIZE, Image.Resampling.BOX)
+    return zlib.compress(small.tobytes())
+
+
+def changed_fraction(a, b):
+    """
+    Share of signature pixels with a channel that differs by more than SIGNATURE_TOLERANCE.
+
+    A blinking cursor or a clock tick on a 1280x800 screen changes a handful
+    of pixels (~0.005%); a single edited word already changes about twice that.
+    Signatures of another size (greyscale ones stored before colour was
+    compared) never match.
+    """
+    a, b = zlib.decompress(a), zlib.decompress(b)
+    pixels = SIGNATURE_SIZE[0] * SIGNATURE_SIZE[1]
+    if len(a) != pixels * 3 or len(b) != pixels * 3:
+        return 1.0
+    difference = ImageChops.difference(
+        Image.frombytes('RGB', SIGNATURE_SIZE, a), Image.frombytes('RGB', SIGNATURE_SIZE, b)
+    )
+    red, green, blue = difference.split()
+    largest = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    return sum(largest.histogram()[SIGNATURE_TOLERANCE + 1:]) / pixels
+
+
+def render_thumbnail(image, max_edge, quality=80):
+    """JPEG bytes of ``image`` scaled down so its longest edge is at most ``max_edge``"""
+    copy = image.convert('RGB')
+    copy.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    copy.save(buffer, 'JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
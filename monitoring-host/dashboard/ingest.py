@@ -0,0 +1,193 @@
+import io
+import json
+import logging
+
+from django.db import connection, models, transaction
+
+from .dimensions import intern_records
+from .models import ActivityLog, AppUsageLog, WebsiteVisitLog, FileAccessLog, USBDeviceLog, BaseLog
+from .rollups import record_daily_usage, record_hourly_rollups, record_keyword_counters
+from .fragments import bump_generations_on_commit
+from .live import publish_batch
+from .search import index_logs
+from .spans import sessionize
+from .stats import record_devices
+
+logger = logging.getLogger(__name__)
+
+# Maps the keys of a bulk monitoring payload to the log model they create
+BULK_LOG_MODELS = {
+    'app_usage': AppUsageLog,
+    'website_visits': WebsiteVisitLog,
+    'file_access': FileAccessLog,
+    'usb_devices': USBDeviceLog,
+    'activity_logs': ActivityLog,
+}
+
+
+class BulkIngestor:
+    """
+    Writes a validated bulk monitoring payload with a fixed number of queries.
+
+    The BaseLog parent rows of every log type are inserted with one bulk
+    INSERT and each child table with one more, in the transaction that also
+    writes everything derived from the logs (see ``write``). ``ip_address``
+    and ``agent_version`` describe the sending agent and are recorded on its
+    Device row.
+    """
+
+    # Child rows per table from which PostgreSQL gets them with COPY instead of executemany
+    copy_min_rows = 200
+
+    def __init__(self, batch_size=1000, ip_address=None, agent_version=''):
+        self.batch_size = batch_size
+        self.ip_address = ip_address
+        self.agent_version = agent_version
+
+    def build_logs(self, validated_data, screenshot=''):
+        """
+        Instantiate unsaved log models for every record in the payload, stamped now unless it has a timestamp.
+
+        Their repeated strings become ids of interned dimension rows (see
+        ``intern_records``), and their descriptions are built with the same
+        ``build_description`` the models use in ``save()``.
+        """
+        logs = {}
+        for key, model in BULK_LOG_MODELS.items():
+            records = validated_data.get(key) or []
+            if key == 'activity_logs':
+                records = [{**record, 'screenshot': screenshot or ''} for record in records]
+            logs[key] = [model(**record) for record in intern_records(model, records)]
+
+        # Pre-compute the fields the per-row save() overrides would have set
+        for key, model in BULK_LOG_MODELS.items():
+            for log in logs[key]:
+                log.log_type = model.LOG_TYPE
+                log.description = log.build_description()
+        return logs
+
+    def ingest(self, validated_data, screenshot=''):
+        return self.write(self.build_logs(validated_data, screenshot))
+
+    def write(self, logs, agents=None):
+        """
+        Write the logs of ``build_logs`` and everything derived from them.
+
+        Samples continuing an open span extend it first (see ``sessionize``),
+        then the logs, rollups, search documents and Device rows are written
+        in one transaction; the live events (see ``publish_batch``) and the
+        invalidation of the cached dashboard sections wait for its commit.
+
+        ``logs`` may merge several payloads, in the order they arrived;
+        ``agents`` then maps device identifiers to the ``(ip_address,
+        agent_version)`` that sent them, instead of this ingestor's.
+        """
+        with transaction.atomic():
+            extended = sessionize(logs)
+            self.insert_logs(logs)
+            record_hourly_rollups(logs)
+            record_keyword_counters(logs)
+            record_daily_usage(logs, extended)
+            index_logs(logs, extended, batch_size=self.batch_size)
+            record_devices(logs, self.ip_address, self.agent_version, extended, agents)
+            publish_batch(logs)
+            bump_generations_on_commit(
+                model.LOG_TYPE for key, model in BULK_LOG_MODELS.items() if logs[key] or key in extended
+            )
+        logger.info(
+            "Ingested %s",
+            ", ".join(
+                [f"{len(rows)} {key}" for key, rows in logs.items() if rows]
+                + [f"{len(spans)} {key} spans extended" for key, spans in extended.items()]
+            ) or "empty batch",
+        )
+        return logs
+
+    def insert_logs(self, logs):
+        children = [log for rows in logs.values() for log in rows]
+        if not children:
+            return
+
+        parents = [
+            BaseLog(
+                timestamp=log.timestamp,
+                description=log.description,
+                log_type=log.log_type,
+                device_identifier=log.device_identifier,
+            )
+            for log in children
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            BaseLog.objects.bulk_create(parents, batch_size=self.batch_size)
+        else:
+            # Without RETURNING support the parent ids are only known one row at a time
+            for parent in parents:
+                parent.save()
+
+        for parent, log in zip(parents, children):
+            log.id = log.baselog_ptr_id = parent.id
+            log.timestamp = parent.timestamp
+            log._state.adding = False
+            log._state.db = parent._state.db
+
+        for key, model in BULK_LOG_MODELS.items():
+            if logs[key]:
+                self._insert_children(model, logs[key])
+
+    def _insert_children(self, model, rows):
+        # Django refuses bulk_create() on multi-table inherited models, so the
+        # child table is written directly from its local fields.
+        opts = model._meta
+        fields = opts.local_concrete_fields
+        if connection.vendor == 'postgresql' and len(rows) >= self.copy_min_rows:
+            return self._copy_children(opts, fields, rows)
+        quote_name = connection.ops.quote_name
+        sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            quote_name(opts.db_table),
+            ', '.join(quote_name(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        params = [
+            [field.get_db_prep_save(getattr(row, field.attname), connection) for field in fields]
+            for row in rows
+        ]
+        with connection.cursor() as cursor:
+            for start in range(0, len(params), self.batch_size):
+                cursor.executemany(sql, params[start:start + self.batch_size])
+
+    def _copy_children(self, opts, fields, rows):
+        # One COPY in text format, a single round trip however many rows
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        quote_name = connection.ops.quote_name
+        sql = 'COPY %s (%s) FROM STDIN' % (
+            quote_name(opts.db_table),
+            ', '.join(quote_name(field.column) for field in fields),
+        )
+        data = io.StringIO()
+        for row in rows:
+            data.write('\t'.join(copy_text(field, getattr(row, field.attname)) for field in fields))
+            data.write('\n')
+        data.seek(0)
+        with connection.cursor() as cursor:
+            if is_psycopg3:
+                with cursor.copy(sql) as copy:
+                    copy.write(data.getvalue())
+            else:
+                cursor.copy_expert(sql, data)
+
+
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_text(field, value):
+    """``value`` of ``field`` as a column of PostgreSQL's COPY text format"""
+    if isinstance(field, models.JSONField):
+        value = None if value is None else json.dumps(value, cls=field.encoder)
+    else:
+        value = field.get_db_prep_save(value, connection)
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).translate(COPY_ESCAPES)
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import LiveEvent
+from .stats import DEVICE_COUNTERS
+
+logger = logging.getLogger(__name__)
+
+# Flagged activities published per batch; the rest only show up in the counts
+MAX_FLAGGED_EVENTS = 20
+KEEPALIVE_SECONDS = 15
+PRUNE_EVERY_SECONDS = 60
+# Seconds a stream waits for a missing id below newer events (an INSERT still committing)
+# before it gives the id up as never coming (a failed INSERT, a sequence jump)
+GAP_GRACE_SECONDS = 5
+
+# BaseLog.log_type -> Device counter it increments
+COUNTER_NAMES = {log_type: name for name, log_type in DEVICE_COUNTERS.items()}
+
+
+def publish_batch(logs):
+    """
+    Record the live events of a freshly ingested batch (as returned by BulkIngestor).
+
+    The new log counts per type, one heartbeat per device with its counter
+    deltas, and the flagged activities are written with one INSERT once the
+    ingest transaction commits, in a transaction of their own: streams never
+    see events of logs that were rolled back, and an id is committed right
+    after it is handed out however long the ingest transaction ran (see
+    ``LiveEventStream.poll``). Events lost to a failed INSERT are logged.
+    """
+    counts = Counter()
+    devices = {}
+    flagged = []
+    for rows in logs.values():
+        for log in rows:
+            counts[log.log_type] += 1
+            device = devices.setdefault(log.device_identifier, {
+                'device_identifier': log.device_identifier,
+                'last_seen': log.timestamp,
+                **dict.fromkeys(DEVICE_COUNTERS, 0),
+                'flagged_count': 0,
+            })
+            device['last_seen'] = max(device['last_seen'], log.timestamp)
+            device[COUNTER_NAMES[log.log_type]] += 1
+            if log.log_type == 'activity' and log.is_flagged:
+                device['flagged_count'] += 1
+                flagged.append(log)
+    if not counts:
+        return
+
+    events = [LiveEvent(kind='counts', payload=dict(counts))]
+    events += [LiveEvent(kind='heartbeat', payload=_jsonable(device)) for device in devices.values()]
+    events += [
+        LiveEvent(kind='flagged', payload=_jsonable({
+            'id': log.id,
+            'timestamp': log.timestamp,
+            'device_identifier': log.device_identifier,
+            'window_title': log.window_title,
+            'description': log.description,
+            'keywords': log.keywords or [],
+            'confidence': log.confidence,
+        }))
+        for log in flagged[:MAX_FLAGGED_EVENTS]
+    ]
+    transaction.on_commit(lambda: LiveEvent.objects.bulk_create(events), robust=True)
+
+
+def _jsonable(payload):
+    return json.loads(json.dumps(payload, cls=DjangoJSONEncoder))
+
+
+def format_event(event):
+    data = json.dumps(event.payload, separators=(',', ':'))
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n".encode()
+
+
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def prune_events():
+    """Delete events older than LIVE_EVENT_RETENTION, at most once a minute per process"""
+    global _last_prune
+    with _prune_lock:
+        if time.monotonic() - _last_prune < PRUNE_EVERY_SECONDS:
+            return
+        _last_prune = time.monotonic()
+    cutoff = timezone.now() - timedelta(seconds=settings.LIVE_EVENT_RETENTION)
+    deleted, _ = LiveEvent.objects.filter(created_at__lt=cutoff).delete()
+    if deleted:
+        logger.debug("Pruned %d live events", deleted)
+
+
+class LiveEventStream:
+    """
+    Server-Sent Events relaying LiveEvent rows as they are committed.
+
+    Async-iterating it (ASGI) polls the event table for rows after
+    ``last_id`` and ends after ``max_seconds``; EventSource then reconnects
+    with ``Last-Event-ID`` and resumes where it stopped. WSGI workers are too
+    few to hold one per open dashboard, so there ``once`` answers a single
+    poll and the browser reconnects after the ``retry`` delay.
+    """
+
+    def __init__(self, last_id=None, poll_interval=None, max_seconds=None, batch_size=500):
+        self.last_id = last_id
+        self.poll_interval = poll_interval if poll_interval is not None else settings.LIVE_STREAM_POLL_INTERVAL
+        self.max_seconds = max_seconds if max_seconds is not None else settings.LIVE_STREAM_MAX_SECONDS
+        self.batch_size = batch_size
+
+    def start(self):
+        if self.last_id is None:
+            # A fresh subscriber only wants what happens from now on
+            self.last_id = LiveEvent.objects.aggregate(last=Max('id'))['last'] or 0
+        return f"retry: {int(self.poll_interval * 1000) + 1000}\n\n".encode()
+
+    def poll(self):
+        """
+        Formatted events committed since the last poll.
+
+        Streams resume from the highest id relayed, so an id below it must
+        not become visible later. Concurrent publishers can commit out of
+        id order, but only for the moment between an INSERT and its commit
+        (see ``publish_batch``): events are relayed up to the first missing
+        id, and past it once the event after the gap is GAP_GRACE_SECONDS
+        old.
+        """
+        prune_events()
+        events = list(LiveEvent.objects.filter(id__gt=self.last_id).order_by('id')[:self.batch_size])
+        settled = timezone.now() - timedelta(seconds=GAP_GRACE_SECONDS)
+        relayed = []
+        for event in events:
+            if event.id != self.last_id + 1 and event.created_at > settled:
+                break
+            relayed.append(event)
+            self.last_id = event.id
+        return b''.join(format_event(event) for event in relayed)
+
+    def resume_point(self):
+        # An id without data dispatches nothing but becomes the browser's Last-Event-ID
+        return f"id: {self.last_id}\n\n".encode()
+
+    def once(self):
+        """A complete response body: the events since ``last_id``, and where to resume from"""
+        return self.start() + self.poll() + self.resume_point()
+
+    async def __aiter__(self):
+        yield await sync_to_async(self.start)()
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < self.max_seconds:
+            chunk = await sync_to_async(self.poll)()
+            if not chunk and time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                chunk = b": keepalive\n\n"
+            if chunk:
+                last_sent = time.monotonic()
+                yield chunk
+            else:
+                await asyncio.sleep(self.poll_interval)
+        yield self.resume_point()
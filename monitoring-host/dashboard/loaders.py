@@ -0,0 +1,65 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+
+from .dimensions import value_lookups
+from .models import ActivityLog, AppUsageLog, WebsiteVisitLog, FileAccessLog, USBDeviceLog
+
+# BaseLog.log_type -> child model and the fields it contributes to a log's details
+LOG_DETAIL_FIELDS = {
+    'activity': (ActivityLog, ['window_title', 'is_flagged', 'screenshot', 'preview', 'analysis', 'keywords']),
+    'app_usage': (AppUsageLog, ['app_name', 'window_title', 'duration', 'is_active']),
+    'website_visit': (WebsiteVisitLog, ['url', 'title', 'duration']),
+    'file_access': (FileAccessLog, ['file_path', 'operation', 'process_name']),
+    'usb_device': (USBDeviceLog, ['device_name', 'vendor_id', 'product_id', 'serial_number', 'action']),
+}
+
+
+def _activity_details(details):
+    screenshot = details.pop('screenshot')
+    details['has_screenshot'] = bool(screenshot)
+    details['screenshot_url'] = default_storage.url(screenshot) if screenshot else None
+    preview = details.pop('preview')
+    details['preview_url'] = default_storage.url(preview) if preview else None
+    details['keywords'] = details['keywords'] or []
+    return details
+
+
+DETAIL_FORMATTERS = {
+    'activity': _activity_details,
+}
+
+
+def load_log_details(logs):
+    """
+    Fetch the type-specific details of BaseLog rows with one query per log type present.
+
+    Each child table is read on its own with ``pk__in`` and without the join
+    back to BaseLog, instead of LEFT JOINing all five children onto every
+    row. Returns ``{log id: details dict}``; logs whose child row is missing
+    are left out.
+    """
+    ids_by_type = defaultdict(list)
+    for log in logs:
+        if log.log_type in LOG_DETAIL_FIELDS:
+            ids_by_type[log.log_type].append(log.id)
+
+    details = {}
+    for log_type, ids in ids_by_type.items():
+        model, fields = LOG_DETAIL_FIELDS[log_type]
+        formatter = DETAIL_FORMATTERS.get(log_type)
+        # order_by() drops the inherited '-timestamp' ordering, which would join BaseLog
+        rows = model.objects.filter(pk__in=ids).order_by().values_list('pk', *value_lookups(model, fields))
+        for pk, *values in rows:
+            row = dict(zip(fields, values))
+            details[pk] = formatter(row) if formatter else row
+    return details
+
+
+def attach_log_details(logs):
+    """Set ``log.details`` on every BaseLog in ``logs`` (None when it has no child row)"""
+    logs = list(logs)
+    details = load_log_details(logs)
+    for log in logs:
+        log.details = details.get(log.id)
+    return logs
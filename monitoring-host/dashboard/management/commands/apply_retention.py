@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.template.defaultfilters import filesizeformat
+
+from dashboard.models import BaseLog
+from dashboard.retention import RetentionEngine
+
+
+class Command(BaseCommand):
+    help = 'Delete raw logs and unflagged screenshots past their retention, keeping the rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', action='append', default=[], metavar='LOG_TYPE=DAYS',
+                            help='Override the retention of a log type, e.g. app_usage=30 (repeatable)')
+        parser.add_argument('--screenshot-days', type=int,
+                            help='Clear unflagged screenshots older than this (default: SCREENSHOT_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, help='Rows per delete transaction (default: RETENTION_BATCH_SIZE)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+        parser.add_argument('--every', type=int, default=0,
+                            help='Keep running and repeat every this many seconds (for supervisord)')
+
+    def handle(self, *args, **options):
+        policies = None
+        if options['days']:
+            policies = dict(settings.LOG_RETENTION_POLICIES)
+            for override in options['days']:
+                log_type, _, days = override.partition('=')
+                if not days.isdigit():
+                    raise CommandError(f"Expected LOG_TYPE=DAYS, got {override!r}")
+                policies[log_type] = int(days)
+        try:
+            engine = RetentionEngine(
+                policies=policies,
+                screenshot_days=options['screenshot_days'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        while True:
+            self.run(engine)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+            close_old_connections()
+
+    def run(self, engine):
+        started = time.perf_counter()
+        report = engine.run()
+        prefix = "Would delete" if engine.dry_run else "Deleted"
+
+        for log_type, label in BaseLog.LOG_TYPES:
+            if report.logs[log_type]:
+                self.stdout.write(f"{prefix} {report.logs[log_type]} {label.lower()} logs")
+        if report.screenshots:
+            self.stdout.write(f"{'Would clear' if engine.dry_run else 'Cleared'} {report.screenshots} unflagged screenshots")
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(report.logs.values())} logs, {report.screenshots} screenshots and "
+            f"{report.blobs} stored images {'to delete' if engine.dry_run else 'deleted'}; "
+            f"{'would reclaim' if engine.dry_run else 'reclaimed'} {filesizeformat(report.bytes)} of files "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
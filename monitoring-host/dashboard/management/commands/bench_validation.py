@@ -0,0 +1,81 @@
+import copy
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard.serializers import BulkMonitoringSerializer
+from dashboard.validation import BulkPayloadValidator
+
+
+def sample_payload(records, seed=0):
+    """Bulk payload shaped like the agent's, with ``records`` records of each log type"""
+    rng = random.Random(seed)
+    device = 'bench-device'
+
+    def common(i):
+        return {'device_identifier': device, 'description': f'sample {i}'}
+
+    return {
+        'app_usage': [
+            dict(common(i), app_name=rng.choice(['code', 'firefox', 'slack']), window_title=f'Window {i}',
+                 duration=rng.randint(1, 3600), is_active=rng.random() < 0.5)
+            for i in range(records)
+        ],
+        'website_visits': [
+            dict(common(i), url=f'https://example.com/page/{i}?q={rng.randint(0, 999)}', title=f'Page {i}',
+                 duration=rng.randint(1, 600))
+            for i in range(records)
+        ],
+        'file_access': [
+            dict(common(i), file_path=f'/home/user/docs/file-{i}.txt', operation=rng.choice(['read', 'write']),
+                 process_name='explorer.exe')
+            for i in range(records)
+        ],
+        'usb_devices': [
+            dict(common(i), name=f'USB Drive {i}', vendor_id='0781', product_id='5581',
+                 serial_number=f'SN{i:08d}', action=rng.choice(['connected', 'disconnected']))
+            for i in range(records)
+        ],
+        'activity_logs': [
+            dict(common(i), window_title=f'Window {i}', clipboard='', screenshot=None, analysis='',
+                 is_flagged=rng.random() < 0.1, keywords=['salary', 'export'][:rng.randint(0, 2)],
+                 confidence=rng.random())
+            for i in range(records)
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Measure bulk payload validation throughput of the DRF serializers and the compiled validators'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=200, help='Records of each log type per payload')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per validator; the best one is reported')
+
+    def handle(self, *args, **options):
+        payload = sample_payload(options['records'])
+        total = sum(len(records) for records in payload.values())
+        fast = BulkPayloadValidator()
+
+        def run_serializer(data):
+            serializer = BulkMonitoringSerializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            return serializer.validated_data
+
+        results = {}
+        for name, validate in (('serializer', run_serializer), ('compiled', fast.validate)):
+            best = None
+            for _ in range(options['repeat']):
+                # Both mutate their input (the USB name alias), so each run gets a fresh copy
+                data = copy.deepcopy(payload)
+                started = time.perf_counter()
+                validate(data)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = total / best
+            self.stdout.write(f"{name:>10}: {results[name]:>10.0f} records/s ({best * 1000:.1f} ms for {total} records)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compiled validators are {results['compiled'] / results['serializer']:.1f}x faster"
+        ))
@@ -0,0 +1,168 @@
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from PIL import Image
+
+from dashboard.benchmark import (
+    FleetGenerator, bulk_request, compare, explorer_paths, measure, page_request, parse_size, seed_logs,
+)
+from dashboard.dimensions import get_intern_cache
+from dashboard.fragments import get_cache
+from dashboard.models import BaseLog
+from dashboard.screenshots import get_screenshot_pipeline
+
+SCENARIOS = ['dashboard', 'dashboard_cached', 'logs_explorer', 'ingest']
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark bulk ingest and the dashboard and logs explorer pages on a scratch copy of the '
+        'database (SQLite or PostgreSQL), and save the results as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10k,1m,10m',
+                            help='Comma-separated log table sizes to measure at, e.g. 10k,1m (default: 10k,1m,10m)')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios',
+                            help='Scenario to run (repeatable, default: all)')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per scenario and size')
+        parser.add_argument('--concurrency', type=int, default=4, help='Threads sending requests at once')
+        parser.add_argument('--devices', type=int, default=50, help='Devices in the synthetic fleet')
+        parser.add_argument('--days', type=int, default=7, help='Days of history the seeded logs are spread over')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the fleet generator')
+        parser.add_argument('--screenshots', action='store_true',
+                            help='Attach a screenshot to ingest requests with activity logs, like the agent')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database (and its seeded logs) for the next run')
+        parser.add_argument('--output', help='JSON results file (default: benchmark-<time>.json)')
+        parser.add_argument('--compare', help='Earlier JSON results to compare against')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(parse_size(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError(f"Invalid --sizes {options['sizes']!r}, expected e.g. 10k,1m,10m")
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+
+        test_settings = connection.settings_dict['TEST']
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # An on-disk database, unlike the test runner's in-memory one, holds 10M rows
+            test_settings['NAME'] = f"{os.path.splitext(connection.settings_dict['NAME'])[0]}_benchmark.sqlite3"
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        # One log line per request would drown the report and time the console instead of the server
+        logging.getLogger('dashboard').setLevel(logging.INFO if options['verbosity'] > 1 else logging.ERROR)
+        media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                SCREENSHOT_SPOOL_DIR=os.path.join(media_root, 'spool'),
+                ALLOWED_HOSTS=['testserver'],
+            ):
+                report = self.run(sizes, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        output = options['output'] or f"benchmark-{timezone.now():%Y%m%d-%H%M%S}.json"
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Saved results to {output}"))
+
+        if previous:
+            self.stdout.write(f"{'scenario':<18}{'rows':>10}  {'p95 ms':<28}{'rows/s'}")
+            for scenario, rows, old_p95, p95, old_rate, rate in compare(previous, report):
+                self.stdout.write(f"{scenario:<18}{rows:>10}  {_change(old_p95, p95):<28}{_change(old_rate, rate)}")
+
+    def run(self, sizes, options):
+        scenarios = options['scenarios'] or SCENARIOS
+        generator = FleetGenerator(devices=options['devices'], seed=options['seed'])
+        screenshots = sample_screenshots(options['seed']) if options['screenshots'] else ()
+        if connection.vendor == 'sqlite':
+            database_version = connection.Database.sqlite_version
+        else:
+            database_version = connection.pg_version
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'database_version': database_version,
+            'django': django.get_version(),
+            'options': {
+                name: options[name] for name in
+                ('requests', 'concurrency', 'devices', 'days', 'seed', 'screenshots')
+            },
+            'results': [],
+        }
+
+        for size in sizes:
+            # The ingest scenario adds a few rows; a kept database that grew only that much is reused
+            if BaseLog.objects.count() > size * 1.1:
+                call_command('flush', interactive=False, verbosity=0)
+                # The interned strings went with the logs
+                get_intern_cache().clear()
+            written, seconds = seed_logs(generator, size, days=options['days'])
+            if written:
+                self.stdout.write(f"Seeded {written} logs in {seconds:.1f}s ({written / seconds:.0f} rows/s)")
+                report['results'].append({
+                    'scenario': 'seed', 'dataset_rows': size, 'requests': 0,
+                    'rows_per_second': round(written / seconds, 1),
+                })
+
+            device = generator.devices[0]
+            requests = {
+                'dashboard': page_request(['/dashboard/']),
+                'dashboard_cached': page_request(['/dashboard/']),
+                'logs_explorer': page_request(explorer_paths(device)),
+                'ingest': bulk_request(generator, screenshots),
+            }
+            for scenario in scenarios:
+                get_cache().clear()
+                # 'dashboard' runs every section query on each request, 'dashboard_cached' mostly hits
+                ttl = 0 if scenario == 'dashboard' else settings.DASHBOARD_CACHE_TTL
+                with override_settings(DASHBOARD_CACHE_TTL=ttl):
+                    result = measure(requests[scenario], options['requests'], options['concurrency'])
+                result = {'scenario': scenario, 'dataset_rows': size, **result}
+                report['results'].append(result)
+                latency = result['latency_ms']
+                self.stdout.write(
+                    f"{scenario:<18}{size:>10} rows  p50 {latency['p50']:>8.1f} ms  p95 {latency['p95']:>8.1f} ms  "
+                    f"p99 {latency['p99']:>8.1f} ms  {result['queries_per_request']:>6.1f} queries/req  "
+                    f"{result['requests_per_second']:>7.1f} req/s"
+                    + (f"  {result['rows_per_second']:>8.0f} rows/s" if scenario == 'ingest' else '')
+                    + (f"  {result['errors']} errors" if result['errors'] else '')
+                )
+
+        if screenshots:
+            get_screenshot_pipeline().join()
+        return report
+
+
+def sample_screenshots(seed, count=8):
+    """A few distinct PNG screenshots; reusing them also exercises deduplication"""
+    images = []
+    for number in range(count):
+        image = Image.effect_noise((640, 400), 40 + seed + number).convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        images.append(buffer.getvalue())
+    return images
+
+
+def _change(before, after):
+    if before is None or after is None:
+        return ''
+    percent = f" ({(after - before) / before * 100:+.0f}%)" if before else ''
+    return f"{before:g} -> {after:g}{percent}"
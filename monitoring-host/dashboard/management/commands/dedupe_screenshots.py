@@ -0,0 +1,57 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Min
+
+from dashboard.models import ActivityLog, ScreenshotBlob
+from dashboard.screenshots import store_screenshot
+
+
+class Command(BaseCommand):
+    help = 'Move screenshots stored before content addressing into deduplicated blobs with thumbnails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-originals', action='store_true',
+                            help='Delete the old per-upload files once their logs point at a blob')
+        parser.add_argument('--limit', type=int, default=None, help='Process at most this many files')
+
+    def handle(self, *args, **options):
+        legacy = (
+            ActivityLog.objects.filter(screenshot_blob__isnull=True)
+            .exclude(screenshot__isnull=True).exclude(screenshot='')
+            .order_by().values('screenshot')
+            .annotate(device_identifier=Min('device_identifier'), logs=Count('pk'))
+        )
+        if options['limit']:
+            legacy = legacy[:options['limit']]
+
+        outcomes = {'uploaded': 0, 'deduplicated': 0, 'near_duplicates': 0, 'missing': 0}
+        reclaimed = 0
+        for row in legacy.iterator():
+            name = row['screenshot']
+            try:
+                with default_storage.open(name, 'rb') as f:
+                    blob, outcome = store_screenshot(f, row['device_identifier'], name)
+            except FileNotFoundError:
+                outcomes['missing'] += 1
+                self.stderr.write(f"Missing screenshot file {name}")
+                continue
+            outcomes[outcome] += 1
+
+            with transaction.atomic():
+                ActivityLog.objects.filter(screenshot=name, screenshot_blob__isnull=True).update(
+                    screenshot_blob=blob,
+                    screenshot=blob.image.name,
+                    thumbnail=blob.thumbnail.name,
+                    preview=blob.preview.name,
+                )
+                ScreenshotBlob.objects.filter(pk=blob.pk).update(reference_count=F('reference_count') + row['logs'])
+
+            if options['delete_originals'] and name != blob.image.name:
+                reclaimed += default_storage.size(name)
+                default_storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            ", ".join(f"{count} {outcome}" for outcome, count in outcomes.items())
+            + (f"; reclaimed {reclaimed} bytes" if options['delete_originals'] else "")
+        ))
@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from dashboard.screenshots import get_screenshot_pipeline
+from dashboard.spool import DATABASE_UNAVAILABLE, SpoolLoader, get_ingest_spool, spool_status
+
+# Seconds between attempts while the database is unreachable, doubled up to the maximum
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+
+class Command(BaseCommand):
+    help = 'Load the bulk payloads accepted into the local ingest spool into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-records', type=int,
+                            help='Payloads per load transaction (default: INGEST_SPOOL_BATCH_RECORDS)')
+        parser.add_argument('--every', type=float, default=0,
+                            help='Keep running and look for new payloads every this many seconds once the spool '
+                                 'is drained (for supervisord)')
+
+    def handle(self, *args, **options):
+        spool = get_ingest_spool()
+        loader = SpoolLoader(spool, batch_records=options['batch_records'] or settings.INGEST_SPOOL_BATCH_RECORDS)
+        delay = RETRY_DELAY
+        total = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                loaded = loader.run()
+            except DATABASE_UNAVAILABLE as e:
+                if not options['every']:
+                    raise CommandError(f"Database unavailable, the spool is kept: {e}")
+                self.stderr.write(f"Database unavailable, retrying in {delay:.0f}s: {e}")
+                close_old_connections()
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            delay = RETRY_DELAY
+            close_old_connections()
+            if loaded:
+                total += loaded
+                if options['every']:
+                    self.stdout.write(f"Loaded {loaded} payloads in {time.perf_counter() - started:.2f}s")
+                continue
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+        # Screenshots of the loaded payloads are uploaded by this process's pipeline
+        get_screenshot_pipeline().join()
+        status = spool_status(spool)
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {total} payloads; {status['pending_records']} pending in {status['segments']} segments, "
+            f"{status['rejected_records']} rejected"
+        ))
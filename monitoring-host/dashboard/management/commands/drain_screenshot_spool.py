@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from dashboard.screenshots import get_screenshot_pipeline
+
+
+class Command(BaseCommand):
+    help = 'Upload screenshots left in the local spool (after a restart, a full queue or an outage)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-after', type=int, default=900,
+                            help='Seconds after which an in-progress upload or partial request upload is '
+                                 'considered abandoned')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Give jobs that ran out of attempts another round')
+        parser.add_argument('--every', type=int, default=0,
+                            help='Keep running and repeat every this many seconds (for supervisord); jobs then '
+                                 'wait out their retry backoff')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run(options)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+            close_old_connections()
+
+    def run(self, options):
+        pipeline = get_screenshot_pipeline()
+        spool = pipeline.spool
+        spool.ensure_dirs()
+
+        removed = spool.remove_stale_uploads(options['stale_after'])
+        if removed:
+            self.stdout.write(f"Removed {removed} abandoned partial uploads")
+        requeued = spool.requeue_stale(options['stale_after'])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} abandoned uploads")
+        if options['retry_failed']:
+            for job_id in spool.failed_jobs():
+                spool.retry_failed(job_id)
+
+        uploaded = 0
+        for job_id in spool.pending_jobs():
+            if not options['every']:
+                manifest = spool.claim(job_id)
+                if manifest is None:
+                    continue
+                # Run every job now, ignoring the backoff the web workers would apply
+                manifest['not_before'] = 0
+                spool.release(manifest)
+            # process() hands a job that is not due yet back to pending/
+            if pipeline.process(job_id):
+                uploaded += 1
+
+        backlog = spool.backlog()
+        if uploaded or not options['every']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Uploaded {uploaded} screenshots; {backlog['pending']} pending, {backlog['failed']} failed"
+            ))
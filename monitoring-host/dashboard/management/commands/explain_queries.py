@@ -0,0 +1,84 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from dashboard.models import ActivityLog, BaseLog, KeywordCounter, LogHourlyRollup
+
+# Plan lines that mean a table is read without an index
+SEQUENTIAL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'SCAN (\w+)(?! USING (?:COVERING )?INDEX)(?:\s|$)'),
+}
+
+
+def dashboard_queries():
+    now = timezone.now()
+    return {
+        'dashboard.recent_flagged': ActivityLog.objects.filter(is_flagged=True).order_by('-timestamp')[:10],
+        'dashboard.recent_screenshots': ActivityLog.objects.filter(
+            screenshot__isnull=False, is_flagged=True,
+        ).exclude(screenshot='').order_by('-timestamp')[:6],
+        'dashboard.hourly_activity': LogHourlyRollup.objects.filter(
+            hour__gte=now - timedelta(hours=24), hour__lt=now,
+        ).order_by().values('hour'),
+        'dashboard.top_keywords': KeywordCounter.objects.filter(day__gte=(now - timedelta(days=7)).date()),
+    }
+
+
+def explorer_queries():
+    now = timezone.now()
+    device = BaseLog.objects.values_list('device_identifier', flat=True).first() or 'device'
+    return {
+        'explorer.latest': BaseLog.objects.order_by('-timestamp')[:50],
+        'explorer.date_range': BaseLog.objects.filter(
+            timestamp__gte=now - timedelta(days=7), timestamp__lt=now,
+        ).order_by('-timestamp')[:50],
+        'explorer.log_type': BaseLog.objects.filter(log_type='app_usage').order_by('-timestamp')[:50],
+        'explorer.device': BaseLog.objects.filter(device_identifier=device).order_by('-timestamp')[:50],
+        'explorer.flagged': BaseLog.objects.filter(
+            Q(log_type='activity', activitylog__is_flagged=True)
+        ).order_by('-timestamp')[:50],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the dashboard and logs explorer queries and report sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error when any query reads a table sequentially')
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"EXPLAIN analysis is not supported on {connection.vendor}")
+
+        queries = {**dashboard_queries(), **explorer_queries()}
+        offenders = {}
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Small tables make the planner prefer sequential scans even when an
+                # index exists; disabling them shows whether an index is usable at all.
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                for name, queryset in queries.items():
+                    plan = queryset.explain()
+                    scanned = sorted(set(pattern.findall(plan)))
+                    if scanned:
+                        offenders[name] = scanned
+                        self.stdout.write(self.style.WARNING(f"{name}: sequential scan on {', '.join(scanned)}"))
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f"{name}: OK"))
+                    if options['verbose_plans']:
+                        self.stdout.write(plan + '\n')
+            finally:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('RESET enable_seqscan')
+
+        if offenders and options['fail_on_scan']:
+            raise CommandError(f"{len(offenders)} queries use sequential scans: {', '.join(offenders)}")
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.export import EXPORT_COLUMNS, FORMATS, ExportUnavailable, LogExporter, parse_bound
+
+
+class Command(BaseCommand):
+    help = 'Export logs to a Parquet or Arrow IPC file for offline analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='File to write')
+        parser.add_argument('--format', choices=sorted(FORMATS),
+                            help='Output format (default: from the file extension, else parquet)')
+        parser.add_argument('--since', help='Start date or ISO datetime (inclusive)')
+        parser.add_argument('--until', help='End date (inclusive) or ISO datetime (exclusive)')
+        parser.add_argument('--device', action='append', dest='devices', help='Device identifier, repeatable')
+        parser.add_argument('--log-type', action='append', dest='log_types', choices=sorted(EXPORT_COLUMNS),
+                            help='Log type, repeatable (default: all)')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per record batch')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or ('arrow' if output.endswith(('.arrow', '.arrows')) else 'parquet')
+        try:
+            exporter = LogExporter(
+                since=parse_bound(options['since']),
+                until=parse_bound(options['until'], end=True),
+                device_identifiers=options['devices'],
+                log_types=options['log_types'],
+                batch_size=options['batch_size'],
+            )
+        except (ExportUnavailable, ValueError) as e:
+            raise CommandError(e)
+
+        rows = exporter.write(output, fmt)
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {rows} rows to {output} ({fmt}) in {exporter.seconds:.1f}s, "
+            f"{exporter.rows_per_second:.0f} rows/s"
+        ))
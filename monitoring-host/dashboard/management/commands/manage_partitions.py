@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from dashboard.partitions import PartitionManager
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming log table partitions and drop the ones past the retention period (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', choices=['day', 'week'], help='Partition period (default: LOG_PARTITION_INTERVAL)')
+        parser.add_argument('--premake', type=int, help='Future periods to create (default: LOG_PARTITION_PREMAKE)')
+        parser.add_argument('--retention-days', type=int,
+                            help='Drop partitions older than this many days, 0 keeps everything (default: LOG_RETENTION_DAYS)')
+        parser.add_argument('--detach', action='store_true',
+                            help='Detach expired partitions into standalone tables instead of dropping them')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be created or expired')
+        parser.add_argument('--status', action='store_true', help='Print the partitions of every log table')
+        parser.add_argument('--every', type=int, default=0,
+                            help='Keep running and repeat every this many seconds (for supervisord)')
+
+    def handle(self, *args, **options):
+        try:
+            manager = PartitionManager(
+                interval=options['interval'],
+                premake=options['premake'],
+                retention_days=options['retention_days'],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+        if not manager.supported:
+            self.stdout.write("Log tables are not partitioned (partitioning needs PostgreSQL); nothing to do")
+            return
+
+        while True:
+            self.run(manager, options)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+            close_old_connections()
+
+    def run(self, manager, options):
+        dry_run = options['dry_run']
+        prefix = "Would " if dry_run else ""
+
+        created = manager.ensure(dry_run=dry_run)
+        for name in created:
+            self.stdout.write(f"{prefix}create {name}")
+        expired = manager.expire(detach=options['detach'], dry_run=dry_run)
+        for name in expired:
+            self.stdout.write(f"{prefix}{'detach' if options['detach'] else 'drop'} {name}")
+
+        if options['status']:
+            for table in manager.status():
+                self.stdout.write(
+                    f"{table['table']}: {table['partitions']} partitions "
+                    f"[{table['oldest']} .. {table['newest']}), {table['default_rows']} rows in default"
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(created)} partitions {'to create' if dry_run else 'created'}, "
+            f"{len(expired)} {'to expire' if dry_run else 'expired'}"
+        ))
@@ -0,0 +1,227 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Min, Q, Sum, When
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from dashboard.models import (
+    ActivityLog, AppUsageDailyRollup, AppUsageLog, BaseLog, Device, KeywordCounter, LogHourlyRollup,
+    WebsiteDailyRollup, WebsiteVisitLog,
+)
+from dashboard.rollups import truncate_hour
+from dashboard.stats import DEVICE_COUNTERS
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+
+def day_of(value):
+    return value.date()
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the derived rollup tables from the raw logs. Only the time range that still has raw logs "
+        "is rebuilt: older rollups hold the history apply_retention downsampled, and are kept"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--since', metavar='YYYY-MM-DD',
+                            help='Rebuild every log type from this day on instead, discarding the rollups of '
+                                 'raw logs that retention already deleted after it')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.since = None
+        if options['since']:
+            try:
+                self.since = timezone.make_aware(datetime.strptime(options['since'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError(f"Invalid --since {options['since']!r}, expected YYYY-MM-DD")
+
+        with transaction.atomic():
+            self.rebuild_hourly_rollups(batch_size)
+            activity_horizon = self.rebuild_keyword_counters(batch_size)
+            self.rebuild_daily_usage(batch_size)
+            self.rebuild_devices(batch_size, activity_horizon)
+
+    def horizon(self, log_type, derived, field, bucket, step):
+        """
+        First bucket of the ``derived`` rows of ``log_type`` to rebuild, or None to rebuild them all.
+
+        apply_retention leaves the rollups alone when it deletes raw logs, so
+        the buckets before the oldest raw log hold history that exists nowhere
+        else; so may that log's own bucket while a retention policy deletes
+        the log type. Both are kept. ``--since`` overrides the horizon.
+        """
+        if self.since is not None:
+            return bucket(self.since)
+        first_raw = BaseLog.objects.filter(log_type=log_type).aggregate(first=Min('timestamp'))['first']
+        if first_raw is None:
+            # No raw logs to rebuild from: keep every row
+            return bucket(timezone.now()) + step
+        earliest = derived.aggregate(first=Min(field))['first']
+        if (earliest is not None and earliest < bucket(first_raw)) or settings.LOG_RETENTION_POLICIES.get(log_type):
+            return bucket(first_raw) + step
+        return None
+
+    def describe(self, horizon):
+        if horizon is None:
+            return "all"
+        if isinstance(horizon, datetime):
+            return f"from {horizon:%Y-%m-%d %H:%M}"
+        return f"from {horizon}"
+
+    def rebuild_hourly_rollups(self, batch_size):
+        for log_type, _ in BaseLog.LOG_TYPES:
+            rollups = LogHourlyRollup.objects.filter(log_type=log_type)
+            logs = BaseLog.objects.filter(log_type=log_type)
+            horizon = self.horizon(log_type, rollups, 'hour', truncate_hour, HOUR)
+            if horizon is not None:
+                rollups = rollups.filter(hour__gte=horizon)
+                logs = logs.filter(timestamp__gte=horizon)
+            rollups.delete()
+            buckets = (
+                logs.order_by()
+                .annotate(hour=TruncHour('timestamp'))
+                .values('hour', 'device_identifier', 'log_type')
+                .annotate(count=Count('id'))
+            )
+            created = LogHourlyRollup.objects.bulk_create(
+                (LogHourlyRollup(**bucket) for bucket in buckets.iterator()),
+                batch_size=batch_size,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {len(created)} hourly {log_type} rollup rows ({self.describe(horizon)})"
+            ))
+
+    def rebuild_keyword_counters(self, batch_size):
+        counters = KeywordCounter.objects.all()
+        activity = ActivityLog.objects.order_by().exclude(keywords__isnull=True)
+        horizon = self.horizon(ActivityLog.LOG_TYPE, counters, 'day', day_of, DAY)
+        if horizon is not None:
+            counters = counters.filter(day__gte=horizon)
+            activity = activity.filter(timestamp__date__gte=horizon)
+        counters.delete()
+        counts = Counter()
+        for timestamp, device_identifier, keywords in activity.values_list(
+            'timestamp', 'device_identifier', 'keywords'
+        ).iterator(chunk_size=batch_size):
+            for keyword in keywords or []:
+                counts[(timestamp.date(), device_identifier, keyword[:255])] += 1
+
+        KeywordCounter.objects.bulk_create(
+            (
+                KeywordCounter(day=day, device_identifier=device_identifier, keyword=keyword, count=count)
+                for (day, device_identifier, keyword), count in counts.items()
+            ),
+            batch_size=batch_size,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(counts)} keyword counter rows ({self.describe(horizon)})"
+        ))
+        return horizon
+
+    def rebuild_daily_usage(self, batch_size):
+        rollups = AppUsageDailyRollup.objects.all()
+        logs = AppUsageLog.objects.all()
+        app_horizon = self.horizon(AppUsageLog.LOG_TYPE, rollups, 'day', day_of, DAY)
+        if app_horizon is not None:
+            rollups = rollups.filter(day__gte=app_horizon)
+            logs = logs.filter(timestamp__date__gte=app_horizon)
+        rollups.delete()
+        apps = (
+            logs.order_by()
+            .annotate(day=TruncDate('timestamp'))
+            .values('day', 'device_identifier', 'app_name_id')
+            .annotate(
+                count=Count('id'),
+                total_duration=Sum('duration'),
+                active_duration=Sum(Case(When(is_active=True, then=F('duration')), default=0)),
+            )
+        )
+        created = AppUsageDailyRollup.objects.bulk_create(
+            (AppUsageDailyRollup(**row) for row in apps.iterator()),
+            batch_size=batch_size,
+        )
+
+        rollups = WebsiteDailyRollup.objects.all()
+        visits = WebsiteVisitLog.objects.all()
+        website_horizon = self.horizon(WebsiteVisitLog.LOG_TYPE, rollups, 'day', day_of, DAY)
+        if website_horizon is not None:
+            rollups = rollups.filter(day__gte=website_horizon)
+            visits = visits.filter(timestamp__date__gte=website_horizon)
+        rollups.delete()
+        # Aggregated here rather than in SQL so that each row keeps the title of its latest visit
+        websites = {}
+        visits = visits.order_by('id').values_list('timestamp', 'device_identifier', 'url_id', 'title_id', 'duration')
+        for timestamp, device_identifier, url_id, title_id, duration in visits.iterator(chunk_size=batch_size):
+            key = (timestamp.date(), device_identifier, url_id)
+            row = websites.get(key)
+            if row is None:
+                row = websites[key] = WebsiteDailyRollup(day=key[0], device_identifier=device_identifier, url_id=url_id)
+            row.count += 1
+            row.total_duration += duration
+            row.title_id = title_id
+        WebsiteDailyRollup.objects.bulk_create(websites.values(), batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(created)} daily app usage ({self.describe(app_horizon)}) and "
+            f"{len(websites)} daily website ({self.describe(website_horizon)}) rollup rows"
+        ))
+
+    def rebuild_devices(self, batch_size, activity_horizon):
+        """
+        Device rows from the hourly rollups, which hold the counts of every log
+        ingested, and the first and last raw log of each device.
+
+        Flagged activity has no rollup: it is recounted from the raw logs only
+        while they are complete (``activity_horizon`` is None).
+        """
+        existing = {device.device_identifier: device for device in Device.objects.all()}
+        counters = {log_type: name for name, log_type in DEVICE_COUNTERS.items()}
+        devices = defaultdict(lambda: dict.fromkeys(DEVICE_COUNTERS, 0))
+        for row in LogHourlyRollup.objects.order_by().values('device_identifier', 'log_type').annotate(
+            count=Sum('count'), first_hour=Min('hour'), last_hour=Max('hour'),
+        ):
+            device = devices[row['device_identifier']]
+            device[counters[row['log_type']]] = row['count']
+            device['first_seen'] = min(device.get('first_seen', row['first_hour']), row['first_hour'])
+            device['last_seen'] = max(device.get('last_seen', row['last_hour']), row['last_hour'])
+
+        raw = BaseLog.objects.order_by().values('device_identifier').annotate(
+            first_seen=Min('timestamp'),
+            last_seen=Max('timestamp'),
+            flagged_count=Count('id', filter=Q(log_type='activity', activitylog__is_flagged=True)),
+        )
+        for row in raw.iterator():
+            device = devices[row['device_identifier']]
+            # The rollups only know the hour of the first log; the raw log is exact when it is in that hour
+            if 'first_seen' not in device or truncate_hour(row['first_seen']) <= device['first_seen']:
+                device['first_seen'] = row['first_seen']
+            device['last_seen'] = row['last_seen']
+            if activity_horizon is None:
+                device['flagged_count'] = row['flagged_count']
+
+        rows = []
+        for device_identifier, device in devices.items():
+            previous = existing.get(device_identifier)
+            if activity_horizon is not None or 'flagged_count' not in device:
+                device['flagged_count'] = previous.flagged_count if previous else 0
+            rows.append(Device(
+                device_identifier=device_identifier,
+                # Addresses and agent versions are not in the logs, so keep the last ones recorded
+                last_ip=previous.last_ip if previous else None,
+                agent_version=previous.agent_version if previous else '',
+                **device,
+            ))
+        Device.objects.all().delete()
+        Device.objects.bulk_create(rows, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(rows)} device rows"
+            + ("" if activity_horizon is None else "; flagged counts kept, older activity is no longer raw")
+        ))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from dashboard.loaders import load_log_details
+from dashboard.models import BaseLog, LogSearchDocument
+from dashboard.search import (
+    SEARCH_FIELDS, build_search_document, ensure_search_schema, rebuild_fts_index,
+)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search documents and index from the raw logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            ensure_search_schema(connection)
+            LogSearchDocument.objects.all().delete()
+
+            indexed = 0
+            logs = BaseLog.objects.order_by().only('id', 'timestamp', 'device_identifier', 'log_type', 'description')
+            batch = []
+            for log in logs.iterator(chunk_size=batch_size):
+                batch.append(log)
+                if len(batch) >= batch_size:
+                    indexed += self.index_batch(batch, batch_size)
+                    batch = []
+            if batch:
+                indexed += self.index_batch(batch, batch_size)
+
+            rebuild_fts_index(connection)
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} logs"))
+
+    def index_batch(self, logs, batch_size):
+        details = load_log_details(logs)
+        documents = []
+        for log in logs:
+            row = details.get(log.id) or {}
+            values = [row.get(field) for field in SEARCH_FIELDS.get(log.log_type, [])]
+            documents.append(LogSearchDocument(
+                log_id=log.id,
+                timestamp=log.timestamp,
+                device_identifier=log.device_identifier,
+                log_type=log.log_type,
+                document=build_search_document(log.description, log.device_identifier, values),
+            ))
+        LogSearchDocument.objects.bulk_create(documents, batch_size=batch_size)
+        return len(documents)
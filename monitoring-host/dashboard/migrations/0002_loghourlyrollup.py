@@ -0,0 +1,54 @@
+# Generated by Django 5.0.1 on 2026-10-17 21:37
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def backfill_hourly_rollups(apps, schema_editor):
+    """
+    Roll up the logs stored before this table existed, as rebuild_rollups
+    does, so the histograms that read it do not start at the upgrade.
+    """
+    BaseLog = apps.get_model('dashboard', 'BaseLog')
+    LogHourlyRollup = apps.get_model('dashboard', 'LogHourlyRollup')
+    buckets = (
+        BaseLog.objects.order_by()
+        .annotate(hour=TruncHour('timestamp'))
+        .values('hour', 'device_identifier', 'log_type')
+        .annotate(count=Count('id'))
+    )
+    LogHourlyRollup.objects.bulk_create(
+        (LogHourlyRollup(**bucket) for bucket in buckets.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the hour bucket')),
+                ('device_identifier', models.CharField(max_length=255)),
+                ('log_type', models.CharField(choices=[('activity', 'Activity'), ('app_usage', 'App Usage'), ('website_visit', 'Website Visit'), ('file_access', 'File Access'), ('usb_device', 'USB Device')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Hourly Log Rollup',
+                'verbose_name_plural': 'Hourly Log Rollups',
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='loghourlyrollup',
+            constraint=models.UniqueConstraint(fields=('hour', 'device_identifier', 'log_type'), name='unique_log_hourly_rollup'),
+        ),
+        migrations.RunPython(backfill_hourly_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.0.1 on 2026-10-17 21:38
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def backfill_keyword_counters(apps, schema_editor):
+    """Count the keywords of the activity logs stored before this table existed, as rebuild_rollups does"""
+    ActivityLog = apps.get_model('dashboard', 'ActivityLog')
+    KeywordCounter = apps.get_model('dashboard', 'KeywordCounter')
+    activity = ActivityLog.objects.order_by().exclude(keywords__isnull=True)
+    counts = Counter()
+    for timestamp, device_identifier, keywords in activity.values_list(
+        'timestamp', 'device_identifier', 'keywords'
+    ).iterator(chunk_size=1000):
+        for keyword in keywords or []:
+            counts[(timestamp.date(), device_identifier, keyword[:255])] += 1
+
+    KeywordCounter.objects.bulk_create(
+        (
+            KeywordCounter(day=day, device_identifier=device_identifier, keyword=keyword, count=count)
+            for (day, device_identifier, keyword), count in counts.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_loghourlyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeywordCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('device_identifier', models.CharField(max_length=255)),
+                ('keyword', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Keyword Counter',
+                'verbose_name_plural': 'Keyword Counters',
+                'ordering': ['-day', '-count'],
+                'indexes': [models.Index(fields=['day', '-count'], name='keyword_counter_day_count_idx'), models.Index(fields=['device_identifier', 'day', '-count'], name='keyword_counter_device_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='keywordcounter',
+            constraint=models.UniqueConstraint(fields=('day', 'device_identifier', 'keyword'), name='unique_keyword_counter'),
+        ),
+        migrations.RunPython(backfill_keyword_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-17 21:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_keywordcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(condition=models.Q(('is_flagged', True)), fields=['baselog_ptr'], name='activity_flagged_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(condition=models.Q(('is_flagged', True), ('screenshot__isnull', False), models.Q(('screenshot', ''), _negated=True)), fields=['baselog_ptr'], name='activity_flagged_shot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='baselog',
+            index=models.Index(fields=['-timestamp'], name='baselog_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='baselog',
+            index=models.Index(fields=['device_identifier', '-timestamp'], name='baselog_device_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='baselog',
+            index=models.Index(fields=['log_type', '-timestamp'], name='baselog_type_timestamp_idx'),
+        ),
+    ]
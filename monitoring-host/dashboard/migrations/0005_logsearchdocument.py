@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-17 21:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    from dashboard.search import ensure_search_schema
+    ensure_search_schema(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from dashboard.search import drop_search_schema
+    drop_search_schema(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_log_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogSearchDocument',
+            fields=[
+                ('log', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='dashboard.baselog')),
+                ('timestamp', models.DateTimeField()),
+                ('device_identifier', models.CharField(max_length=255)),
+                ('log_type', models.CharField(choices=[('activity', 'Activity'), ('app_usage', 'App Usage'), ('website_visit', 'Website Visit'), ('file_access', 'File Access'), ('usb_device', 'USB Device')], max_length=20)),
+                ('document', models.TextField(help_text='Normalized searchable text of the log and its details')),
+            ],
+            options={
+                'verbose_name': 'Log Search Document',
+                'verbose_name_plural': 'Log Search Documents',
+                'indexes': [models.Index(fields=['-timestamp'], name='search_document_timestamp_idx')],
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
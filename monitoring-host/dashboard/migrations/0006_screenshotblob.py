@@ -0,0 +1,54 @@
+# Generated by Django 5.0.1 on 2026-10-17 21:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_logsearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='preview',
+            field=models.ImageField(blank=True, null=True, upload_to='screenshots/thumbs/'),
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='screenshots/thumbs/'),
+        ),
+        migrations.CreateModel(
+            name='ScreenshotBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('dhash', models.CharField(help_text='Perceptual difference hash used to spot near-duplicates', max_length=64)),
+                ('signature', models.BinaryField(default=b'', help_text='Compressed low-resolution greyscale copy confirming near-duplicates')),
+                ('device_identifier', models.CharField(help_text='Device that first uploaded the image', max_length=255)),
+                ('image', models.ImageField(max_length=255, upload_to='screenshots/')),
+                ('thumbnail', models.ImageField(blank=True, max_length=255, upload_to='screenshots/thumbs/')),
+                ('preview', models.ImageField(blank=True, max_length=255, upload_to='screenshots/thumbs/')),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('size', models.PositiveIntegerField(default=0, help_text='Size of the original image in bytes')),
+                ('reference_count', models.PositiveIntegerField(default=0, help_text='Uploads resolved to this image')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Screenshot Blob',
+                'verbose_name_plural': 'Screenshot Blobs',
+                'indexes': [models.Index(fields=['device_identifier', '-last_seen'], name='screenshot_blob_device_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='screenshot_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activity_logs', to='dashboard.screenshotblob'),
+        ),
+    ]
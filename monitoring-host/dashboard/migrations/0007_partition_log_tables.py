@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def partition_log_tables(apps, schema_editor):
+    # Rewrites every log table once; on a large existing database run this during a maintenance window
+    from dashboard.partitions import partition_log_tables
+    partition_log_tables(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    """
+    Range-partition the log tables on PostgreSQL (a no-op on other databases).
+
+    The partitioned layout matches the model state, so rolling back leaves it in place.
+    """
+
+    dependencies = [
+        ('dashboard', '0006_screenshotblob'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_log_tables, migrations.RunPython.noop),
+    ]
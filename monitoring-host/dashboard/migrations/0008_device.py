@@ -0,0 +1,79 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:10
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+
+# BaseLog.log_type -> Device counter
+COUNTERS = {
+    'activity': 'activity_count',
+    'app_usage': 'app_usage_count',
+    'website_visit': 'website_visits',
+    'file_access': 'file_operations',
+    'usb_device': 'usb_events',
+}
+
+
+def backfill_devices(apps, schema_editor):
+    """
+    Device rows for the devices that sent logs before this table existed,
+    with their log counts, flagged activity and first and last log.
+    Addresses and agent versions are not in the logs, so they stay empty
+    until the device next sends.
+    """
+    BaseLog = apps.get_model('dashboard', 'BaseLog')
+    Device = apps.get_model('dashboard', 'Device')
+    totals = BaseLog.objects.order_by().values('device_identifier', 'log_type').annotate(
+        count=Count('id'),
+        flagged=Count('id', filter=Q(activitylog__is_flagged=True)),
+        first_seen=Min('timestamp'),
+        last_seen=Max('timestamp'),
+    )
+    devices = {}
+    for row in totals.iterator():
+        device = devices.get(row['device_identifier'])
+        if device is None:
+            device = devices[row['device_identifier']] = Device(
+                device_identifier=row['device_identifier'],
+                first_seen=row['first_seen'],
+                last_seen=row['last_seen'],
+            )
+        setattr(device, COUNTERS[row['log_type']], row['count'])
+        device.flagged_count += row['flagged']
+        device.first_seen = min(device.first_seen, row['first_seen'])
+        device.last_seen = max(device.last_seen, row['last_seen'])
+    Device.objects.bulk_create(devices.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_partition_log_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Device',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_identifier', models.CharField(max_length=255, unique=True)),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_ip', models.GenericIPAddressField(blank=True, help_text='Address of the last ingest request', null=True)),
+                ('agent_version', models.CharField(blank=True, help_text='Agent version of the last ingest request', max_length=64)),
+                ('activity_count', models.PositiveIntegerField(default=0)),
+                ('app_usage_count', models.PositiveIntegerField(default=0)),
+                ('website_visits', models.PositiveIntegerField(default=0)),
+                ('file_operations', models.PositiveIntegerField(default=0)),
+                ('usb_events', models.PositiveIntegerField(default=0)),
+                ('flagged_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Device',
+                'verbose_name_plural': 'Devices',
+                'ordering': ['-last_seen'],
+                'indexes': [models.Index(fields=['-last_seen'], name='device_last_seen_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_devices, migrations.RunPython.noop),
+    ]
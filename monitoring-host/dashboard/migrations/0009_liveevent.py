@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_device'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('kind', models.CharField(choices=[('counts', 'New logs per type'), ('flagged', 'Flagged activity'), ('heartbeat', 'Device heartbeat')], max_length=20)),
+                ('payload', models.JSONField(default=dict)),
+            ],
+            options={
+                'verbose_name': 'Live Event',
+                'verbose_name_plural': 'Live Events',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['created_at'], name='live_event_created_idx')],
+            },
+        ),
+    ]
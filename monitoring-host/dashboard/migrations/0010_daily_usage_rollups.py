@@ -0,0 +1,60 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_liveevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebsiteDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('device_identifier', models.CharField(max_length=255)),
+                ('url', models.URLField()),
+                ('title', models.CharField(blank=True, help_text='Title of the latest visit', max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_duration', models.BigIntegerField(default=0, help_text='Seconds')),
+            ],
+            options={
+                'verbose_name': 'Daily Website Rollup',
+                'verbose_name_plural': 'Daily Website Rollups',
+                'ordering': ['-day', '-count'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AppUsageDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('device_identifier', models.CharField(max_length=255)),
+                ('app_name', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_duration', models.BigIntegerField(default=0, help_text='Seconds')),
+                ('active_duration', models.BigIntegerField(default=0, help_text='Seconds the app was active')),
+            ],
+            options={
+                'verbose_name': 'Daily App Usage Rollup',
+                'verbose_name_plural': 'Daily App Usage Rollups',
+                'ordering': ['-day', '-total_duration'],
+                'indexes': [models.Index(fields=['device_identifier', 'day'], name='app_rollup_device_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='appusagedailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'device_identifier', 'app_name'), name='unique_app_usage_daily_rollup'),
+        ),
+        migrations.AddIndex(
+            model_name='websitedailyrollup',
+            index=models.Index(fields=['device_identifier', 'day'], name='website_rollup_device_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='websitedailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'device_identifier', 'url'), name='unique_website_daily_rollup'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_daily_usage_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appusagelog',
+            name='ended_at',
+            field=models.DateTimeField(blank=True, help_text='Last sample merged into this span', null=True),
+        ),
+        migrations.AddField(
+            model_name='appusagelog',
+            name='samples',
+            field=models.PositiveIntegerField(default=1, help_text='Agent samples merged into this span'),
+        ),
+        migrations.AddField(
+            model_name='websitevisitlog',
+            name='ended_at',
+            field=models.DateTimeField(blank=True, help_text='Last sample merged into this span', null=True),
+        ),
+        migrations.AddField(
+            model_name='websitevisitlog',
+            name='samples',
+            field=models.PositiveIntegerField(default=1, help_text='Agent samples merged into this span'),
+        ),
+    ]
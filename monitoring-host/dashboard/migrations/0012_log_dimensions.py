@@ -0,0 +1,137 @@
+from functools import partial
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def intern_column(model_name, name, dimension_name, apps, schema_editor):
+    """Insert the distinct strings of ``name`` into the dimension table and point every row at its string"""
+    model = apps.get_model('dashboard', model_name)
+    dimension = apps.get_model('dashboard', dimension_name)
+    values = model.objects.order_by().exclude(**{f'{name}__isnull': True}).values_list(name, flat=True).distinct()
+    dimension.objects.bulk_create(
+        [dimension(value=value) for value in values.iterator()], batch_size=1000, ignore_conflicts=True,
+    )
+    model.objects.update(**{
+        f'{name}_interned': Subquery(dimension.objects.filter(value=OuterRef(name)).values('pk')[:1]),
+    })
+    check_constraints(schema_editor)
+
+
+def restore_column(model_name, name, dimension_name, apps, schema_editor):
+    model = apps.get_model('dashboard', model_name)
+    dimension = apps.get_model('dashboard', dimension_name)
+    model.objects.update(**{
+        name: Coalesce(
+            Subquery(dimension.objects.filter(pk=OuterRef(f'{name}_interned')).values('value')[:1]), Value(''),
+        ),
+    })
+    check_constraints(schema_editor)
+
+
+def check_constraints(schema_editor):
+    # PostgreSQL refuses to alter a table with deferred foreign key checks still pending
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        schema_editor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+
+def intern_field(model_name, name, dimension_name, string_field, **options):
+    """
+    Operations replacing the string column ``name`` by a foreign key to ``dimension_name``.
+
+    The key is added alongside as ``<name>_interned``, filled from the strings,
+    and takes the column's name once the strings are dropped. ``string_field``
+    is the column's definition with a default, which only rolling back uses:
+    the column comes back holding the default, then the strings are restored.
+    """
+    to = f'dashboard.{dimension_name.lower()}'
+    temporary = f'{name}_interned'
+    return [
+        migrations.AddField(
+            model_name=model_name,
+            name=temporary,
+            field=models.ForeignKey(
+                db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=to,
+            ),
+        ),
+        migrations.RunPython(
+            partial(intern_column, model_name, name, dimension_name),
+            partial(restore_column, model_name, name, dimension_name),
+        ),
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(model_name=model_name, name=name, field=string_field),
+        ]),
+        migrations.RemoveField(model_name=model_name, name=name),
+        migrations.RenameField(model_name=model_name, old_name=temporary, new_name=name),
+        migrations.AlterField(
+            model_name=model_name,
+            name=name,
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to=to, **options),
+        ),
+    ]
+
+
+def dimension_model(name, verbose_name, verbose_name_plural, value):
+    return migrations.CreateModel(
+        name=name,
+        fields=[
+            ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ('value', value),
+        ],
+        options={
+            'verbose_name': verbose_name,
+            'verbose_name_plural': verbose_name_plural,
+            'abstract': False,
+        },
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Store the repeated strings of the log and daily rollup tables once, in dimension tables.
+
+    Every log row is rewritten once; on a large existing database run this
+    during a maintenance window. Rolling back restores the strings.
+    """
+
+    dependencies = [
+        ('dashboard', '0011_log_spans'),
+    ]
+
+    operations = [
+        dimension_model('AppName', 'App Name', 'App Names', models.CharField(max_length=255, unique=True)),
+        dimension_model('WindowTitle', 'Window Title', 'Window Titles', models.CharField(max_length=255, unique=True)),
+        dimension_model('WebsiteUrl', 'Website URL', 'Website URLs', models.URLField(unique=True)),
+        dimension_model('PageTitle', 'Page Title', 'Page Titles', models.CharField(max_length=255, unique=True)),
+        dimension_model('FilePath', 'File Path', 'File Paths', models.CharField(max_length=512, unique=True)),
+        dimension_model('ProcessName', 'Process Name', 'Process Names', models.CharField(max_length=255, unique=True)),
+        # The unique keys of the rollups include the columns being replaced
+        migrations.RemoveConstraint(model_name='appusagedailyrollup', name='unique_app_usage_daily_rollup'),
+        migrations.RemoveConstraint(model_name='websitedailyrollup', name='unique_website_daily_rollup'),
+        *intern_field('appusagelog', 'app_name', 'AppName', models.CharField(default='', max_length=255)),
+        *intern_field('appusagelog', 'window_title', 'WindowTitle', models.CharField(default='', max_length=255)),
+        *intern_field('websitevisitlog', 'url', 'WebsiteUrl', models.URLField(default='')),
+        *intern_field('websitevisitlog', 'title', 'PageTitle', models.CharField(default='', max_length=255)),
+        *intern_field('fileaccesslog', 'file_path', 'FilePath', models.CharField(default='', max_length=512)),
+        *intern_field('fileaccesslog', 'process_name', 'ProcessName', models.CharField(default='', max_length=255)),
+        *intern_field('appusagedailyrollup', 'app_name', 'AppName', models.CharField(default='', max_length=255)),
+        *intern_field('websitedailyrollup', 'url', 'WebsiteUrl', models.URLField(default='')),
+        *intern_field(
+            'websitedailyrollup', 'title', 'PageTitle',
+            models.CharField(blank=True, default='', help_text='Title of the latest visit', max_length=255),
+            blank=True, null=True, help_text='Title of the latest visit',
+        ),
+        migrations.AddConstraint(
+            model_name='appusagedailyrollup',
+            constraint=models.UniqueConstraint(
+                fields=('day', 'device_identifier', 'app_name'), name='unique_app_usage_daily_rollup',
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='websitedailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'device_identifier', 'url'), name='unique_website_daily_rollup'),
+        ),
+    ]
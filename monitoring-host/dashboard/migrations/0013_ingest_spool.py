@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_log_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(help_text='Segment file of the ingest spool', max_length=255, unique=True)),
+                ('offset', models.BigIntegerField(default=0, help_text='Bytes of the segment loaded into the database')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Ingest Checkpoint',
+                'verbose_name_plural': 'Ingest Checkpoints',
+            },
+        ),
+        # Python-side default only; SQLite would otherwise rebuild the log table for nothing
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='baselog',
+                name='timestamp',
+                field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+            ),
+        ]),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_ingest_spool'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='screenshotblob',
+            name='reference_count',
+            field=models.PositiveIntegerField(default=0, help_text='Activity logs pointing at this image'),
+        ),
+        migrations.AlterField(
+            model_name='screenshotblob',
+            name='signature',
+            field=models.BinaryField(default=b'', help_text='Compressed low-resolution colour copy confirming near-duplicates'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # Skipped when the table exists or CACHES uses another backend
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+    """
+    Create the table of the default database cache (see CACHES in settings.py),
+    so that a migrated database is ready for ingest without a separate step.
+    """
+
+    dependencies = [
+        ('dashboard', '0014_screenshot_blob_colour_signature'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -10,7 +10,8 @@ class BaseLog(models.Model):
         ('usb_device', 'USB Device'),
     ]
 
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the server accepted the log, which for spooled payloads is before they are loaded
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     description = models.TextField(blank=True, null=True)
     log_type = models.CharField(max_length=20, choices=LOG_TYPES)
     device_identifier = models.CharField(max_length=255, help_text="Unique identifier for the device")
@@ -19,6 +20,11 @@ class BaseLog(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Base Log'
         verbose_name_plural = 'Base Logs'
+        indexes = [
+            models.Index(fields=['-timestamp'], name='baselog_timestamp_idx'),
+            models.Index(fields=['device_identifier', '-timestamp'], name='baselog_device_timestamp_idx'),
+            models.Index(fields=['log_type', '-timestamp'], name='baselog_type_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"{self.timestamp} - {self.device_identifier} ({self.log_type})"
@@ -27,13 +33,33 @@ class ActivityLog(BaseLog):
     window_title = models.CharField(max_length=255)
     clipboard = models.TextField(blank=True)
     screenshot = models.ImageField(upload_to='screenshots/', blank=True, null=True)
+    screenshot_blob = models.ForeignKey(
+        'ScreenshotBlob', on_delete=models.SET_NULL, blank=True, null=True, related_name='activity_logs',
+    )
+    thumbnail = models.ImageField(upload_to='screenshots/thumbs/', blank=True, null=True)
+    preview = models.ImageField(upload_to='screenshots/thumbs/', blank=True, null=True)
     is_flagged = models.BooleanField(default=False)
     confidence = models.FloatField(default=0.0)
     analysis = models.TextField(blank=True)
     keywords = models.JSONField(default=list, blank=True, null=True)
 
-    def save(self, *args, **kwargs):
-        self.log_type = 'activity'
+    LOG_TYPE = 'activity'
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['baselog_ptr'],
+                name='activity_flagged_idx',
+                condition=models.Q(is_flagged=True),
+            ),
+            models.Index(
+                fields=['baselog_ptr'],
+                name='activity_flagged_shot_idx',
+                condition=models.Q(is_flagged=True, screenshot__isnull=False) & ~models.Q(screenshot=''),
+            ),
+        ]
+
+    def build_description(self):
         # Generate a descriptive summary
         flag_status = "🚩 Flagged" if self.is_flagged else "✓ Normal"
         keywords_info = ""
@@ -44,9 +70,12 @@ class ActivityLog(BaseLog):
             keywords_info = f" [Keywords: {keywords_str}]"
         
         if self.screenshot:
-            self.description = f"{flag_status} activity in '{self.window_title}' (with screenshot){keywords_info}"
-        else:
-            self.description = f"{flag_status} activity in '{self.window_title}'{keywords_info}"
+            return f"{flag_status} activity in '{self.window_title}' (with screenshot){keywords_info}"
+        return f"{flag_status} activity in '{self.window_title}'{keywords_info}"
+
+    def save(self, *args, **kwargs):
+        self.log_type = self.LOG_TYPE
+        self.description = self.build_description()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -54,19 +83,26 @@ class ActivityLog(BaseLog):
         return f"{self.timestamp} - {self.window_title} ({flag_status})"
 
 class AppUsageLog(BaseLog):
-    app_name = models.CharField(max_length=255)
-    window_title = models.CharField(max_length=255)
+    app_name = models.ForeignKey('AppName', on_delete=models.PROTECT, db_index=False)
+    window_title = models.ForeignKey('WindowTitle', on_delete=models.PROTECT, db_index=False)
     duration = models.IntegerField(default=0)  # Duration in seconds
     is_active = models.BooleanField(default=False)
+    ended_at = models.DateTimeField(blank=True, null=True, help_text="Last sample merged into this span")
+    samples = models.PositiveIntegerField(default=1, help_text="Agent samples merged into this span")
 
-    def save(self, *args, **kwargs):
-        self.log_type = 'app_usage'
+    LOG_TYPE = 'app_usage'
+
+    def build_description(self):
         # Format duration for description
         minutes = self.duration // 60
         seconds = self.duration % 60
         duration_str = f"{minutes}m {seconds}s" if minutes > 0 else f"{seconds}s"
         status = "Active" if self.is_active else "Inactive"
-        self.description = f"{status}: {self.app_name} - '{self.window_title}' ({duration_str})"
+        return f"{status}: {self.app_name} - '{self.window_title}' ({duration_str})"
+
+    def save(self, *args, **kwargs):
+        self.log_type = self.LOG_TYPE
+        self.description = self.build_description()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -74,29 +110,37 @@ class AppUsageLog(BaseLog):
         return f"{self.timestamp} - {self.app_name} ({status}, {self.duration}s)"
 
 class WebsiteVisitLog(BaseLog):
-    url = models.URLField()
-    title = models.CharField(max_length=255)
+    url = models.ForeignKey('WebsiteUrl', on_delete=models.PROTECT, db_index=False)
+    title = models.ForeignKey('PageTitle', on_delete=models.PROTECT, db_index=False)
     duration = models.IntegerField(default=0)  # Duration in seconds
+    ended_at = models.DateTimeField(blank=True, null=True, help_text="Last sample merged into this span")
+    samples = models.PositiveIntegerField(default=1, help_text="Agent samples merged into this span")
 
-    def save(self, *args, **kwargs):
-        self.log_type = 'website_visit'
+    LOG_TYPE = 'website_visit'
+
+    def build_description(self):
         # Format duration for description
         minutes = self.duration // 60
         seconds = self.duration % 60
         duration_str = f"{minutes}m {seconds}s" if minutes > 0 else f"{seconds}s"
-        self.description = f"Visited '{self.title}' ({duration_str})"
+        return f"Visited '{self.title}' ({duration_str})"
+
+    def save(self, *args, **kwargs):
+        self.log_type = self.LOG_TYPE
+        self.description = self.build_description()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.timestamp} - {self.title} ({self.duration}s)"
 
 class FileAccessLog(BaseLog):
-    file_path = models.CharField(max_length=512)
+    file_path = models.ForeignKey('FilePath', on_delete=models.PROTECT, db_index=False)
     operation = models.CharField(max_length=50)  # create, modify, delete, read
-    process_name = models.CharField(max_length=255)
+    process_name = models.ForeignKey('ProcessName', on_delete=models.PROTECT, db_index=False)
 
-    def save(self, *args, **kwargs):
-        self.log_type = 'file_access'
+    LOG_TYPE = 'file_access'
+
+    def build_description(self):
         operation_icons = {
             'create': '📝',
             'modify': '✏️',
@@ -104,7 +148,11 @@ class FileAccessLog(BaseLog):
             'read': '👁️'
         }
         icon = operation_icons.get(self.operation.lower(), '❓')
-        self.description = f"{icon} {self.operation.title()} '{self.file_path}' by {self.process_name}"
+        return f"{icon} {self.operation.title()} '{self.file_path}' by {self.process_name}"
+
+    def save(self, *args, **kwargs):
+        self.log_type = self.LOG_TYPE
+        self.description = self.build_description()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -117,13 +165,257 @@ class USBDeviceLog(BaseLog):
     serial_number = models.CharField(max_length=255, blank=True)
     action = models.CharField(max_length=50)  # connected, disconnected
 
-    def save(self, *args, **kwargs):
-        self.log_type = 'usb_device'
+    LOG_TYPE = 'usb_device'
+
+    def build_description(self):
         icon = '🔌' if self.action.lower() == 'connected' else '🔌❌'
-        self.description = f"{icon} {self.action.title()}: {self.device_name} ({self.vendor_id}:{self.product_id})"
+        description = f"{icon} {self.action.title()}: {self.device_name} ({self.vendor_id}:{self.product_id})"
         if self.serial_number:
-            self.description += f" S/N: {self.serial_number}"
+            description += f" S/N: {self.serial_number}"
+        return description
+
+    def save(self, *args, **kwargs):
+        self.log_type = self.LOG_TYPE
+        self.description = self.build_description()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.timestamp} - {self.device_name} ({self.action})"
+
+class Dimension(models.Model):
+    """
+    A distinct string stored once and referenced by id from the log tables.
+
+    Rows are only ever added (see ``dimensions.intern``), so an id handed out
+    to a worker's cache keeps naming the same string.
+    """
+    value = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.value
+
+class AppName(Dimension):
+    class Meta:
+        verbose_name = 'App Name'
+        verbose_name_plural = 'App Names'
+
+class WindowTitle(Dimension):
+    class Meta:
+        verbose_name = 'Window Title'
+        verbose_name_plural = 'Window Titles'
+
+class WebsiteUrl(Dimension):
+    value = models.URLField(unique=True)
+
+    class Meta:
+        verbose_name = 'Website URL'
+        verbose_name_plural = 'Website URLs'
+
+class PageTitle(Dimension):
+    class Meta:
+        verbose_name = 'Page Title'
+        verbose_name_plural = 'Page Titles'
+
+class FilePath(Dimension):
+    value = models.CharField(max_length=512, unique=True)
+
+    class Meta:
+        verbose_name = 'File Path'
+        verbose_name_plural = 'File Paths'
+
+class ProcessName(Dimension):
+    class Meta:
+        verbose_name = 'Process Name'
+        verbose_name_plural = 'Process Names'
+
+class Device(models.Model):
+    device_identifier = models.CharField(max_length=255, unique=True)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+    last_ip = models.GenericIPAddressField(blank=True, null=True, help_text="Address of the last ingest request")
+    agent_version = models.CharField(max_length=64, blank=True, help_text="Agent version of the last ingest request")
+    activity_count = models.PositiveIntegerField(default=0)
+    app_usage_count = models.PositiveIntegerField(default=0)
+    website_visits = models.PositiveIntegerField(default=0)
+    file_operations = models.PositiveIntegerField(default=0)
+    usb_events = models.PositiveIntegerField(default=0)
+    flagged_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-last_seen']
+        verbose_name = 'Device'
+        verbose_name_plural = 'Devices'
+        indexes = [
+            models.Index(fields=['-last_seen'], name='device_last_seen_idx'),
+        ]
+
+    @property
+    def total_activities(self):
+        return (self.activity_count + self.app_usage_count + self.website_visits
+                + self.file_operations + self.usb_events)
+
+    def __str__(self):
+        return f"{self.device_identifier} (last seen {self.last_seen})"
+
+class ScreenshotBlob(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    dhash = models.CharField(max_length=64, help_text="Perceptual difference hash used to spot near-duplicates")
+    signature = models.BinaryField(default=b'', help_text="Compressed low-resolution colour copy confirming near-duplicates")
+    device_identifier = models.CharField(max_length=255, help_text="Device that first uploaded the image")
+    image = models.ImageField(upload_to='screenshots/', max_length=255)
+    thumbnail = models.ImageField(upload_to='screenshots/thumbs/', max_length=255, blank=True)
+    preview = models.ImageField(upload_to='screenshots/thumbs/', max_length=255, blank=True)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    size = models.PositiveIntegerField(default=0, help_text="Size of the original image in bytes")
+    reference_count = models.PositiveIntegerField(default=0, help_text="Activity logs pointing at this image")
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Screenshot Blob'
+        verbose_name_plural = 'Screenshot Blobs'
+        indexes = [
+            models.Index(fields=['device_identifier', '-last_seen'], name='screenshot_blob_device_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.width}x{self.height}, {self.reference_count} refs)"
+
+class LogSearchDocument(models.Model):
+    log = models.OneToOneField(BaseLog, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    timestamp = models.DateTimeField()
+    device_identifier = models.CharField(max_length=255)
+    log_type = models.CharField(max_length=20, choices=BaseLog.LOG_TYPES)
+    document = models.TextField(help_text="Normalized searchable text of the log and its details")
+
+    class Meta:
+        verbose_name = 'Log Search Document'
+        verbose_name_plural = 'Log Search Documents'
+        indexes = [
+            models.Index(fields=['-timestamp'], name='search_document_timestamp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp} - {self.device_identifier} ({self.log_type})"
+
+class LogHourlyRollup(models.Model):
+    hour = models.DateTimeField(help_text="Start of the hour bucket")
+    device_identifier = models.CharField(max_length=255)
+    log_type = models.CharField(max_length=20, choices=BaseLog.LOG_TYPES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-hour']
+        verbose_name = 'Hourly Log Rollup'
+        verbose_name_plural = 'Hourly Log Rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'device_identifier', 'log_type'], name='unique_log_hourly_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour} - {self.device_identifier} ({self.log_type}): {self.count}"
+
+class KeywordCounter(models.Model):
+    day = models.DateField()
+    device_identifier = models.CharField(max_length=255)
+    keyword = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day', '-count']
+        verbose_name = 'Keyword Counter'
+        verbose_name_plural = 'Keyword Counters'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'device_identifier', 'keyword'], name='unique_keyword_counter'),
+        ]
+        indexes = [
+            models.Index(fields=['day', '-count'], name='keyword_counter_day_count_idx'),
+            models.Index(fields=['device_identifier', 'day', '-count'], name='keyword_counter_device_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.device_identifier}: {self.keyword} ({self.count})"
+
+class AppUsageDailyRollup(models.Model):
+    day = models.DateField()
+    device_identifier = models.CharField(max_length=255)
+    app_name = models.ForeignKey(AppName, on_delete=models.PROTECT, db_index=False)
+    count = models.PositiveIntegerField(default=0)
+    total_duration = models.BigIntegerField(default=0, help_text="Seconds")
+    active_duration = models.BigIntegerField(default=0, help_text="Seconds the app was active")
+
+    class Meta:
+        ordering = ['-day', '-total_duration']
+        verbose_name = 'Daily App Usage Rollup'
+        verbose_name_plural = 'Daily App Usage Rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'device_identifier', 'app_name'], name='unique_app_usage_daily_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['device_identifier', 'day'], name='app_rollup_device_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.device_identifier}: {self.app_name} ({self.total_duration}s)"
+
+class WebsiteDailyRollup(models.Model):
+    day = models.DateField()
+    device_identifier = models.CharField(max_length=255)
+    url = models.ForeignKey(WebsiteUrl, on_delete=models.PROTECT, db_index=False)
+    title = models.ForeignKey(
+        PageTitle, on_delete=models.PROTECT, blank=True, null=True, db_index=False, help_text="Title of the latest visit",
+    )
+    count = models.PositiveIntegerField(default=0)
+    total_duration = models.BigIntegerField(default=0, help_text="Seconds")
+
+    class Meta:
+        ordering = ['-day', '-count']
+        verbose_name = 'Daily Website Rollup'
+        verbose_name_plural = 'Daily Website Rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'device_identifier', 'url'], name='unique_website_daily_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['device_identifier', 'day'], name='website_rollup_device_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.device_identifier}: {self.url} ({self.count})"
+
+class LiveEvent(models.Model):
+    KINDS = [
+        ('counts', 'New logs per type'),
+        ('flagged', 'Flagged activity'),
+        ('heartbeat', 'Device heartbeat'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    payload = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Live Event'
+        verbose_name_plural = 'Live Events'
+        indexes = [
+            models.Index(fields=['created_at'], name='live_event_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at} - {self.kind}"
+
+class IngestCheckpoint(models.Model):
+    segment = models.CharField(max_length=255, unique=True, help_text="Segment file of the ingest spool")
+    offset = models.BigIntegerField(default=0, help_text="Bytes of the segment loaded into the database")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Ingest Checkpoint'
+        verbose_name_plural = 'Ingest Checkpoints'
+
+    def __str__(self):
+        return f"{self.segment} @ {self.offset}"
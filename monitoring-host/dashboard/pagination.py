@@ -0,0 +1,214 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.settings import api_settings
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, reverse=False):
+    payload = json.dumps({'p': values, 'r': int(reverse)}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return payload['p'], bool(payload['r'])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+
+def estimate_count(queryset):
+    """
+    Planner row estimate for ``queryset``, or None where the database has no cheap estimate.
+
+    On PostgreSQL this is an EXPLAIN (no execution), so it costs the same on
+    a 50M row table as on an empty one.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor, count_estimate=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count_estimate = count_estimate
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a unique ordering such as ``('-timestamp', '-id')``.
+
+    Each page is a range scan that starts right after the row the cursor
+    points to, so deep pages cost the same as the first one and no COUNT(*)
+    is ever run. All ordering fields must sort in the same direction and the
+    last one must be unique.
+    """
+
+    def __init__(self, queryset, ordering=('-timestamp', '-id'), per_page=50, with_estimate=True):
+        descending = {field.startswith('-') for field in ordering}
+        if len(descending) != 1:
+            raise ValueError("Keyset ordering fields must all sort in the same direction")
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.descending = descending.pop()
+        self.per_page = per_page
+        self.with_estimate = with_estimate
+
+    def _position(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _parse_position(self, values):
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor("Cursor does not match the page ordering")
+        opts = self.queryset.model._meta
+        position = []
+        for field, value in zip(self.fields, values):
+            try:
+                model_field = opts.get_field(field)
+            except FieldDoesNotExist:
+                # Annotations such as a search rank are stored as plain JSON values
+                position.append(value)
+                continue
+            try:
+                position.append(model_field.to_python(value))
+            except ValidationError as e:
+                raise InvalidCursor(str(e))
+        return position
+
+    def _after(self, position, descending):
+        """Rows strictly after ``position`` in the given direction"""
+        # Built as  f1 <= v1 AND (f1 < v1 OR (f2 <= v2 AND (...)))  so the leading
+        # column stays a plain index range condition.
+        inclusive, strict = ('lte', 'lt') if descending else ('gte', 'gt')
+        condition = None
+        for field, value in reversed(list(zip(self.fields, position))):
+            if condition is None:
+                condition = Q(**{f'{field}__{strict}': value})
+            else:
+                condition = Q(**{f'{field}__{inclusive}': value}) & (
+                    Q(**{f'{field}__{strict}': value}) | condition
+                )
+        return condition
+
+    def page(self, cursor=None):
+        reverse = False
+        queryset = self.queryset
+        if cursor:
+            values, reverse = decode_cursor(cursor)
+            position = self._parse_position(values)
+            # Walking backwards means scanning in the opposite direction from the cursor
+            queryset = queryset.filter(self._after(position, self.descending != reverse))
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        if reverse and not has_more:
+            # Walked back to the beginning, which is just the first page
+            return self.page()
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                next_cursor = encode_cursor(self._position(rows[-1]))
+            if cursor and (has_more or not reverse):
+                previous_cursor = encode_cursor(self._position(rows[0]), reverse=True)
+
+        count_estimate = estimate_count(self.queryset) if self.with_estimate else None
+        return KeysetPage(rows, next_cursor, previous_cursor, count_estimate)
+
+
+class KeysetPagination(BasePagination):
+    """REST framework pagination backed by KeysetPaginator, ordered newest first"""
+    ordering = ('-timestamp', '-id')
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.ordering, self.get_page_size(request))
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self._link(self.page.next_cursor)),
+            ('previous', self._link(self.page.previous_cursor)),
+            ('count_estimate', self.page.count_estimate),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count_estimate': {'type': 'integer', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_html_context(self):
+        return {
+            'previous_url': self._link(self.page.previous_cursor),
+            'next_url': self._link(self.page.next_cursor),
+        }
@@ -0,0 +1,434 @@
+import logging
+import re
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    ActivityLog, AppUsageLog, WebsiteVisitLog, FileAccessLog, USBDeviceLog, BaseLog, LogSearchDocument,
+)
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = {'day': timedelta(days=1), 'week': timedelta(days=7)}
+BOUND_RE = re.compile(r"FOR VALUES FROM \('?([^']*?)'?\) TO \('?([^']*?)'?\)")
+
+Partition = namedtuple('Partition', 'name lower upper')
+
+
+class PartitionedTable:
+    """
+    A log table range-partitioned on PostgreSQL.
+
+    BaseLog and the search documents are partitioned by ``timestamp`` into
+    day or week partitions. The child tables have no timestamp of their own,
+    so they are partitioned by ``baselog_ptr_id`` into blocks of ids instead:
+    ids grow with time, so a block expires once every parent in it is gone.
+    Each table also has a DEFAULT partition catching rows outside the
+    prepared ranges; ``PartitionManager.ensure`` moves them out again.
+    """
+
+    def __init__(self, model, column, primary_key, by):
+        self.model = model
+        self.column = column
+        self.primary_key = primary_key
+        self.by = by
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    @property
+    def default_partition(self):
+        return f'{self.table}_default'
+
+    def partition_name(self, lower):
+        if self.by == 'time':
+            return f'{self.table}_p{lower:%Y%m%d}'
+        return f'{self.table}_i{lower}'
+
+    def literal(self, value):
+        if self.by == 'time':
+            return f"'{value.isoformat()}'"
+        return str(int(value))
+
+    def parse(self, value):
+        if self.by == 'time':
+            return datetime.fromisoformat(value)
+        return int(value)
+
+
+PARTITIONED_TABLES = [
+    PartitionedTable(BaseLog, 'timestamp', ('id', 'timestamp'), 'time'),
+    PartitionedTable(LogSearchDocument, 'timestamp', ('log_id', 'timestamp'), 'time'),
+] + [
+    PartitionedTable(model, 'baselog_ptr_id', ('baselog_ptr_id',), 'id')
+    for model in (ActivityLog, AppUsageLog, WebsiteVisitLog, FileAccessLog, USBDeviceLog)
+]
+
+
+def period_start(value, interval):
+    """Start (UTC midnight, Monday for weeks) of the partition period containing ``value``"""
+    start = datetime.combine(value.astimezone(dt_timezone.utc).date(), time.min, tzinfo=dt_timezone.utc)
+    if interval == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def list_partitions(cursor, spec):
+    """Range partitions of ``spec`` ordered by lower bound (the DEFAULT partition is left out)"""
+    cursor.execute(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass",
+        [spec.table],
+    )
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = BOUND_RE.match(bound)
+        if match:
+            partitions.append(Partition(name, spec.parse(match.group(1)), spec.parse(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition.lower)
+
+
+def insert_columns(cursor, table):
+    """Columns of ``table`` that can be copied (generated columns are recomputed)"""
+    cursor.execute(
+        "SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass "
+        "AND attnum > 0 AND NOT attisdropped AND attgenerated = '' ORDER BY attnum",
+        [table],
+    )
+    return ', '.join(connection.ops.quote_name(row[0]) for row in cursor.fetchall())
+
+
+def create_partition(cursor, spec, lower, upper, parent=None):
+    """
+    Create the partition [lower, upper) of ``spec``.
+
+    Rows of that range already sitting in the DEFAULT partition would make
+    the CREATE fail, so they are moved into the new partition first.
+    """
+    qn = connection.ops.quote_name
+    parent = parent or spec.table
+    name = spec.partition_name(lower)
+    bounds = f"FOR VALUES FROM ({spec.literal(lower)}) TO ({spec.literal(upper)})"
+    in_range = f"{qn(spec.column)} >= {spec.literal(lower)} AND {qn(spec.column)} < {spec.literal(upper)}"
+
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [spec.default_partition])
+    has_default = cursor.fetchone()[0]
+    stranded = False
+    if has_default:
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {qn(spec.default_partition)} WHERE {in_range})")
+        stranded = cursor.fetchone()[0]
+
+    if not stranded:
+        cursor.execute(f"CREATE TABLE {qn(name)} PARTITION OF {qn(parent)} {bounds}")
+        return name
+
+    columns = insert_columns(cursor, spec.default_partition)
+    cursor.execute(f"ALTER TABLE {qn(parent)} DETACH PARTITION {qn(spec.default_partition)}")
+    cursor.execute(f"CREATE TABLE {qn(name)} PARTITION OF {qn(parent)} {bounds}")
+    cursor.execute(
+        f"INSERT INTO {qn(name)} ({columns}) SELECT {columns} FROM {qn(spec.default_partition)} WHERE {in_range}"
+    )
+    cursor.execute(f"DELETE FROM {qn(spec.default_partition)} WHERE {in_range}")
+    cursor.execute(f"ALTER TABLE {qn(parent)} ATTACH PARTITION {qn(spec.default_partition)} DEFAULT")
+    logger.info("Moved rows stranded in %s into %s", spec.default_partition, name)
+    return name
+
+
+class PartitionManager:
+    """
+    Keeps the partitioned log tables ahead of time and applies retention.
+
+    ``ensure`` creates the partitions for the coming ``premake`` periods (and
+    the next id block of the child tables); ``expire`` drops, or only
+    detaches, the partitions that lie entirely before the retention cutoff,
+    which is a catalog operation instead of a DELETE of millions of rows.
+    """
+
+    def __init__(self, interval=None, premake=None, id_block=None, retention_days=None, conn=connection):
+        self.interval = interval or settings.LOG_PARTITION_INTERVAL
+        if self.interval not in INTERVALS:
+            raise ValueError(f"Unknown partition interval {self.interval!r}, expected one of {', '.join(INTERVALS)}")
+        self.premake = settings.LOG_PARTITION_PREMAKE if premake is None else premake
+        self.id_block = id_block or settings.LOG_PARTITION_ID_BLOCK
+        self.retention_days = settings.LOG_RETENTION_DAYS if retention_days is None else retention_days
+        self.conn = conn
+
+    @property
+    def supported(self):
+        if self.conn.vendor != 'postgresql':
+            return False
+        with self.conn.cursor() as cursor:
+            return is_partitioned(cursor, BaseLog._meta.db_table)
+
+    def floor(self, spec, value):
+        if spec.by == 'time':
+            return period_start(value, self.interval)
+        return value // self.id_block * self.id_block
+
+    def step(self, spec, lower):
+        if spec.by == 'time':
+            return period_start(lower, self.interval) + INTERVALS[self.interval]
+        return self.floor(spec, lower) + self.id_block
+
+    def horizon(self, cursor, spec, now):
+        """Key up to which partitions must exist ahead of new rows"""
+        if spec.by == 'time':
+            upper = period_start(now, self.interval)
+            for _ in range(self.premake + 1):
+                upper = self.step(spec, upper)
+            return upper
+        # The block holding the next id, plus one spare block for bursts
+        return self.floor(spec, self.last_id(cursor)) + 2 * self.id_block
+
+    def last_id(self, cursor):
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [BaseLog._meta.db_table])
+        cursor.execute(f"SELECT last_value FROM {cursor.fetchone()[0]}")
+        return cursor.fetchone()[0]
+
+    def plan(self, cursor, spec, now, source=None):
+        """
+        (lower, upper) ranges missing up to the horizon or holding rows stranded
+        in DEFAULT; with ``source``, the ranges for the rows of that plain table.
+        """
+        qn = connection.ops.quote_name
+        existing = [] if source else list_partitions(cursor, spec)
+        source = source or spec.default_partition
+
+        lower = self.floor(spec, now if spec.by == 'time' else self.last_id(cursor))
+        end = self.horizon(cursor, spec, now)
+        wanted = []
+        while lower < end:
+            wanted.append(lower)
+            lower = self.step(spec, lower)
+
+        if spec.by == 'time':
+            cursor.execute(
+                f"SELECT DISTINCT date_trunc('day', {qn(spec.column)} AT TIME ZONE 'UTC') "
+                f"FROM {qn(source)}"
+            )
+            stranded = {self.floor(spec, day.replace(tzinfo=dt_timezone.utc)) for (day,) in cursor.fetchall()}
+        else:
+            cursor.execute(
+                f"SELECT DISTINCT {qn(spec.column)} / %s FROM {qn(source)}", [self.id_block],
+            )
+            stranded = {block * self.id_block for (block,) in cursor.fetchall()}
+
+        missing = []
+        for period in sorted(set(wanted) | stranded):
+            # Partitions made with another interval or block size may cover part of a period
+            lower, period_end = period, self.step(spec, period)
+            while lower < period_end:
+                ranges = existing + [Partition(None, *m) for m in missing]
+                covering = next((p for p in ranges if p.lower <= lower < p.upper), None)
+                if covering:
+                    lower = covering.upper
+                    continue
+                upper = min([period_end] + [p.lower for p in ranges if p.lower > lower])
+                missing.append((lower, upper))
+                lower = upper
+        return missing
+
+    def ensure(self, now=None, dry_run=False):
+        """Create missing partitions; returns the names created"""
+        now = now or timezone.now()
+        created = []
+        for spec in PARTITIONED_TABLES:
+            with transaction.atomic(using=self.conn.alias), self.conn.cursor() as cursor:
+                for lower, upper in self.plan(cursor, spec, now):
+                    created.append(spec.partition_name(lower))
+                    if not dry_run:
+                        create_partition(cursor, spec, lower, upper)
+        return created
+
+    def expired(self, cursor, now):
+        """(spec, partition) pairs lying entirely before the retention cutoff"""
+        if not self.retention_days:
+            return []
+        cutoff = now - timedelta(days=self.retention_days)
+        expired = [
+            (spec, partition)
+            for spec in PARTITIONED_TABLES if spec.by == 'time'
+            for partition in list_partitions(cursor, spec) if partition.upper <= cutoff
+        ]
+
+        # A child block can go once none of its parents survives: its upper
+        # bound must not exceed the smallest id left in the kept partitions
+        qn = connection.ops.quote_name
+        dropped = {partition.name for spec, partition in expired if spec.model is BaseLog}
+        kept = [p.name for p in list_partitions(cursor, PARTITIONED_TABLES[0]) if p.name not in dropped]
+        kept.append(PARTITIONED_TABLES[0].default_partition)
+        cursor.execute(
+            "SELECT min(id) FROM (%s) kept" % " UNION ALL ".join(f"SELECT min(id) AS id FROM {qn(name)}" for name in kept)
+        )
+        oldest_kept = cursor.fetchone()[0]
+        if oldest_kept is None:
+            oldest_kept = self.last_id(cursor)
+        expired += [
+            (spec, partition)
+            for spec in PARTITIONED_TABLES if spec.by == 'id'
+            for partition in list_partitions(cursor, spec) if partition.upper <= oldest_kept
+        ]
+        return expired
+
+    def expire(self, now=None, detach=False, dry_run=False):
+        """Drop (or detach) expired partitions; returns the names affected"""
+        now = now or timezone.now()
+        qn = connection.ops.quote_name
+        with self.conn.cursor() as cursor:
+            expired = self.expired(cursor, now)
+        affected = []
+        for spec, partition in expired:
+            affected.append(partition.name)
+            if dry_run:
+                continue
+            with transaction.atomic(using=self.conn.alias), self.conn.cursor() as cursor:
+                if detach:
+                    # Left in place as a plain table, e.g. to archive with pg_dump before dropping it
+                    cursor.execute(f"ALTER TABLE {qn(spec.table)} DETACH PARTITION {qn(partition.name)}")
+                else:
+                    cursor.execute(f"DROP TABLE {qn(partition.name)}")
+        return affected
+
+    def status(self):
+        qn = connection.ops.quote_name
+        report = []
+        with self.conn.cursor() as cursor:
+            for spec in PARTITIONED_TABLES:
+                partitions = list_partitions(cursor, spec)
+                cursor.execute(f"SELECT count(*) FROM {qn(spec.default_partition)}")
+                report.append({
+                    'table': spec.table,
+                    'partitions': len(partitions),
+                    'oldest': partitions[0].lower if partitions else None,
+                    'newest': partitions[-1].upper if partitions else None,
+                    'default_rows': cursor.fetchone()[0],
+                })
+        return report
+
+
+def partition_table(cursor, spec, ranges):
+    """
+    Rebuild an existing table of ``spec`` as a partitioned table with ``ranges``.
+
+    PostgreSQL cannot partition a table in place: the partitioned table is
+    created alongside, filled, and swapped in. The primary key has to include
+    the partition key, so BaseLog's becomes (id, timestamp) and the foreign
+    keys pointing at BaseLog are dropped; Django still cascades deletes itself.
+    Indexes and the remaining foreign keys are recreated from their definitions.
+    """
+    qn = connection.ops.quote_name
+    table = spec.table
+    staging = f'{table}__partitioned'
+
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u'))",
+        [table, table],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass "
+        "AND contype = 'f' AND confrelid <> %s::regclass",
+        [table, BaseLog._meta.db_table],
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(
+        "SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass AND attidentity <> ''", [table],
+    )
+    identity = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute(
+        f"CREATE TABLE {qn(staging)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING IDENTITY "
+        f"INCLUDING GENERATED INCLUDING STORAGE) PARTITION BY RANGE ({qn(spec.column)})"
+    )
+    for lower, upper in ranges:
+        create_partition(cursor, spec, lower, upper, parent=staging)
+    cursor.execute(f"CREATE TABLE {qn(spec.default_partition)} PARTITION OF {qn(staging)} DEFAULT")
+    columns = insert_columns(cursor, table)
+    cursor.execute(f"INSERT INTO {qn(staging)} ({columns}) SELECT {columns} FROM {qn(table)}")
+
+    cursor.execute(f"DROP TABLE {qn(table)} CASCADE")
+    cursor.execute(f"ALTER TABLE {qn(staging)} RENAME TO {qn(table)}")
+    cursor.execute(
+        f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(table + '_pkey')} "
+        f"PRIMARY KEY ({', '.join(qn(column) for column in spec.primary_key)})"
+    )
+    for indexdef in indexes:
+        cursor.execute(indexdef)
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+    for column in identity:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [table, column])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f"SELECT setval(%s, COALESCE(max({qn(column)}), 0) + 1, false) FROM {qn(table)}", [sequence])
+        cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO {qn(f'{table}_{column}_seq')}")
+
+
+def partition_log_tables(conn=connection, manager=None):
+    """Convert the log tables to partitioned tables (PostgreSQL only, idempotent)"""
+    if conn.vendor != 'postgresql':
+        return False
+    manager = manager or PartitionManager(conn=conn)
+    now = timezone.now()
+    with conn.cursor() as cursor:
+        for spec in PARTITIONED_TABLES:
+            if is_partitioned(cursor, spec.table):
+                continue
+            ranges = manager.plan(cursor, spec, now, source=spec.table)
+            partition_table(cursor, spec, ranges)
+            logger.info("Partitioned %s into %d partitions", spec.table, len(ranges))
+    return True
+
+
+_enabled = None
+
+
+def partitioning_enabled():
+    global _enabled
+    if _enabled is None:
+        _enabled = PartitionManager().supported
+    return _enabled
+
+
+def id_bounds(since=None, until=None, field='pk'):
+    """
+    Lookups bounding ``field`` (a BaseLog id) to the logs from ``since`` to ``until``.
+
+    A time filter only prunes the BaseLog partitions; the id-partitioned
+    child tables are pruned when the query also carries the id range of the
+    logs in that window, which two index lookups on BaseLog provide. Empty
+    without partitioning, None when no log falls in the window.
+    """
+    if not partitioning_enabled():
+        return {}
+    bounds = {}
+    if since:
+        bounds[f'{field}__gte'] = (
+            BaseLog.objects.filter(timestamp__gte=since).order_by('id').values_list('id', flat=True).first()
+        )
+    if until:
+        bounds[f'{field}__lte'] = (
+            BaseLog.objects.filter(timestamp__lte=until).order_by('-id').values_list('id', flat=True).first()
+        )
+    if None in bounds.values():
+        return None
+    return bounds
+
+
+def prune_by_time(querysets, since=None, until=None):
+    """Bound querysets of BaseLog children by id as well as by time (see ``id_bounds``)"""
+    bounds = id_bounds(since, until)
+    if bounds is None:
+        return [queryset.none() for queryset in querysets]
+    return [queryset.filter(**bounds) for queryset in querysets]
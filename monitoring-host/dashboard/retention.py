@@ -0,0 +1,178 @@
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .fragments import bump_generations_on_commit
+from .models import ActivityLog, BaseLog, ScreenshotBlob
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_FIELDS = ('screenshot', 'thumbnail', 'preview')
+BLOB_FIELDS = ('image', 'thumbnail', 'preview')
+
+# Unreferenced blobs used this recently are left alone: an upload may be
+# resolving to one of them right now and attach its logs a moment later
+ORPHAN_GRACE = timedelta(hours=1)
+
+
+class RetentionReport:
+    """What a retention run deleted, or would delete on a dry run"""
+
+    def __init__(self):
+        self.logs = Counter()
+        self.screenshots = 0
+        self.blobs = 0
+        self.files = 0
+        self.bytes = 0
+
+    def as_dict(self):
+        return {
+            'logs': dict(self.logs),
+            'screenshots': self.screenshots,
+            'blobs': self.blobs,
+            'files': self.files,
+            'bytes': self.bytes,
+        }
+
+
+class RetentionEngine:
+    """
+    Deletes the raw logs and screenshots that are past their retention.
+
+    Each log type is kept for its LOG_RETENTION_POLICIES days; unflagged
+    activity loses its screenshot after SCREENSHOT_RETENTION_DAYS while
+    flagged activity keeps it. Rows are deleted ``batch_size`` at a time in
+    primary key order, each batch in its own short transaction followed by a
+    ``pause``, so ingest and the dashboards never queue behind a long lock.
+
+    Deleting raw logs downsamples them: the hourly and daily rollups, the
+    keyword counters and the device counters are left as they are. Stored
+    images are deleted once no activity log refers to them any more.
+    """
+
+    def __init__(self, policies=None, screenshot_days=None, batch_size=None, pause=None, dry_run=False):
+        self.policies = dict(settings.LOG_RETENTION_POLICIES if policies is None else policies)
+        unknown = set(self.policies) - {log_type for log_type, _ in BaseLog.LOG_TYPES}
+        if unknown:
+            raise ValueError(f"Unknown log types in retention policies: {', '.join(sorted(unknown))}")
+        self.screenshot_days = settings.SCREENSHOT_RETENTION_DAYS if screenshot_days is None else screenshot_days
+        self.batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+        self.pause = settings.RETENTION_BATCH_PAUSE if pause is None else pause
+        self.dry_run = dry_run
+
+    def run(self, now=None):
+        now = now or timezone.now()
+        report = RetentionReport()
+        for log_type, days in self.policies.items():
+            if days:
+                self.delete_logs(log_type, now - timedelta(days=days), report)
+        if self.screenshot_days:
+            self.clear_screenshots(now - timedelta(days=self.screenshot_days), report)
+        self.delete_orphaned_blobs(now - ORPHAN_GRACE, report)
+        return report
+
+    def batches(self, queryset):
+        """Primary keys of ``queryset`` in ascending chunks of at most ``batch_size``"""
+        last_pk = 0
+        while True:
+            pks = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:self.batch_size]
+            )
+            if not pks:
+                return
+            yield pks
+            if len(pks) < self.batch_size:
+                return
+            last_pk = pks[-1]
+            time.sleep(self.pause)
+
+    def delete_logs(self, log_type, cutoff, report):
+        """Delete the logs of ``log_type`` older than ``cutoff`` with their child rows and search documents"""
+        expired = BaseLog.objects.filter(log_type=log_type, timestamp__lt=cutoff)
+        if self.dry_run:
+            report.logs[log_type] += expired.count()
+            return
+
+        for pks in self.batches(expired):
+            files = self.legacy_files(pks) if log_type == ActivityLog.LOG_TYPE else set()
+            with transaction.atomic():
+                BaseLog.objects.filter(pk__in=pks).delete()
+                bump_generations_on_commit([log_type])
+            report.logs[log_type] += len(pks)
+            self.delete_unreferenced_files(files, report)
+        if report.logs[log_type]:
+            logger.info("Deleted %d %s logs older than %s", report.logs[log_type], log_type, cutoff)
+
+    def clear_screenshots(self, cutoff, report):
+        """Detach the screenshots of unflagged activity older than ``cutoff``"""
+        expired = (
+            ActivityLog.objects.filter(timestamp__lt=cutoff, is_flagged=False)
+            .exclude(screenshot__isnull=True).exclude(screenshot='')
+        )
+        if self.dry_run:
+            report.screenshots += expired.count()
+            return
+
+        for pks in self.batches(expired):
+            files = self.legacy_files(pks)
+            with transaction.atomic():
+                logs = list(ActivityLog.objects.filter(pk__in=pks))
+                for log in logs:
+                    log.screenshot_blob = None
+                    log.screenshot = log.thumbnail = log.preview = ''
+                    log.description = log.build_description()
+                ActivityLog.objects.bulk_update(logs, ['screenshot_blob', *SCREENSHOT_FIELDS, 'description'])
+                bump_generations_on_commit([ActivityLog.LOG_TYPE])
+            report.screenshots += len(logs)
+            self.delete_unreferenced_files(files, report)
+        if report.screenshots:
+            logger.info("Cleared %d unflagged screenshots older than %s", report.screenshots, cutoff)
+
+    def delete_orphaned_blobs(self, before, report):
+        """Delete the stored images that no activity log points at and that were last used before ``before``"""
+        orphaned = ScreenshotBlob.objects.filter(activity_logs__isnull=True, last_seen__lt=before)
+        if self.dry_run:
+            totals = orphaned.aggregate(blobs=Count('pk'), size=Sum('size', default=0))
+            report.blobs += totals['blobs']
+            report.bytes += totals['size']
+            return
+
+        for pks in self.batches(orphaned):
+            with transaction.atomic():
+                blobs = list(ScreenshotBlob.objects.filter(pk__in=pks, activity_logs__isnull=True))
+                ScreenshotBlob.objects.filter(pk__in=[blob.pk for blob in blobs]).delete()
+            report.blobs += len(blobs)
+            for blob in blobs:
+                for field in BLOB_FIELDS:
+                    self.delete_file(getattr(blob, field).name, report)
+
+    def legacy_files(self, pks):
+        """Files of the logs ``pks`` stored per upload, before screenshots were content addressed"""
+        rows = ActivityLog.objects.filter(pk__in=pks, screenshot_blob__isnull=True).values_list(*SCREENSHOT_FIELDS)
+        return {name for row in rows for name in row if name}
+
+    def delete_unreferenced_files(self, names, report):
+        if not names:
+            return
+        names = set(names)
+        referenced = Q()
+        for field in SCREENSHOT_FIELDS:
+            referenced |= Q(**{f'{field}__in': names})
+        for row in ActivityLog.objects.filter(referenced).values_list(*SCREENSHOT_FIELDS):
+            names.difference_update(row)
+        for name in names:
+            self.delete_file(name, report)
+
+    def delete_file(self, name, report):
+        if not name or not default_storage.exists(name):
+            return
+        report.bytes += default_storage.size(name)
+        default_storage.delete(name)
+        report.files += 1
@@ -0,0 +1,274 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db.models import F, Max, Q, Sum
+
+from .dimensions import adimension_values, dimension_values
+from .models import (
+    AppName, AppUsageDailyRollup, KeywordCounter, LogHourlyRollup, PageTitle, WebsiteDailyRollup, WebsiteUrl,
+)
+
+
+def truncate_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def increment_counters(model, key_fields, increments, assignments=None):
+    """
+    Add to counter columns of ``model`` rows identified by ``key_fields``.
+
+    ``increments`` maps key tuples to ``{field: amount}``. Missing rows are
+    created first, then every row is bumped with ``F() + amount`` in a single
+    UPDATE, so concurrent ingest requests never lose counts. ``assignments``
+    optionally maps key tuples to ``{field: value}`` (values or expressions)
+    set by that same UPDATE.
+    """
+    assignments = assignments or {}
+    if not increments:
+        return
+
+    keys = sorted(increments)
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in keys],
+        ignore_conflicts=True,
+    )
+
+    lookup = Q()
+    for key in keys:
+        lookup |= Q(**dict(zip(key_fields, key)))
+    rows = list(model.objects.filter(lookup).order_by('pk').only('pk', *key_fields))
+
+    updated_fields = set()
+    for row in rows:
+        key = tuple(getattr(row, field) for field in key_fields)
+        for field, amount in increments.get(key, {}).items():
+            setattr(row, field, F(field) + amount)
+            updated_fields.add(field)
+        for field, value in assignments.get(key, {}).items():
+            setattr(row, field, value)
+            updated_fields.add(field)
+    if updated_fields:
+        model.objects.bulk_update(rows, sorted(updated_fields))
+
+
+def record_hourly_rollups(logs):
+    """Fold a freshly ingested batch (as returned by BulkIngestor) into LogHourlyRollup"""
+    counts = Counter(
+        (truncate_hour(log.timestamp), log.device_identifier, log.log_type)
+        for rows in logs.values()
+        for log in rows
+    )
+    increment_counters(
+        LogHourlyRollup,
+        ('hour', 'device_identifier', 'log_type'),
+        {key: {'count': count} for key, count in counts.items()},
+    )
+
+
+def record_keyword_counters(logs):
+    """Count the keywords of a freshly ingested batch's activity logs per day and device"""
+    counts = Counter(
+        (log.timestamp.date(), log.device_identifier, keyword[:255])
+        for log in logs.get('activity_logs', [])
+        for keyword in (log.keywords or [])
+    )
+    increment_counters(
+        KeywordCounter,
+        ('day', 'device_identifier', 'keyword'),
+        {key: {'count': count} for key, count in counts.items()},
+    )
+
+
+def record_daily_usage(logs, extended=None):
+    """
+    Fold a freshly ingested batch's app usage and website visits into the daily rollups.
+
+    ``extended`` holds the stored spans the batch continued, as returned by
+    ``sessionize``: their added duration counts on the day the span started,
+    as it would when rebuilt from the raw rows, but they are not new visits.
+    """
+    extended = extended or {}
+    spans = {
+        key: [(log, 1, log.duration) for log in logs.get(key, [])]
+        + [(span, 0, duration) for span, duration in extended.get(key, [])]
+        for key in ('app_usage', 'website_visits')
+    }
+
+    # Keyed on the interned ids, like the rollup rows themselves
+    apps = {}
+    for log, count, duration in spans['app_usage']:
+        key = (log.timestamp.date(), log.device_identifier, log.app_name_id)
+        totals = apps.setdefault(key, {'count': 0, 'total_duration': 0, 'active_duration': 0})
+        totals['count'] += count
+        totals['total_duration'] += duration
+        if log.is_active:
+            totals['active_duration'] += duration
+    increment_counters(AppUsageDailyRollup, ('day', 'device_identifier', 'app_name_id'), apps)
+
+    websites = {}
+    titles = {}
+    for log, count, duration in spans['website_visits']:
+        key = (log.timestamp.date(), log.device_identifier, log.url_id)
+        totals = websites.setdefault(key, {'count': 0, 'total_duration': 0})
+        totals['count'] += count
+        totals['total_duration'] += duration
+        titles[key] = {'title_id': log.title_id}
+    increment_counters(WebsiteDailyRollup, ('day', 'device_identifier', 'url_id'), websites, titles)
+
+
+def _daily_rollups(model, since=None, until=None, device_identifiers=None):
+    rollups = model.objects.all()
+    if since:
+        rollups = rollups.filter(day__gte=since)
+    if until:
+        rollups = rollups.filter(day__lte=until)
+    if device_identifiers is not None:
+        rollups = rollups.filter(device_identifier__in=device_identifiers)
+    return rollups.order_by()
+
+
+def get_top_apps(limit=5, since=None, until=None, device_identifiers=None):
+    """
+    The ``limit`` applications with the most usage time, read from AppUsageDailyRollup only.
+
+    ``since`` and ``until`` are inclusive dates; omit them for all time, and
+    ``device_identifiers`` for the whole fleet. The rollups are grouped by
+    the interned app name ids; only the names of the winners are read.
+    """
+    ranking = list(_top_apps(since, until, device_identifiers)[:limit])
+    return _named_apps(ranking, dimension_values(AppName, [row['app_name'] for row in ranking]))
+
+
+async def aget_top_apps(limit=5, since=None, until=None, device_identifiers=None):
+    ranking = [row async for row in _top_apps(since, until, device_identifiers)[:limit]]
+    return _named_apps(ranking, await adimension_values(AppName, [row['app_name'] for row in ranking]))
+
+
+def _top_apps(since, until, device_identifiers):
+    return (
+        _daily_rollups(AppUsageDailyRollup, since, until, device_identifiers)
+        .values('app_name')
+        .annotate(
+            usage_count=Sum('count'),
+            total_duration=Sum('total_duration'),
+            active_time=Sum('active_duration'),
+        )
+        .order_by('-total_duration', 'app_name')
+    )
+
+
+def _named_apps(ranking, names):
+    for row in ranking:
+        row['app_name'] = names[row['app_name']]
+    return ranking
+
+
+def get_top_websites(limit=5, since=None, until=None, device_identifiers=None):
+    """
+    The ``limit`` most visited URLs, read from WebsiteDailyRollup only; see get_top_apps.
+
+    Each URL comes with the title of its latest visit in the range, kept by
+    its rollup rows of the last day it was visited.
+    """
+    rollups = _daily_rollups(WebsiteDailyRollup, since, until, device_identifiers)
+    ranking = list(_top_websites(rollups)[:limit])
+    titles = dict(_latest_titles(rollups, ranking)) if ranking else {}
+    return _named_websites(
+        ranking,
+        titles,
+        dimension_values(WebsiteUrl, [row['url'] for row in ranking]),
+        dimension_values(PageTitle, [title for title in titles.values() if title]),
+    )
+
+
+async def aget_top_websites(limit=5, since=None, until=None, device_identifiers=None):
+    rollups = _daily_rollups(WebsiteDailyRollup, since, until, device_identifiers)
+    ranking = [row async for row in _top_websites(rollups)[:limit]]
+    titles = dict([row async for row in _latest_titles(rollups, ranking)]) if ranking else {}
+    return _named_websites(
+        ranking,
+        titles,
+        await adimension_values(WebsiteUrl, [row['url'] for row in ranking]),
+        await adimension_values(PageTitle, [title for title in titles.values() if title]),
+    )
+
+
+def _top_websites(rollups):
+    return (
+        rollups.values('url')
+        .annotate(
+            visit_count=Sum('count'),
+            total_duration=Sum('total_duration'),
+            last_day=Max('day'),
+        )
+        .order_by('-visit_count', 'url')
+    )
+
+
+def _latest_titles(rollups, ranking):
+    """
+    ``(url id, title id)`` of the rollup rows of each ranked URL's last day.
+
+    A row keeps the title of its device's latest visit that day; when several
+    devices visited the URL on it, the row created last wins.
+    """
+    last_days = Q()
+    for row in ranking:
+        last_days |= Q(url=row['url'], day=row.pop('last_day'))
+    return rollups.filter(last_days).order_by('pk').values_list('url', 'title')
+
+
+def _named_websites(ranking, latest_titles, urls, titles):
+    for row in ranking:
+        row['title'] = titles.get(latest_titles.get(row['url']), '')
+        row['url'] = urls[row['url']]
+    return ranking
+
+
+def get_top_keywords(limit=10, device_identifier=None, since=None, until=None):
+    """
+    The ``limit`` most frequent keywords, read from KeywordCounter only.
+
+    ``since`` and ``until`` are inclusive dates; omit them for all time.
+    """
+    counters = KeywordCounter.objects.all()
+    if device_identifier:
+        counters = counters.filter(device_identifier=device_identifier)
+    if since:
+        counters = counters.filter(day__gte=since)
+    if until:
+        counters = counters.filter(day__lte=until)
+
+    ranking = (
+        counters.order_by()
+        .values('keyword')
+        .annotate(total=Sum('count'))
+        .order_by('-total', 'keyword')[:limit]
+    )
+    return [{'keyword': row['keyword'], 'count': row['total']} for row in ranking]
+
+
+def hourly_histogram(start, end, device_identifier=None, log_types=None):
+    """
+    Log counts per hour between ``start`` and ``end`` from a single rollup read.
+
+    Returns one ``{'hour': datetime, 'count': int}`` entry per hour bucket,
+    including empty ones, oldest first.
+    """
+    start = truncate_hour(start)
+    rollups = LogHourlyRollup.objects.filter(hour__gte=start, hour__lt=end)
+    if device_identifier:
+        rollups = rollups.filter(device_identifier=device_identifier)
+    if log_types:
+        rollups = rollups.filter(log_type__in=log_types)
+
+    counts = dict(
+        rollups.order_by().values('hour').annotate(total=Sum('count')).values_list('hour', 'total')
+    )
+
+    histogram = []
+    hour = start
+    while hour < end:
+        histogram.append({'hour': hour, 'count': counts.get(hour, 0)})
+        hour += timedelta(hours=1)
+    return histogram
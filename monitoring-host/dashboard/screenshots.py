@@ -0,0 +1,651 @@
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from .fragments import bump_generations_on_commit
+from .imaging import (
+    THUMBNAIL_SIZES, changed_fraction, dhash, hamming_distance, render_thumbnail, sha256_file, signature,
+)
+from .models import ActivityLog, ScreenshotBlob
+
+logger = logging.getLogger(__name__)
+
+# Spool layout: uploads/ receives file parts while a request is parsed,
+# files/ holds the uploaded bytes, a job's manifest moves pending/ ->
+# working/ while a worker owns it, and failed/ once retries run out.
+SPOOL_DIRS = ('uploads', 'files', 'pending', 'working', 'failed')
+
+# Multipart field of the screenshots sent by agents predating per-record parts
+LEGACY_SCREENSHOT_FIELD = 'screenshot'
+
+
+class ScreenshotMetrics:
+    """Thread-safe counters describing the upload pipeline of this process"""
+
+    COUNTERS = (
+        'spooled', 'queued', 'rejected', 'uploaded', 'deduplicated', 'near_duplicates',
+        'retried', 'failed', 'bytes_uploaded',
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.in_flight = 0
+        self.upload_seconds_total = 0.0
+        self.last_upload_seconds = None
+        self.last_error = None
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def upload_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def upload_finished(self, seconds, outcome=None, size=None, error=None):
+        with self._lock:
+            self.in_flight -= 1
+            if error is None:
+                self.counters[outcome] += 1
+                if outcome == 'uploaded':
+                    self.counters['bytes_uploaded'] += size or 0
+                self.upload_seconds_total += seconds
+                self.last_upload_seconds = seconds
+            else:
+                self.last_error = error
+
+    def snapshot(self):
+        with self._lock:
+            uploaded = self.counters['uploaded'] + self.counters['deduplicated'] + self.counters['near_duplicates']
+            return {
+                **self.counters,
+                'in_flight': self.in_flight,
+                'avg_upload_seconds': self.upload_seconds_total / uploaded if uploaded else None,
+                'last_upload_seconds': self.last_upload_seconds,
+                'last_error': self.last_error,
+            }
+
+
+class ScreenshotSpool:
+    """Local-disk staging area for screenshots waiting to reach the configured storage"""
+
+    def __init__(self, root):
+        self.root = str(root)
+
+    def path(self, area, name=''):
+        return os.path.join(self.root, area, name)
+
+    def ensure_dirs(self):
+        for area in SPOOL_DIRS:
+            os.makedirs(self.path(area), exist_ok=True)
+
+    def _write_json(self, area, job_id, manifest):
+        # Write-then-rename so a reader never sees a half written manifest
+        tmp = self.path(area, f'.{job_id}.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.path(area, f'{job_id}.json'))
+
+    def spool_file(self, uploaded_file, durable=False):
+        """
+        Move an uploaded file into the spool and return its job id, fsync'd to disk if ``durable``.
+
+        A part already streamed to a temporary file (see SpoolUploadHandler)
+        is renamed into place without reading it again; small in-memory
+        parts are written out.
+        """
+        self.ensure_dirs()
+        job_id = uuid.uuid4().hex
+        path = self.path('files', job_id)
+        if hasattr(uploaded_file, 'temporary_file_path'):
+            file_move_safe(uploaded_file.temporary_file_path(), path)
+            uploaded_file.close()
+            if durable:
+                _fsync_path(path)
+        else:
+            with open(path, 'wb') as f:
+                for chunk in uploaded_file.chunks():
+                    f.write(chunk)
+                if durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+        if durable:
+            # The new directory entry must survive a crash as well
+            _fsync_path(self.path('files'))
+        return job_id
+
+    def add_job(self, job_id, name, log_ids):
+        self._write_json('pending', job_id, {
+            'id': job_id,
+            'name': name,
+            'log_ids': log_ids,
+            'attempts': 0,
+            'not_before': 0,
+        })
+
+    def discard(self, job_id):
+        for area, name in (('files', job_id), ('pending', f'{job_id}.json'), ('working', f'{job_id}.json')):
+            try:
+                os.remove(self.path(area, name))
+            except FileNotFoundError:
+                pass
+
+    def claim(self, job_id):
+        """Move a pending job to working/ and return its manifest, or None if another worker got it"""
+        try:
+            os.rename(self.path('pending', f'{job_id}.json'), self.path('working', f'{job_id}.json'))
+        except FileNotFoundError:
+            return None
+        # Claim time is what requeue_stale() measures from
+        os.utime(self.path('working', f'{job_id}.json'))
+        with open(self.path('working', f'{job_id}.json')) as f:
+            return json.load(f)
+
+    def release(self, manifest):
+        """Hand a claimed job back to pending/ for a later attempt"""
+        self._write_json('pending', manifest['id'], manifest)
+        os.remove(self.path('working', f"{manifest['id']}.json"))
+
+    def fail(self, manifest):
+        self._write_json('failed', manifest['id'], manifest)
+        os.remove(self.path('working', f"{manifest['id']}.json"))
+
+    def complete(self, job_id):
+        os.remove(self.path('working', f'{job_id}.json'))
+        os.remove(self.path('files', job_id))
+
+    def _jobs(self, area):
+        try:
+            names = os.listdir(self.path(area))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith('.json') and not name.startswith('.'))
+
+    def pending_jobs(self):
+        return self._jobs('pending')
+
+    def pending_manifest(self, job_id):
+        """A pending job's manifest, or None once a worker claimed it"""
+        try:
+            with open(self.path('pending', f'{job_id}.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def failed_jobs(self):
+        return self._jobs('failed')
+
+    def retry_failed(self, job_id):
+        """Move a failed job back to pending/ with a fresh attempt budget"""
+        with open(self.path('failed', f'{job_id}.json')) as f:
+            manifest = json.load(f)
+        manifest.update(attempts=0, not_before=0)
+        self._write_json('pending', job_id, manifest)
+        os.remove(self.path('failed', f'{job_id}.json'))
+
+    def remove_stale_uploads(self, older_than):
+        """Delete the partial uploads of requests whose process died while parsing them"""
+        cutoff = time.time() - older_than
+        removed = 0
+        try:
+            names = os.listdir(self.path('uploads'))
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            try:
+                if os.path.getmtime(self.path('uploads', name)) < cutoff:
+                    os.remove(self.path('uploads', name))
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def requeue_stale(self, older_than):
+        """Return working/ jobs abandoned by a dead process to pending/"""
+        cutoff = time.time() - older_than
+        requeued = 0
+        try:
+            names = os.listdir(self.path('working'))
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            path = self.path('working', name)
+            if name.endswith('.json') and os.path.getmtime(path) < cutoff:
+                try:
+                    os.rename(path, self.path('pending', name))
+                    requeued += 1
+                except FileNotFoundError:
+                    pass
+        return requeued
+
+    def backlog(self):
+        counts = {}
+        for area in ('pending', 'working', 'failed'):
+            try:
+                counts[area] = sum(1 for name in os.listdir(self.path(area)) if name.endswith('.json'))
+            except FileNotFoundError:
+                counts[area] = 0
+        return counts
+
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SpoolUploadedFile(TemporaryUploadedFile):
+    """A file part streamed to a temporary file in the spool's uploads/, on the filesystem of files/"""
+
+    def __init__(self, directory, name, content_type, size, charset, content_type_extra=None):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix='.upload' + ext, dir=directory)
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+
+
+class SpoolUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler streaming file parts to disk inside the screenshot spool.
+
+    A part never lives in memory beyond the parser's chunk, and spool_file
+    renames the finished file into the spool instead of copying it.
+    """
+
+    def __init__(self, spool, request=None):
+        super().__init__(request)
+        self.spool = spool
+
+    def new_file(self, *args, **kwargs):
+        FileUploadHandler.new_file(self, *args, **kwargs)
+        self.spool.ensure_dirs()
+        self.file = SpoolUploadedFile(
+            self.spool.path('uploads'), self.file_name, self.content_type, 0, self.charset, self.content_type_extra,
+        )
+
+
+def screenshot_parts(activity_logs, files):
+    """
+    Pair the uploaded ``files`` with the validated activity records they belong to: ``[(file, [record index])]``.
+
+    Each record names the multipart file part of its screenshot in
+    ``screenshot_part``, which is removed from the record; records may share
+    a part. Agents predating per-record parts send ``screenshot`` parts: a
+    single one belongs to every record of the batch, as it always did, and
+    one per record is paired in order.
+    """
+    parts = {}
+    for index, record in enumerate(activity_logs):
+        part = record.pop('screenshot_part', None)
+        if part:
+            parts.setdefault(part, []).append(index)
+    if parts:
+        matched = []
+        for part, indexes in parts.items():
+            if part in files:
+                matched.append((files[part], indexes))
+            else:
+                logger.warning("No file part %r for %d activity logs", part, len(indexes))
+        return matched
+
+    legacy = files.getlist(LEGACY_SCREENSHOT_FIELD) if activity_logs else []
+    if len(legacy) == 1:
+        return [(legacy[0], list(range(len(activity_logs))))]
+    if len(legacy) == len(activity_logs):
+        return [(upload, [index]) for index, upload in enumerate(legacy)]
+    if legacy:
+        logger.warning("Cannot pair %d screenshot parts with %d activity logs", len(legacy), len(activity_logs))
+    elif activity_logs:
+        logger.warning("No screenshot file found in request.FILES")
+    return []
+
+
+def _save_once(name, content):
+    """Save ``content`` under a content-addressed ``name`` unless it is already stored"""
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, content)
+
+
+def store_screenshot(f, device_identifier, original_name=''):
+    """
+    Resolve an image file to a ScreenshotBlob, storing it only if it is new.
+
+    Byte-identical images are found by sha256 across all devices. An image
+    that is perceptually the same as the device's latest screenshot (an idle
+    screen, a blinking cursor, a ticking clock) reuses that blob as well. New images are stored under their hash with
+    pre-rendered JPEG thumbnails. Returns ``(blob, outcome)`` where outcome
+    is 'uploaded', 'deduplicated' or 'near_duplicates'.
+    """
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    sha256 = sha256_file(f)
+    blob = ScreenshotBlob.objects.filter(sha256=sha256).first()
+    if blob is not None:
+        return blob, 'deduplicated'
+
+    f.seek(0)
+    image = Image.open(f)
+    image.load()
+    image_hash = dhash(image)
+    image_signature = signature(image)
+
+    max_distance = settings.SCREENSHOT_NEAR_DUPLICATE_DISTANCE
+    if max_distance >= 0:
+        latest = ScreenshotBlob.objects.filter(device_identifier=device_identifier).order_by('-last_seen').first()
+        # The hash is a cheap filter; text edits barely move it, so the pixel signature decides
+        if (latest is not None and (latest.width, latest.height) == image.size
+                and hamming_distance(latest.dhash, image_hash) <= max_distance
+                and changed_fraction(bytes(latest.signature), image_signature)
+                <= settings.SCREENSHOT_NEAR_DUPLICATE_MAX_CHANGE):
+            return latest, 'near_duplicates'
+
+    extension = os.path.splitext(original_name)[1].lower() or f".{(image.format or 'png').lower()}"
+    f.seek(0)
+    fields = {'image': _save_once(f'screenshots/{sha256[:2]}/{sha256}{extension}', File(f))}
+    for field, max_edge in THUMBNAIL_SIZES.items():
+        fields[field] = _save_once(
+            f'screenshots/thumbs/{sha256[:2]}/{sha256}_{max_edge}.jpg',
+            ContentFile(render_thumbnail(image, max_edge)),
+        )
+
+    try:
+        with transaction.atomic():
+            blob = ScreenshotBlob.objects.create(
+                sha256=sha256,
+                dhash=image_hash,
+                signature=image_signature,
+                device_identifier=device_identifier,
+                width=image.width,
+                height=image.height,
+                size=size,
+                **fields,
+            )
+    except IntegrityError:
+        # Another worker stored the same image concurrently
+        return ScreenshotBlob.objects.get(sha256=sha256), 'deduplicated'
+    return blob, 'uploaded'
+
+
+def upload_job(spool, manifest):
+    """Store a claimed job's file and point its activity logs at the resulting blob"""
+    logs = list(ActivityLog.objects.filter(pk__in=manifest['log_ids']))
+    device_identifier = logs[0].device_identifier if logs else ''
+    path = spool.path('files', manifest['id'])
+    with open(path, 'rb') as f:
+        blob, outcome = store_screenshot(f, device_identifier, manifest['name'])
+
+    with transaction.atomic():
+        for log in logs:
+            log.screenshot_blob = blob
+            log.screenshot = blob.image.name
+            log.thumbnail = blob.thumbnail.name
+            log.preview = blob.preview.name
+            log.description = log.build_description()
+        ActivityLog.objects.bulk_update(logs, ['screenshot_blob', 'screenshot', 'thumbnail', 'preview', 'description'])
+        ScreenshotBlob.objects.filter(pk=blob.pk).update(
+            reference_count=F('reference_count') + len(logs),
+            last_seen=timezone.now(),
+        )
+        bump_generations_on_commit([ActivityLog.LOG_TYPE])
+    return blob.image.name, outcome, os.path.getsize(path)
+
+
+class ScreenshotPipeline:
+    """
+    Bounded pool of background threads uploading spooled screenshots.
+
+    Requests only copy the upload to local disk and enqueue its job id, so
+    ingest latency no longer depends on the object store. Workers start
+    lazily in the process that first submits (uWSGI forks after import),
+    pick up jobs left in the spool by earlier processes, retry failures with
+    exponential backoff and park jobs in ``failed/`` once attempts run out.
+    A full queue never blocks a request: the job stays in ``pending/`` and
+    the workers pick it up when they rescan the spool, every
+    ``rescan_interval`` seconds. Processes without workers leave their
+    failed jobs to ``drain_screenshot_spool``.
+    """
+
+    def __init__(self, spool, workers=2, queue_size=100, max_attempts=5, retry_backoff=2.0, rescan_interval=60):
+        self.spool = spool
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.rescan_interval = rescan_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.metrics = ScreenshotMetrics()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._threads = []
+        # Job ids in the queue, which a rescan must not add twice
+        self._queued = set()
+        self._last_rescan = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A forked child inherits the queue object but not the threads
+            self._pid = os.getpid()
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._queued = set()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'screenshot-upload-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        self.rescan()
+
+    def rescan(self):
+        """Queue the pending jobs that are due and not queued yet, until the queue is full"""
+        with self._lock:
+            self._last_rescan = time.monotonic()
+        now = time.time()
+        for job_id in self.spool.pending_jobs():
+            with self._lock:
+                if job_id in self._queued:
+                    continue
+            manifest = self.spool.pending_manifest(job_id)
+            if manifest is None or manifest['not_before'] > now:
+                continue
+            if not self._enqueue(job_id):
+                break
+
+    def _rescan_if_due(self):
+        with self._lock:
+            due = time.monotonic() - self._last_rescan >= self.rescan_interval
+        if due:
+            try:
+                self.rescan()
+            except Exception:
+                logger.exception("Rescanning the screenshot spool failed")
+
+    def _enqueue(self, job_id):
+        with self._lock:
+            self._queued.add(job_id)
+        try:
+            self.queue.put_nowait(job_id)
+        except queue.Full:
+            with self._lock:
+                self._queued.discard(job_id)
+            self.metrics.incr('rejected')
+            logger.warning("Screenshot upload queue is full, leaving %s in the spool for the next rescan", job_id)
+            return False
+        self.metrics.incr('queued')
+        return True
+
+    def upload_handlers(self, request):
+        """Handlers keeping small requests in memory and streaming the file parts of the others into the spool"""
+        return [MemoryFileUploadHandler(request), SpoolUploadHandler(self.spool, request)]
+
+    def spool_upload(self, uploaded_file, durable=False):
+        job_id = self.spool.spool_file(uploaded_file, durable)
+        self.metrics.incr('spooled')
+        return job_id
+
+    def spool_parts(self, activity_logs, files, durable=False):
+        """
+        Spool the screenshots of a bulk payload (see ``screenshot_parts``).
+
+        Returns ``[{'job_id', 'name', 'records'}]``, ``records`` being indexes
+        into ``activity_logs``; nothing stays spooled if one of them fails.
+        """
+        screenshots = []
+        try:
+            for upload, indexes in screenshot_parts(activity_logs, files):
+                screenshots.append({
+                    'job_id': self.spool_upload(upload, durable),
+                    'name': os.path.join('screenshots', upload.name),
+                    'records': indexes,
+                })
+        except Exception:
+            for screenshot in screenshots:
+                self.discard(screenshot['job_id'])
+            raise
+        return screenshots
+
+    def submit_parts(self, screenshots, logs):
+        """``submit`` each screenshot of ``spool_parts`` for its records among the created activity ``logs``"""
+        for screenshot in screenshots:
+            self.submit(screenshot['job_id'], screenshot['name'], [logs[index].id for index in screenshot['records']])
+
+    def submit(self, job_id, name, log_ids):
+        """Register a spooled file for upload once the transaction creating its logs commits"""
+        transaction.on_commit(lambda: self._submit(job_id, name, log_ids))
+
+    def _submit(self, job_id, name, log_ids):
+        # The manifest is only written after commit, so workers never see logs they cannot update yet
+        if self.workers:
+            self.start()
+        self.spool.add_job(job_id, name, log_ids)
+        if self.workers:
+            self._enqueue(job_id)
+        else:
+            self.process(job_id)
+
+    def discard(self, job_id):
+        self.spool.discard(job_id)
+
+    def _run(self):
+        while True:
+            try:
+                job_id = self.queue.get(timeout=self.rescan_interval)
+            except queue.Empty:
+                self._rescan_if_due()
+                continue
+            with self._lock:
+                self._queued.discard(job_id)
+            try:
+                self.process(job_id)
+                # A busy queue never times out, so also look for stranded jobs between uploads
+                self._rescan_if_due()
+            except Exception:
+                logger.exception("Screenshot upload worker crashed on %s", job_id)
+            finally:
+                self.queue.task_done()
+
+    def process(self, job_id):
+        manifest = self.spool.claim(job_id)
+        if manifest is None:
+            return None
+
+        delay = manifest['not_before'] - time.time()
+        if delay > 0:
+            self.spool.release(manifest)
+            self._retry_later(job_id, delay)
+            return None
+
+        close_old_connections()
+        self.metrics.upload_started()
+        started = time.monotonic()
+        try:
+            stored, outcome, size = upload_job(self.spool, manifest)
+        except Exception as e:
+            self.metrics.upload_finished(time.monotonic() - started, error=str(e))
+            self._handle_failure(manifest, e)
+            return None
+        finally:
+            close_old_connections()
+
+        self.metrics.upload_finished(time.monotonic() - started, outcome=outcome, size=size)
+        self.spool.complete(job_id)
+        logger.info("Screenshot %s (%s) attached to %d activity logs", stored, outcome, len(manifest['log_ids']))
+        return stored
+
+    def _handle_failure(self, manifest, error):
+        manifest['attempts'] += 1
+        manifest['last_error'] = str(error)
+        if manifest['attempts'] >= self.max_attempts:
+            self.metrics.incr('failed')
+            self.spool.fail(manifest)
+            logger.error("Giving up on screenshot %s after %d attempts: %s",
+                         manifest['id'], manifest['attempts'], error)
+            return
+
+        delay = self.retry_backoff * 2 ** (manifest['attempts'] - 1)
+        manifest['not_before'] = time.time() + delay
+        self.metrics.incr('retried')
+        self.spool.release(manifest)
+        logger.warning("Screenshot upload %s failed (attempt %d), retrying in %.1fs: %s",
+                       manifest['id'], manifest['attempts'], delay, error)
+        self._retry_later(manifest['id'], delay)
+
+    def _retry_later(self, job_id, delay):
+        if self._pid != os.getpid():
+            # No workers in this process; the job waits in pending/ for a rescan or a drain
+            return
+        timer = threading.Timer(delay, self._enqueue, args=[job_id])
+        timer.daemon = True
+        timer.start()
+
+    def join(self):
+        """Block until every queued upload has been processed (tests and shutdown)"""
+        self.queue.join()
+
+    def status(self):
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'spool': self.spool.backlog(),
+            **self.metrics.snapshot(),
+        }
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_screenshot_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = ScreenshotPipeline(
+                ScreenshotSpool(settings.SCREENSHOT_SPOOL_DIR),
+                workers=settings.SCREENSHOT_UPLOAD_WORKERS,
+                queue_size=settings.SCREENSHOT_UPLOAD_QUEUE_SIZE,
+                max_attempts=settings.SCREENSHOT_UPLOAD_MAX_ATTEMPTS,
+                retry_backoff=settings.SCREENSHOT_UPLOAD_RETRY_BACKOFF,
+                rescan_interval=settings.SCREENSHOT_UPLOAD_RESCAN_INTERVAL,
+            )
+    return _pipeline
@@ -0,0 +1,262 @@
+import logging
+import re
+from abc import ABC, abstractmethod
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.db.utils import OperationalError
+from django.db.models import FloatField, Value
+
+from .models import LogSearchDocument
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_TABLE = LogSearchDocument._meta.db_table
+FTS_TABLE = 'dashboard_logsearch_fts'
+
+# BaseLog.log_type -> child fields folded into the search document
+SEARCH_FIELDS = {
+    'activity': ['window_title', 'analysis', 'keywords'],
+    'app_usage': ['app_name', 'window_title'],
+    'website_visit': ['url', 'title'],
+    'file_access': ['file_path', 'operation', 'process_name'],
+    'usb_device': ['device_name', 'vendor_id', 'product_id', 'serial_number'],
+}
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    """Lower-case word tokens joined by spaces, so URLs and paths split the same way on every backend"""
+    return ' '.join(WORD_RE.findall(text.lower()))
+
+
+def build_search_document(description, device_identifier, values):
+    parts = [description or '', device_identifier or '']
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            parts.extend(str(item) for item in value)
+        elif value:
+            parts.append(str(value))
+    return normalize_text(' '.join(parts))
+
+
+def search_terms(keyword):
+    return WORD_RE.findall(keyword.lower())
+
+
+def document_for_log(log):
+    """Search document for a log model instance (a BaseLog child)"""
+    fields = SEARCH_FIELDS.get(log.log_type, [])
+    return LogSearchDocument(
+        log_id=log.id,
+        timestamp=log.timestamp,
+        device_identifier=log.device_identifier,
+        log_type=log.log_type,
+        document=build_search_document(
+            log.description, log.device_identifier, [getattr(log, field) for field in fields]
+        ),
+    )
+
+
+def index_logs(logs, extended=None, batch_size=1000):
+    """
+    Write search documents for a freshly ingested batch (as returned by BulkIngestor).
+
+    Stored spans the batch extended (see ``sessionize``) have a new
+    description, and a website span the latest page title; their documents
+    are rewritten.
+    """
+    documents = [document_for_log(log) for rows in logs.values() for log in rows]
+    LogSearchDocument.objects.bulk_create(documents, batch_size=batch_size)
+    documents = [document_for_log(span) for spans in (extended or {}).values() for span, _ in spans]
+    if documents:
+        LogSearchDocument.objects.bulk_update(documents, ['document'], batch_size=batch_size)
+
+
+class SimpleSearchBackend:
+    """Portable fallback: word prefix match on the single denormalized document column"""
+    name = 'simple'
+
+    def match(self, queryset, terms, since=None, until=None):
+        documents = LogSearchDocument.objects.all()
+        for term in terms:
+            # Documents are normalized to lower-case words separated by single spaces
+            documents = documents.filter(document__regex=rf'(^| ){re.escape(term)}')
+        if since:
+            documents = documents.filter(timestamp__gte=since)
+        if until:
+            documents = documents.filter(timestamp__lt=until)
+        return queryset.filter(pk__in=documents.values('log_id')).annotate(
+            search_rank=Value(1.0, output_field=FloatField())
+        )
+
+
+class RawSearchBackend(ABC):
+    """Matches through a backend-specific inverted index addressed with raw SQL"""
+
+    @abstractmethod
+    def match_sql(self):
+        """SELECT of the matching log ids, with a %s placeholder for the query and ``d`` the documents table"""
+
+    @abstractmethod
+    def rank_sql(self, pk_column):
+        """Scalar subquery ranking the log whose id is ``pk_column``, with a %s placeholder for the query"""
+
+    @abstractmethod
+    def format_query(self, terms):
+        """The backend's query string for prefix matches of every term"""
+
+    def match(self, queryset, terms, since=None, until=None):
+        query = self.format_query(terms)
+        sql, params = self.match_sql(), [query]
+        if since:
+            sql += ' AND d.timestamp >= %s'
+            params.append(since)
+        if until:
+            sql += ' AND d.timestamp < %s'
+            params.append(until)
+
+        qn = connection.ops.quote_name
+        opts = queryset.model._meta
+        pk_column = f'{qn(opts.db_table)}.{qn(opts.pk.column)}'
+        return queryset.filter(pk__in=RawSQL(sql, params)).annotate(
+            search_rank=RawSQL(self.rank_sql(pk_column), [query], output_field=FloatField())
+        )
+
+
+class PostgresSearchBackend(RawSearchBackend):
+    """tsvector column generated from the document, with a GIN index"""
+    name = 'postgresql'
+
+    def format_query(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def match_sql(self):
+        return (
+            f"SELECT d.log_id FROM {DOCUMENT_TABLE} d "
+            f"WHERE d.search_vector @@ to_tsquery('simple', %s)"
+        )
+
+    def rank_sql(self, pk_column):
+        # float8 so the rank round-trips exactly through keyset cursors
+        return (
+            f"SELECT ts_rank(d.search_vector, to_tsquery('simple', %s))::float8 "
+            f"FROM {DOCUMENT_TABLE} d WHERE d.log_id = {pk_column}"
+        )
+
+
+class SQLiteFTSSearchBackend(RawSearchBackend):
+    """FTS5 external-content table kept in sync with the documents by triggers"""
+    name = 'sqlite-fts5'
+
+    def format_query(self, terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def match_sql(self):
+        return (
+            f"SELECT d.log_id FROM {FTS_TABLE} JOIN {DOCUMENT_TABLE} d ON d.log_id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s"
+        )
+
+    def rank_sql(self, pk_column):
+        # bm25() is lower for better matches. The ranks of every match are computed in one
+        # materialized MATCH and each log's is looked up by id, instead of a MATCH per log
+        return (
+            f"WITH ranks AS {self.materialized}(SELECT rowid AS log_id, -bm25({FTS_TABLE}) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) "
+            f"SELECT rank FROM ranks WHERE log_id = {pk_column}"
+        )
+
+    @property
+    def materialized(self):
+        # Older SQLite has no hint and inlines the CTE, back to a MATCH per log
+        return 'MATERIALIZED ' if connection.Database.sqlite_version_info >= (3, 35) else ''
+
+
+POSTGRES_SCHEMA = [
+    f"ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('simple', document)) STORED",
+    f"CREATE INDEX IF NOT EXISTS search_document_vector_idx ON {DOCUMENT_TABLE} USING GIN (search_vector)",
+]
+
+SQLITE_SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"document, content='{DOCUMENT_TABLE}', content_rowid='log_id', prefix='2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.log_id, new.document); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.log_id, old.document); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.log_id, old.document); "
+    f"INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.log_id, new.document); END",
+]
+
+
+def ensure_search_schema(conn=connection):
+    """Create the backend-specific inverted index next to the documents table (idempotent)"""
+    statements = {'postgresql': POSTGRES_SCHEMA, 'sqlite': SQLITE_SCHEMA}.get(conn.vendor, [])
+    with conn.cursor() as cursor:
+        for statement in statements:
+            try:
+                cursor.execute(statement)
+            except OperationalError as e:
+                # SQLite builds without FTS5 fall back to the simple backend
+                logger.warning("Could not create search index: %s", e)
+                return False
+    return bool(statements)
+
+
+def drop_search_schema(conn=connection):
+    statements = {
+        'postgresql': [
+            "DROP INDEX IF EXISTS search_document_vector_idx",
+            f"ALTER TABLE {DOCUMENT_TABLE} DROP COLUMN IF EXISTS search_vector",
+        ],
+        'sqlite': [f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}" for suffix in ('ai', 'ad', 'au')]
+        + [f"DROP TABLE IF EXISTS {FTS_TABLE}"],
+    }.get(conn.vendor, [])
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def rebuild_fts_index(conn=connection):
+    if conn.vendor == 'sqlite' and has_sqlite_fts(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def has_sqlite_fts(conn=connection):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        if connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        elif connection.vendor == 'sqlite' and has_sqlite_fts():
+            _backend = SQLiteFTSSearchBackend()
+        else:
+            _backend = SimpleSearchBackend()
+    return _backend
+
+
+def search_logs(queryset, keyword, since=None, until=None):
+    """
+    Restrict a BaseLog (or child) queryset to logs matching ``keyword``.
+
+    Every word of the keyword must match the start of a word in the log's
+    search document. The queryset is annotated with ``search_rank``, higher
+    meaning more relevant.
+    """
+    terms = search_terms(keyword)
+    if not terms:
+        return queryset.none()
+    return get_search_backend().match(queryset, terms, since=since, until=until)
@@ -1,9 +1,17 @@
 from rest_framework import serializers
+from .dimensions import intern_records
 from .models import ActivityLog, AppUsageLog, WebsiteVisitLog, FileAccessLog, USBDeviceLog
 import json
-import logging
+from collections.abc import Mapping
 
-logger = logging.getLogger(__name__)
+class DimensionFieldsMixin:
+    """Writes the strings of a log's dimension fields (see dimensions.DIMENSION_FIELDS) as interned rows"""
+
+    def create(self, validated_data):
+        return super().create(intern_records(self.Meta.model, [validated_data])[0])
+
+    def update(self, instance, validated_data):
+        return super().update(instance, intern_records(self.Meta.model, [validated_data])[0])
 
 class ActivityLogSerializer(serializers.ModelSerializer):
     screenshot = serializers.CharField(allow_null=True, required=False)
@@ -46,18 +54,34 @@ class ActivityLogSerializer(serializers.ModelSerializer):
             print(f"Error in serializer create: {str(e)}")
             raise
 
-class AppUsageLogSerializer(serializers.ModelSerializer):
+class BulkActivityLogSerializer(ActivityLogSerializer):
+    # Multipart file part holding this record's screenshot, matched by the bulk endpoint
+    screenshot_part = serializers.CharField(max_length=100, required=False, write_only=True)
+
+    class Meta(ActivityLogSerializer.Meta):
+        fields = ActivityLogSerializer.Meta.fields + ['screenshot_part']
+
+class AppUsageLogSerializer(DimensionFieldsMixin, serializers.ModelSerializer):
+    app_name = serializers.CharField(max_length=255)
+    window_title = serializers.CharField(max_length=255)
+
     class Meta:
         model = AppUsageLog
         fields = ['timestamp', 'description', 'device_identifier', 'app_name', 'window_title', 
                  'duration', 'is_active']
 
-class WebsiteVisitLogSerializer(serializers.ModelSerializer):
+class WebsiteVisitLogSerializer(DimensionFieldsMixin, serializers.ModelSerializer):
+    url = serializers.URLField(max_length=200)
+    title = serializers.CharField(max_length=255)
+
     class Meta:
         model = WebsiteVisitLog
         fields = ['timestamp', 'description', 'device_identifier', 'url', 'title', 'duration']
 
-class FileAccessLogSerializer(serializers.ModelSerializer):
+class FileAccessLogSerializer(DimensionFieldsMixin, serializers.ModelSerializer):
+    file_path = serializers.CharField(max_length=512)
+    process_name = serializers.CharField(max_length=255)
+
     class Meta:
         model = FileAccessLog
         fields = ['timestamp', 'description', 'device_identifier', 'file_path', 'operation', 
@@ -69,10 +93,13 @@ class USBDeviceLogSerializer(serializers.ModelSerializer):
         fields = ['timestamp', 'description', 'device_identifier', 'device_name', 'vendor_id', 
                  'product_id', 'serial_number', 'action']
 
+    # Agent field name -> serializer field name
+    FIELD_ALIASES = {'name': 'device_name'}
+
     def to_internal_value(self, data):
-        # Map 'name' to 'device_name' if present
-        if 'name' in data:
-            data['device_name'] = data.pop('name')
+        for alias, field_name in self.FIELD_ALIASES.items():
+            if isinstance(data, Mapping) and alias in data:
+                data[field_name] = data.pop(alias)
         return super().to_internal_value(data)
 
 class BulkMonitoringSerializer(serializers.Serializer):
@@ -80,38 +107,11 @@ class BulkMonitoringSerializer(serializers.Serializer):
     website_visits = WebsiteVisitLogSerializer(many=True, required=False)
     file_access = FileAccessLogSerializer(many=True, required=False)
     usb_devices = USBDeviceLogSerializer(many=True, required=False)
-    activity_logs = ActivityLogSerializer(many=True, required=False)
-
-    def validate(self, data):
-        logger.info(f"Validating bulk data: {data}")
-        return data
-
-    def validate_app_usage(self, value):
-        logger.info(f"Validating app usage data: {value}")
-        return value
-
-    def validate_website_visits(self, value):
-        logger.info(f"Validating website visits data: {value}")
-        return value
-
-    def validate_file_access(self, value):
-        logger.info(f"Validating file access data: {value}")
-        return value
-
-    def validate_usb_devices(self, value):
-        logger.info(f"Validating USB devices data: {value}")
-        return value
+    activity_logs = BulkActivityLogSerializer(many=True, required=False)
 
     def validate_activity_logs(self, value):
-        logger.info(f"Validating activity logs data: {value}")
         for log in value:
             if 'screenshot' in log:
                 # Remove the screenshot field from the data as it will be handled separately
                 del log['screenshot']
         return value
-
-    def to_internal_value(self, data):
-        logger.info(f"Converting to internal value: {data}")
-        ret = super().to_internal_value(data)
-        logger.info(f"Converted to internal value: {ret}")
-        return ret 
\ No newline at end of file
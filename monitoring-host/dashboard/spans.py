@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.conf import settings
+
+from .dimensions import DIMENSION_FIELDS
+from .models import AppUsageLog, WebsiteVisitLog
+
+# Bulk payload key -> span model and the fields a sample must share with a span to extend it,
+# compared by interned id. is_active is part of the app key so that active and idle time stay
+# apart in the rollups
+SPAN_KEYS = {
+    'app_usage': (AppUsageLog, ('app_name_id', 'window_title_id', 'is_active')),
+    'website_visits': (WebsiteVisitLog, ('url_id',)),
+}
+
+
+def open_span(model, device_identifier, since):
+    """The device's latest span of ``model`` if a sample arrived after ``since``, locked for the update"""
+    span = (
+        model.objects.select_for_update()
+        .filter(device_identifier=device_identifier)
+        .order_by('-timestamp', '-pk')
+        .first()
+    )
+    if span is not None and (span.ended_at or span.timestamp) >= since:
+        return span
+    return None
+
+
+def sessionize(logs):
+    """
+    Merge the app usage and website visit samples of a batch into spans.
+
+    A sample with the same key as the device's open span adds its duration
+    to that span instead of becoming a row of its own. Open spans are looked
+    up in the database, the device's latest row of the type, rather than kept
+    in one worker's memory, so consecutive requests may hit any process; a
+    span closes when a sample with another key arrives or the device has been
+    quiet for LOG_SPAN_QUIET_SECONDS. Quiet time is measured between the
+    samples' own timestamps, so a batch merged from minutes of spooled
+    payloads splits where a single request each would have.
+
+    ``logs`` (as built by BulkIngestor) is updated in place to hold only new
+    spans. Spans already stored are extended and saved; they are returned as
+    ``{key: [(span, added duration), ...]}`` for the rollups.
+    """
+    extended = {}
+    if not settings.LOG_SPAN_QUIET_SECONDS:
+        return extended
+    quiet = timedelta(seconds=settings.LOG_SPAN_QUIET_SECONDS)
+
+    for key, (model, fields) in SPAN_KEYS.items():
+        samples = logs.get(key)
+        if not samples:
+            continue
+        spans = []
+        current = {}
+        added = {}
+        for sample in samples:
+            device = sample.device_identifier
+            if device not in current:
+                current[device] = open_span(model, device, sample.timestamp - quiet)
+            span = current[device]
+            if (span is None or (span.ended_at or span.timestamp) < sample.timestamp - quiet
+                    or any(getattr(span, field) != getattr(sample, field) for field in fields)):
+                spans.append(sample)
+                current[device] = sample
+                continue
+            span.duration += sample.duration
+            span.samples += 1
+            span.ended_at = sample.timestamp
+            # The sample's interned rows: the key's are the span's own, a page title is the latest,
+            # and a stored span's description then needs no query for its strings
+            for field in DIMENSION_FIELDS[model]:
+                setattr(span, field, getattr(sample, field))
+            if span.pk is not None:
+                added[span.pk] = (span, added.get(span.pk, (span, 0))[1] + sample.duration)
+        logs[key] = spans
+
+        for span in spans:
+            span.description = span.build_description()
+        if added:
+            stored = [span for span, _ in added.values()]
+            for span in stored:
+                span.description = span.build_description()
+            update_fields = ['duration', 'samples', 'ended_at', 'description']
+            if model is WebsiteVisitLog:
+                update_fields.append('title')
+            model.objects.bulk_update(stored, update_fields)
+            extended[key] = list(added.values())
+    return extended
@@ -0,0 +1,386 @@
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, InterfaceError, OperationalError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .ingest import BulkIngestor
+from .models import IngestCheckpoint
+from .screenshots import get_screenshot_pipeline
+from .validation import get_bulk_validator
+
+logger = logging.getLogger(__name__)
+
+# Spool layout: segments/ holds the journal, corrupt/ segments failing their
+# checksums and rejected/ single payloads the database refused
+SPOOL_DIRS = ('segments', 'corrupt', 'rejected')
+SEGMENT_SUFFIX = '.seg'
+
+# A record is its payload's length and CRC-32 followed by the payload, JSON encoded
+HEADER = struct.Struct('>II')
+
+# Seconds past INGEST_SPOOL_SEGMENT_SECONDS after which nobody can still be appending to a segment
+SEAL_GRACE = 30
+
+# Errors meaning the database is unreachable rather than refusing the data
+DATABASE_UNAVAILABLE = (InterfaceError, OperationalError)
+
+
+class IngestSpool:
+    """
+    Append-only journal of accepted bulk payloads on local disk.
+
+    Each process appends to a segment file of its own, named after its
+    creation time, host and pid, so writers never share a file and segments
+    sort in arrival order. Every record is fsync'd before ``append`` returns,
+    so an acknowledged payload survives a crash. A writer moves on to a new
+    segment after ``segment_bytes`` or ``segment_seconds``: an older segment
+    is sealed, and the loader deletes it once fully loaded.
+    """
+
+    def __init__(self, root, segment_bytes=16 * 1024 * 1024, segment_seconds=60):
+        self.root = str(root)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment = None
+        self._opened_at = 0
+        self._pid = None
+
+    def path(self, area, name=''):
+        return os.path.join(self.root, area, name)
+
+    def ensure_dirs(self):
+        for area in SPOOL_DIRS:
+            os.makedirs(self.path(area), exist_ok=True)
+
+    def append(self, record):
+        """Durably append a JSON-serializable ``record`` and return the segment holding it"""
+        data = json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        with self._lock:
+            f = self._writable()
+            offset = f.tell()
+            try:
+                f.write(HEADER.pack(len(data), zlib.crc32(data)) + data)
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError:
+                # Never leave a torn record in front of the next one: cut it off and start a new segment
+                try:
+                    f.truncate(offset)
+                finally:
+                    self._close()
+                raise
+            return self._segment
+
+    def _writable(self):
+        if self._file is not None and (
+            # A forked worker must not append to its parent's segment
+            self._pid != os.getpid()
+            or self._file.tell() >= self.segment_bytes
+            or time.time() - self._opened_at >= self.segment_seconds
+        ):
+            self._close()
+        if self._file is None:
+            self.ensure_dirs()
+            created = time.time_ns()
+            name = f'{created:020d}-{socket.gethostname()}-{os.getpid()}{SEGMENT_SUFFIX}'
+            self._file = open(self.path('segments', name), 'ab')
+            _fsync_dir(self.path('segments'))
+            self._segment, self._opened_at, self._pid = name, created / 1e9, os.getpid()
+        return self._file
+
+    def _close(self):
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = self._segment = None
+
+    def segments(self):
+        """Segment names, oldest first"""
+        try:
+            names = os.listdir(self.path('segments'))
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if name.endswith(SEGMENT_SUFFIX))
+
+    def sealed(self, segment):
+        created = int(segment.split('-', 1)[0]) / 1e9
+        return time.time() - created > self.segment_seconds + SEAL_GRACE
+
+    def read(self, segment, offset=0, limit=None):
+        """
+        Up to ``limit`` records of ``segment`` from byte ``offset``: ``([(record, end offset), ...], corrupt)``.
+
+        Reading stops at the first incomplete record: one still being written,
+        or in a sealed segment a write cut short by a crash, which was never
+        acknowledged. ``corrupt`` is true when it stopped at a record failing
+        its checksum.
+        """
+        records = []
+        with open(self.path('segments', segment), 'rb') as f:
+            f.seek(offset)
+            while limit is None or len(records) < limit:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                length, checksum = HEADER.unpack(header)
+                if not length:
+                    # Zeroes past the last fsync'd record after a crash
+                    break
+                data = f.read(length)
+                if len(data) < length:
+                    break
+                try:
+                    if zlib.crc32(data) != checksum:
+                        raise ValueError("checksum mismatch")
+                    record = json.loads(data)
+                except ValueError:
+                    return records, True
+                offset += HEADER.size + length
+                records.append((record, offset))
+        return records, False
+
+    def remove(self, segment):
+        os.remove(self.path('segments', segment))
+
+    def quarantine(self, segment):
+        self.ensure_dirs()
+        os.replace(self.path('segments', segment), self.path('corrupt', segment))
+
+    def reject(self, record, error):
+        """Set aside a payload the database refused, with the error, for inspection"""
+        self.ensure_dirs()
+        name = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.json'
+        with open(self.path('rejected', name), 'w') as f:
+            json.dump({'error': str(error), 'record': record}, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def depth(self, checkpoints):
+        """Payloads and bytes not loaded yet given the loader's ``{segment: offset}``, and the oldest one's age"""
+        segments = self.segments()
+        records = 0
+        pending_bytes = 0
+        oldest = None
+        for segment in segments:
+            offset = checkpoints.get(segment, 0)
+            try:
+                pending_bytes += max(0, os.path.getsize(self.path('segments', segment)) - offset)
+                count = self._count(segment, offset)
+                if count and oldest is None:
+                    first, _ = self.read(segment, offset, limit=1)
+                    oldest = parse_datetime(first[0][0]['received_at']) if first else None
+            except FileNotFoundError:
+                # Drained and deleted by the loader meanwhile
+                continue
+            records += count
+        return {
+            'segments': len(segments),
+            'pending_records': records,
+            'pending_bytes': pending_bytes,
+            'oldest_pending': oldest,
+            'lag_seconds': round((timezone.now() - oldest).total_seconds(), 1) if oldest else 0,
+            'corrupt_segments': self._count_files('corrupt'),
+            'rejected_records': self._count_files('rejected'),
+        }
+
+    def _count(self, segment, offset):
+        # Walks the headers only
+        count = 0
+        with open(self.path('segments', segment), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            while True:
+                f.seek(offset)
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return count
+                length, _ = HEADER.unpack(header)
+                offset += HEADER.size + length
+                if not length or offset > size:
+                    return count
+                count += 1
+
+    def _count_files(self, area):
+        try:
+            return len(os.listdir(self.path(area)))
+        except FileNotFoundError:
+            return 0
+
+
+def _fsync_dir(path):
+    # Makes a new file's directory entry durable, not only its contents
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def record_screenshots(record, validated=None):
+    """
+    The spooled screenshots of a payload, as ``ScreenshotPipeline.spool_parts`` returns them.
+
+    Payloads spooled before per-record screenshot parts carry one
+    ``screenshot`` for all their activity logs (``validated`` counts them).
+    """
+    if 'screenshots' in record:
+        return record['screenshots']
+    if not record.get('screenshot'):
+        return []
+    count = len((validated or {}).get('activity_logs') or [])
+    return [{**record['screenshot'], 'records': list(range(count))}]
+
+
+class SpoolLoader:
+    """
+    Drains the ingest spool into the database in large transactions.
+
+    Up to ``batch_records`` payloads are read across segments, validated
+    again, merged in arrival order and written by one BulkIngestor pass:
+    one bulk INSERT per table, COPY on PostgreSQL. The same transaction
+    moves each segment's IngestCheckpoint past them, so a crash at any point
+    loads every payload exactly once when the loader restarts. When a batch
+    fails for anything but an unreachable database, its payloads are retried
+    one per transaction and those still failing are set aside in
+    ``rejected/`` instead of blocking the spool.
+    """
+
+    def __init__(self, spool, batch_records=500, batch_size=1000):
+        self.spool = spool
+        self.batch_records = batch_records
+        self.batch_size = batch_size
+
+    def run(self):
+        """Load the next batch and return how many payloads it held (0 once the spool is drained)"""
+        checkpoints = dict(IngestCheckpoint.objects.values_list('segment', 'offset'))
+        pending = []
+        for segment in self.spool.segments():
+            records, corrupt = self.spool.read(segment, checkpoints.get(segment, 0), self.batch_records - len(pending))
+            pending += [(segment, end, record) for record, end in records]
+            if corrupt and not records and self.spool.sealed(segment):
+                logger.error("Ingest spool segment %s is corrupt after offset %s, moved to corrupt/",
+                             segment, checkpoints.get(segment, 0))
+                self.spool.quarantine(segment)
+                IngestCheckpoint.objects.filter(segment=segment).delete()
+            if len(pending) >= self.batch_records:
+                break
+
+        if pending:
+            self.load_batch(pending)
+        if len(pending) < self.batch_records:
+            self.collect()
+        return len(pending)
+
+    def load_batch(self, pending):
+        try:
+            self.load(pending)
+        except DATABASE_UNAVAILABLE:
+            raise
+        except Exception:
+            logger.exception("Loading %d spooled payloads failed, retrying them one at a time", len(pending))
+            for item in pending:
+                try:
+                    self.load([item])
+                except DATABASE_UNAVAILABLE:
+                    raise
+                except Exception as e:
+                    logger.exception("Rejecting spooled payload of %s", item[2].get('received_at'))
+                    self.reject(item, e)
+
+    def load(self, pending):
+        with transaction.atomic():
+            self.write([record for _, _, record in pending])
+            self.checkpoint(pending)
+
+    def write(self, records):
+        """Ingest spooled payloads as one batch, each log stamped with the time its payload was accepted"""
+        validator = get_bulk_validator()
+        merged = defaultdict(list)
+        agents = {}
+        screenshots = []
+        for record in sorted(records, key=lambda record: parse_datetime(record['received_at'])):
+            received_at = parse_datetime(record['received_at'])
+            validated = validator.validate(record['data'])
+            for key, rows in validated.items():
+                merged[key] += [{**row, 'timestamp': received_at} for row in rows]
+                for row in rows:
+                    agents[row['device_identifier']] = (record['ip_address'], record['agent_version'])
+            start = len(merged['activity_logs']) - len(validated.get('activity_logs') or [])
+            screenshots += [
+                {**screenshot, 'records': [start + index for index in screenshot['records']]}
+                for screenshot in record_screenshots(record, validated)
+            ]
+
+        ingestor = BulkIngestor(batch_size=self.batch_size)
+        logs = ingestor.write(ingestor.build_logs(merged), agents)
+        get_screenshot_pipeline().submit_parts(screenshots, logs['activity_logs'])
+
+    def checkpoint(self, pending):
+        ends = {}
+        for segment, end, _ in pending:
+            ends[segment] = max(end, ends.get(segment, 0))
+        for segment, end in ends.items():
+            IngestCheckpoint.objects.update_or_create(segment=segment, defaults={'offset': end})
+
+    def reject(self, item, error):
+        segment, end, record = item
+        self.spool.reject(record, error)
+        for screenshot in record_screenshots(record):
+            get_screenshot_pipeline().discard(screenshot['job_id'])
+        self.checkpoint([item])
+
+    def collect(self):
+        """Delete the sealed segments loaded to their end, then their checkpoints"""
+        checkpoints = dict(IngestCheckpoint.objects.values_list('segment', 'offset'))
+        for segment in self.spool.segments():
+            if not self.spool.sealed(segment):
+                continue
+            records, corrupt = self.spool.read(segment, checkpoints.get(segment, 0), limit=1)
+            if records or corrupt:
+                continue
+            # File first: a checkpoint outliving its segment is harmless, the reverse reloads it
+            self.spool.remove(segment)
+            IngestCheckpoint.objects.filter(segment=segment).delete()
+
+
+def spool_status(spool):
+    """Depth of ``spool``; without the database every byte of it counts as pending"""
+    try:
+        checkpoints = dict(IngestCheckpoint.objects.values_list('segment', 'offset'))
+    except DatabaseError:
+        checkpoints = None
+    return {
+        'enabled': settings.INGEST_SPOOL_ENABLED,
+        'checkpoints_available': checkpoints is not None,
+        **spool.depth(checkpoints or {}),
+    }
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_ingest_spool():
+    global _spool
+    with _spool_lock:
+        if _spool is None:
+            _spool = IngestSpool(
+                settings.INGEST_SPOOL_DIR,
+                segment_bytes=settings.INGEST_SPOOL_SEGMENT_BYTES,
+                segment_seconds=settings.INGEST_SPOOL_SEGMENT_SECONDS,
+            )
+    return _spool
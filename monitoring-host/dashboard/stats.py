@@ -0,0 +1,114 @@
+from collections import Counter
+
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Greatest
+
+from .models import Device
+from .rollups import increment_counters
+
+# Counter name -> BaseLog.log_type it counts
+DEVICE_COUNTERS = {
+    'activity_count': 'activity',
+    'app_usage_count': 'app_usage',
+    'website_visits': 'website_visit',
+    'file_operations': 'file_access',
+    'usb_events': 'usb_device',
+}
+
+DEVICE_STATS_FIELDS = (
+    'device_identifier', 'first_seen', 'last_seen', 'last_ip', 'agent_version',
+    *DEVICE_COUNTERS, 'flagged_count',
+)
+
+
+def record_devices(logs, ip_address=None, agent_version='', extended=None, agents=None):
+    """
+    Upsert the Device rows of a freshly ingested batch (as returned by BulkIngestor).
+
+    Counters are bumped and ``last_seen`` moved forward in one UPDATE; the
+    address and agent version of the request are recorded when known, or
+    per device from ``agents`` (``{device: (ip_address, agent_version)}``)
+    for a batch merged from several requests.
+    Spans the batch only extended (see ``sessionize``) count as a sighting
+    of their device but not as new logs.
+    """
+    counts = Counter()
+    last_seen = {}
+    for rows in logs.values():
+        for log in rows:
+            device = log.device_identifier
+            counts[device, log.log_type] += 1
+            if log.log_type == 'activity' and log.is_flagged:
+                counts[device, 'flagged'] += 1
+            if device not in last_seen or log.timestamp > last_seen[device]:
+                last_seen[device] = log.timestamp
+    for spans in (extended or {}).values():
+        for span, _ in spans:
+            device = span.device_identifier
+            if device not in last_seen or span.ended_at > last_seen[device]:
+                last_seen[device] = span.ended_at
+
+    # Every key gets every field so that one bulk UPDATE covers all the rows
+    increments = {
+        (device,): {
+            **{name: counts[device, log_type] for name, log_type in DEVICE_COUNTERS.items()},
+            'flagged_count': counts[device, 'flagged'],
+        }
+        for device in last_seen
+    }
+    assignments = {}
+    for device, timestamp in last_seen.items():
+        fields = {'last_seen': Greatest(F('last_seen'), Value(timestamp))}
+        address, version = (agents or {}).get(device, (ip_address, agent_version))
+        if address:
+            fields['last_ip'] = address
+        if version:
+            fields['agent_version'] = version[:64]
+        assignments[(device,)] = fields
+    increment_counters(Device, ('device_identifier',), increments, assignments)
+
+
+class DeviceStats:
+    """
+    Per-device log counters read from the Device registry.
+
+    The registry is kept up to date at ingest time (see ``record_devices``),
+    so listing the fleet costs one row per device whatever the log volume.
+    """
+
+    def __init__(self, queryset=None):
+        self.queryset = queryset if queryset is not None else Device.objects.all()
+
+    def all(self, device_identifiers=None):
+        """Stats for every device, busiest and most recently seen first"""
+        return list(self._ranked(device_identifiers))
+
+    async def aall(self, device_identifiers=None):
+        return [row async for row in self._ranked(device_identifiers)]
+
+    def _ranked(self, device_identifiers):
+        queryset = self.queryset
+        if device_identifiers is not None:
+            queryset = queryset.filter(device_identifier__in=device_identifiers)
+
+        total = sum((F(name) for name in DEVICE_COUNTERS), Value(0))
+        return (
+            queryset.annotate(total_activities=total)
+            .order_by('-total_activities', '-last_seen')
+            .values(*DEVICE_STATS_FIELDS, 'total_activities')
+        )
+
+    def totals(self):
+        """Fleet-wide log counters and the number of devices, in one aggregate over the registry"""
+        return self.queryset.aggregate(
+            devices=Count('pk'),
+            **{name: Sum(name, default=0) for name in (*DEVICE_COUNTERS, 'flagged_count')},
+        )
+
+    def for_device(self, device_identifier):
+        stats = self.all([device_identifier])
+        return stats[0] if stats else None
+
+    async def afor_device(self, device_identifier):
+        stats = await self.aall([device_identifier])
+        return stats[0] if stats else None
@@ -0,0 +1,228 @@
+import json
+import logging
+import zlib
+from collections import defaultdict
+
+from rest_framework.exceptions import ValidationError
+
+from .ingest import BulkIngestor
+from .validation import RECORD_SERIALIZERS, get_record_validator
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for Content-Encoding: zstd
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Record "type" values accepted besides the bulk payload keys (BaseLog.log_type)
+RECORD_TYPE_ALIASES = {
+    'activity': 'activity_logs',
+    'website_visit': 'website_visits',
+    'usb_device': 'usb_devices',
+}
+
+READ_SIZE = 64 * 1024
+
+
+class StreamError(ValueError):
+    """The request body cannot be read any further (bad compression, oversized line)"""
+
+
+class UnsupportedEncoding(StreamError):
+    pass
+
+
+class ZlibDecoder:
+    def __init__(self, wbits, max_output):
+        self.decompressor = zlib.decompressobj(wbits)
+        self.max_output = max_output
+
+    def decode(self, stream, read_size):
+        for data in iter(lambda: stream.read(read_size), b''):
+            yield from self.feed(data)
+        self.finish()
+
+    def feed(self, data):
+        # Bounded output per call, so a compression bomb cannot balloon memory
+        while data:
+            try:
+                out = self.decompressor.decompress(data, self.max_output)
+            except zlib.error as e:
+                raise StreamError(f"Corrupt compressed body: {e}")
+            data = self.decompressor.unconsumed_tail
+            if out:
+                yield out
+
+    def finish(self):
+        if not self.decompressor.eof:
+            raise StreamError("Truncated compressed body")
+
+
+class ZstdDecoder:
+    """
+    Reads the body through zstd's stream reader, ``max_output`` bytes at a
+    time: its decompressobj has no output limit, and a few KB can expand to
+    hundreds of MB in one call. The reader cannot tell a truncated body from
+    a complete one, so a truncated body ends at its last complete block.
+    """
+
+    def __init__(self, max_output):
+        self.decompressor = zstandard.ZstdDecompressor()
+        self.max_output = max_output
+
+    def decode(self, stream, read_size):
+        reader = self.decompressor.stream_reader(stream, read_size=read_size, closefd=False)
+        while True:
+            try:
+                out = reader.read(self.max_output)
+            except zstandard.ZstdError as e:
+                raise StreamError(f"Corrupt compressed body: {e}")
+            if not out:
+                return
+            yield out
+
+
+def get_decoder(content_encoding, max_output=READ_SIZE * 4):
+    """Decoder for a Content-Encoding header value, or None for identity"""
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        return None
+    if encoding in ('gzip', 'x-gzip'):
+        return ZlibDecoder(16 + zlib.MAX_WBITS, max_output)
+    if encoding == 'deflate':
+        return ZlibDecoder(zlib.MAX_WBITS, max_output)
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise UnsupportedEncoding("zstd bodies need the 'zstandard' package on the server")
+        return ZstdDecoder(max_output)
+    raise UnsupportedEncoding(f"Unsupported Content-Encoding: {content_encoding}")
+
+
+def iter_body(stream, content_encoding='', read_size=READ_SIZE):
+    """Yield the decompressed request body in pieces of bounded size"""
+    decoder = get_decoder(content_encoding)
+    if decoder is None:
+        yield from iter(lambda: stream.read(read_size), b'')
+    else:
+        yield from decoder.decode(stream, read_size)
+
+
+def iter_lines(pieces, max_line_bytes):
+    """Split a stream of byte pieces into lines, yielding (line number, bytes)"""
+    buffer = b''
+    line_no = 0
+    for piece in pieces:
+        buffer += piece
+        lines = buffer.split(b'\n')
+        buffer = lines.pop()
+        for line in lines:
+            line_no += 1
+            if len(line) > max_line_bytes:
+                raise StreamError(f"Line {line_no} is longer than {max_line_bytes} bytes")
+            yield line_no, line
+        if len(buffer) > max_line_bytes:
+            raise StreamError(f"Line {line_no + 1} is longer than {max_line_bytes} bytes")
+    if buffer:
+        yield line_no + 1, buffer
+
+
+class NDJSONIngestor:
+    """
+    Ingests newline-delimited JSON records as the request body arrives.
+
+    Every line is one record whose ``type`` is a bulk payload key
+    (``app_usage``, ``activity_logs``, ...) or a log type (``activity``,
+    ``website_visit``, ...); the other keys are the fields the bulk endpoint
+    accepts for that type. Records are validated one by one and written
+    through BulkIngestor every ``chunk_size`` records, each chunk in its own
+    transaction, so memory stays constant however long the backlog is.
+    Invalid lines are reported and skipped without failing the request.
+    """
+
+    def __init__(self, chunk_size=500, max_line_bytes=1024 * 1024, max_errors=100, ip_address=None, agent_version=''):
+        self.chunk_size = chunk_size
+        self.max_line_bytes = max_line_bytes
+        self.max_errors = max_errors
+        self.validators = {key: get_record_validator(key) for key in RECORD_SERIALIZERS}
+        self.ingestor = BulkIngestor(batch_size=chunk_size, ip_address=ip_address, agent_version=agent_version)
+        self.accepted = 0
+        self.rejected = 0
+        self.chunks = 0
+        self.lines = 0
+        self.errors = []
+        self.stream_error = None
+
+    def reject(self, line_no, errors):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line_no, 'errors': errors})
+
+    def parse(self, line_no, line):
+        """Validated (payload key, record) for one line, or None if it was rejected"""
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            self.reject(line_no, {'non_field_errors': [f"Invalid JSON: {e}"]})
+            return None
+        if not isinstance(record, dict):
+            self.reject(line_no, {'non_field_errors': ["Expected a JSON object"]})
+            return None
+
+        record_type = record.pop('type', None)
+        key = RECORD_TYPE_ALIASES.get(record_type, record_type)
+        if key not in self.validators:
+            self.reject(line_no, {'type': [f"Unknown record type: {record_type!r}"]})
+            return None
+        if key == 'activity_logs':
+            # Screenshots are uploaded through the bulk endpoint only
+            record.pop('screenshot', None)
+
+        try:
+            return key, self.validators[key].validate(record)
+        except ValidationError as e:
+            self.reject(line_no, e.detail)
+            return None
+
+    def flush(self, pending):
+        if any(pending.values()):
+            self.ingestor.ingest(pending)
+            self.accepted += sum(len(records) for records in pending.values())
+            self.chunks += 1
+
+    def ingest(self, stream, content_encoding=''):
+        pending = defaultdict(list)
+        buffered = 0
+        try:
+            lines = iter_lines(iter_body(stream, content_encoding), self.max_line_bytes)
+            for line_no, line in lines:
+                self.lines = line_no
+                if not line.strip():
+                    continue
+                parsed = self.parse(line_no, line)
+                if parsed is None:
+                    continue
+                key, record = parsed
+                pending[key].append(record)
+                buffered += 1
+                if buffered >= self.chunk_size:
+                    self.flush(pending)
+                    pending = defaultdict(list)
+                    buffered = 0
+        except StreamError as e:
+            # Whatever was read before the body broke is still stored
+            self.stream_error = str(e)
+        self.flush(pending)
+
+        logger.info("Streamed %d records in %d chunks (%d rejected)", self.accepted, self.chunks, self.rejected)
+        return self.summary()
+
+    def summary(self):
+        return {
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'lines': self.lines,
+            'chunks': self.chunks,
+            'errors': self.errors,
+            'stream_error': self.stream_error,
+        }
@@ -1,3 +1,943 @@
-from django.test import TestCase
+import copy
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from datetime import timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from .benchmark import FleetGenerator, seed_logs
+from .dimensions import get_intern_cache
+from .export import LogExporter, export_schema, parse_bound, pyarrow
+from .fragments import CachedSection, bump_generations, current_generations
+from .imaging import signature
+from .ingest import BulkIngestor
+from .live import GAP_GRACE_SECONDS, LiveEventStream
+from .models import (
+    ActivityLog, AppUsageDailyRollup, AppUsageLog, BaseLog, Device, FileAccessLog, IngestCheckpoint, KeywordCounter,
+    LiveEvent, LogHourlyRollup, LogSearchDocument, ScreenshotBlob, WebsiteDailyRollup,
+)
+from .pagination import InvalidCursor, KeysetPaginator
+from .retention import RetentionEngine
+from .rollups import aget_top_websites, get_top_websites
+from .screenshots import (
+    LEGACY_SCREENSHOT_FIELD, ScreenshotPipeline, ScreenshotSpool, screenshot_parts, store_screenshot,
+)
+from .serializers import BulkMonitoringSerializer
+from .search import SimpleSearchBackend, get_search_backend, search_logs
+from .spans import sessionize
+from .spool import HEADER, IngestSpool, SpoolLoader
+from .streaming import READ_SIZE, NDJSONIngestor, iter_body, zstandard
+from .validation import RECORD_SERIALIZERS, RecordValidator, get_bulk_validator
+
+
+def ingest(payload, when, ingestor=None):
+    """Validate a bulk payload and write it with every log stamped ``when``, as the spool loader does"""
+    validated = get_bulk_validator().validate(payload)
+    validated = {key: [dict(record, timestamp=when) for record in records] for key, records in validated.items()}
+    with mock.patch('django.utils.timezone.now', return_value=when):
+        return (ingestor or BulkIngestor()).ingest(validated)
+
+
+def file_access(device, *paths):
+    return {
+        'device_identifier': device,
+        'file_access': [
+            {'device_identifier': device, 'file_path': path, 'operation': 'read', 'process_name': 'cat'}
+            for path in paths
+        ],
+    }
+
+
+def app_usage(device, app, window_title, duration, is_active=True):
+    return {
+        'device_identifier': device,
+        'app_usage': [{
+            'device_identifier': device, 'app_name': app, 'window_title': window_title,
+            'duration': duration, 'is_active': is_active,
+        }],
+    }
+
+
+class TemporaryDirectoryMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+
+class IngestSpoolTests(TemporaryDirectoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.spool = IngestSpool(self.tmp)
+
+    def spooled(self, device, *paths):
+        return {
+            'received_at': timezone.now(),
+            'ip_address': '10.0.0.1',
+            'agent_version': '1.2.3',
+            'data': file_access(device, *paths),
+            'screenshots': [],
+        }
+
+    def write_segment(self, name, data):
+        self.spool.ensure_dirs()
+        with open(self.spool.path('segments', name), 'wb') as f:
+            f.write(data)
+
+    def test_records_read_back_with_their_end_offsets(self):
+        segment = self.spool.append({'n': 1})
+        self.assertEqual(self.spool.append({'n': 2}), segment)
+
+        records, corrupt = self.spool.read(segment)
+        self.assertFalse(corrupt)
+        self.assertEqual([record for record, _ in records], [{'n': 1}, {'n': 2}])
+        self.assertEqual(records[-1][1], os.path.getsize(self.spool.path('segments', segment)))
+
+        rest, _ = self.spool.read(segment, records[0][1])
+        self.assertEqual([record for record, _ in rest], [{'n': 2}])
+
+    def test_torn_tail_is_not_read(self):
+        segment = self.spool.append({'n': 1})
+        path = self.spool.path('segments', segment)
+        complete = os.path.getsize(path)
+        self.spool.append({'n': 2})
+        with open(path, 'r+b') as f:
+            f.truncate(complete + HEADER.size + 3)
+
+        records, corrupt = self.spool.read(segment)
+        self.assertFalse(corrupt)
+        self.assertEqual([record for record, _ in records], [{'n': 1}])
+
+    def test_checksum_mismatch_stops_reading(self):
+        data = b'{"n":2}'
+        self.write_segment('00000000000000000001-host-1.seg', (
+            HEADER.pack(7, zlib.crc32(b'{"n":1}')) + b'{"n":1}'
+            + HEADER.pack(len(data), zlib.crc32(data) ^ 1) + data
+        ))
+
+        records, corrupt = self.spool.read('00000000000000000001-host-1.seg')
+        self.assertTrue(corrupt)
+        self.assertEqual([record for record, _ in records], [{'n': 1}])
+
+    def test_loader_checkpoints_and_loads_each_payload_once(self):
+        segment = self.spool.append(self.spooled('dev-1', '/a', '/b'))
+        self.spool.append(self.spooled('dev-2', '/c'))
+        loader = SpoolLoader(self.spool, batch_records=10)
+
+        self.assertEqual(loader.run(), 2)
+        self.assertEqual(FileAccessLog.objects.count(), 3)
+        self.assertEqual(
+            IngestCheckpoint.objects.get(segment=segment).offset,
+            os.path.getsize(self.spool.path('segments', segment)),
+        )
+
+        self.assertEqual(loader.run(), 0)
+        self.assertEqual(FileAccessLog.objects.count(), 3)
+
+    def test_loader_resumes_from_the_checkpoint(self):
+        self.spool.append(self.spooled('dev-1', '/a'))
+        self.spool.append(self.spooled('dev-1', '/b'))
+        loader = SpoolLoader(self.spool, batch_records=1)
+
+        self.assertEqual(loader.run(), 1)
+        self.assertEqual(loader.run(), 1)
+        self.assertEqual(loader.run(), 0)
+        self.assertEqual(
+            sorted(FileAccessLog.objects.values_list('file_path__value', flat=True)), ['/a', '/b'],
+        )
+
+    def test_sealed_corrupt_segment_is_quarantined(self):
+        segment = '00000000000000000001-host-1.seg'
+        self.write_segment(segment, HEADER.pack(4, 0) + b'junk')
+
+        self.assertEqual(SpoolLoader(self.spool).run(), 0)
+        self.assertEqual(self.spool.segments(), [])
+        self.assertTrue(os.path.exists(self.spool.path('corrupt', segment)))
+
+    def test_sealed_segments_are_collected_once_loaded(self):
+        self.spool.append(self.spooled('dev-1', '/a'))
+        self.spool._close()
+        with mock.patch('dashboard.spool.time.time', return_value=self.spool._opened_at + 3600):
+            SpoolLoader(self.spool).run()
+
+        self.assertEqual(self.spool.segments(), [])
+        self.assertFalse(IngestCheckpoint.objects.exists())
+        self.assertEqual(FileAccessLog.objects.count(), 1)
+
+
+@override_settings(LOG_SPAN_QUIET_SECONDS=300)
+class SessionizeTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def test_samples_with_the_same_key_extend_the_open_span(self):
+        ingest(app_usage('dev-1', 'Code', 'views.py', 60), self.start)
+        ingest(app_usage('dev-1', 'Code', 'views.py', 30), self.start + timedelta(minutes=1))
+
+        span = AppUsageLog.objects.get()
+        self.assertEqual(span.duration, 90)
+        self.assertEqual(span.samples, 2)
+        self.assertEqual(span.timestamp, self.start)
+        self.assertEqual(span.ended_at, self.start + timedelta(minutes=1))
+        self.assertEqual(LogHourlyRollup.objects.get(log_type='app_usage').count, 1)
+
+    def test_another_key_or_a_quiet_gap_starts_a_span(self):
+        ingest(app_usage('dev-1', 'Code', 'views.py', 60), self.start)
+        ingest(app_usage('dev-1', 'Slack', '#general', 60), self.start + timedelta(minutes=1))
+        ingest(app_usage('dev-1', 'Slack', '#general', 60), self.start + timedelta(minutes=20))
+        ingest(app_usage('dev-1', 'Slack', '#general', 60, is_active=False), self.start + timedelta(minutes=21))
+
+        self.assertEqual(AppUsageLog.objects.count(), 4)
+
+    def test_devices_have_spans_of_their_own(self):
+        ingest(app_usage('dev-1', 'Code', 'views.py', 60), self.start)
+        ingest(app_usage('dev-2', 'Code', 'views.py', 60), self.start + timedelta(minutes=1))
+
+        self.assertEqual(AppUsageLog.objects.count(), 2)
+
+    def test_samples_merge_within_a_batch(self):
+        ingestor = BulkIngestor()
+        payload = app_usage('dev-1', 'Code', 'views.py', 10)
+        records = get_bulk_validator().validate(payload)['app_usage']
+        logs = ingestor.build_logs({'app_usage': [
+            dict(records[0], timestamp=self.start + timedelta(seconds=offset)) for offset in (0, 10, 20)
+        ]})
+
+        self.assertEqual(sessionize(logs), {})
+        self.assertEqual(len(logs['app_usage']), 1)
+        self.assertEqual(logs['app_usage'][0].duration, 30)
+        self.assertEqual(logs['app_usage'][0].samples, 3)
+
+    def test_extended_website_span_is_searchable_by_its_latest_title(self):
+        def visit(title, when):
+            ingest({'device_identifier': 'dev-1', 'website_visits': [{
+                'device_identifier': 'dev-1', 'url': 'https://example.com/', 'title': title, 'duration': 30,
+            }]}, when)
+
+        visit('Alpha', self.start)
+        visit('Zebulon', self.start + timedelta(seconds=30))
+
+        self.assertEqual(LogSearchDocument.objects.count(), 1)
+        self.assertEqual(search_logs(BaseLog.objects.all(), 'zebulon').count(), 1)
+
+    @override_settings(LOG_SPAN_QUIET_SECONDS=0)
+    def test_disabled_spans_store_every_sample(self):
+        ingest(app_usage('dev-1', 'Code', 'views.py', 60), self.start)
+        ingest(app_usage('dev-1', 'Code', 'views.py', 60), self.start + timedelta(minutes=1))
+
+        self.assertEqual(AppUsageLog.objects.count(), 2)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        ingest(file_access(
+            'dev-1', '/reports/budget/budget.xlsx', '/reports/quarterly/budget.xlsx', '/reports/mybudget.xlsx',
+        ), timezone.now())
+
+    def search(self, keyword):
+        logs = search_logs(FileAccessLog.objects.all(), keyword).order_by('-search_rank', '-id')
+        return list(logs.values_list('file_path__value', flat=True))
+
+    def test_every_word_matches_a_word_prefix(self):
+        for backend in (get_search_backend(), SimpleSearchBackend()):
+            with self.subTest(backend=backend.name), mock.patch('dashboard.search._backend', backend):
+                self.assertCountEqual(
+                    self.search('budg'), ['/reports/budget/budget.xlsx', '/reports/quarterly/budget.xlsx'],
+                )
+                self.assertEqual(self.search('quarterly budget'), ['/reports/quarterly/budget.xlsx'])
+                self.assertEqual(self.search('udget'), [])
+
+    def test_more_frequent_words_rank_higher(self):
+        self.assertEqual(
+            self.search('budget'), ['/reports/budget/budget.xlsx', '/reports/quarterly/budget.xlsx'],
+        )
+
+    def test_rank_is_the_same_on_every_page(self):
+        logs = search_logs(FileAccessLog.objects.all(), 'budget')
+        first = KeysetPaginator(logs, ordering=('-search_rank', '-id'), per_page=1).page()
+        second = KeysetPaginator(logs, ordering=('-search_rank', '-id'), per_page=1).page(first.next_cursor)
+
+        self.assertEqual([log.file_path.value for log in first], ['/reports/budget/budget.xlsx'])
+        self.assertEqual([log.file_path.value for log in second], ['/reports/quarterly/budget.xlsx'])
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        for days in (10, 9, 8, 1):
+            ingest(file_access('dev-1', f'/old-{days}', f'/other-{days}'), self.now - timedelta(days=days))
+
+    def test_deletes_expired_logs_in_batches(self):
+        engine = RetentionEngine(policies={'file_access': 5}, screenshot_days=0, batch_size=4, pause=0.5)
+        with mock.patch('dashboard.retention.time.sleep') as sleep:
+            report = engine.run(now=self.now)
+
+        self.assertEqual(report.logs['file_access'], 6)
+        # A full batch of 4, a pause, then the last 2
+        sleep.assert_called_once_with(0.5)
+        self.assertEqual(
+            sorted(FileAccessLog.objects.values_list('file_path__value', flat=True)), ['/old-1', '/other-1'],
+        )
+        self.assertEqual(BaseLog.objects.count(), 2)
+        self.assertEqual(LogSearchDocument.objects.count(), 2)
+
+    def test_batches_cover_every_expired_row(self):
+        engine = RetentionEngine(policies={}, batch_size=4, pause=0)
+        batches = list(engine.batches(BaseLog.objects.all()))
+
+        self.assertEqual([len(pks) for pks in batches], [4, 4])
+        self.assertEqual(sorted(pk for pks in batches for pk in pks), sorted(BaseLog.objects.values_list('pk', flat=True)))
+
+    def test_dry_run_deletes_nothing(self):
+        report = RetentionEngine(policies={'file_access': 5}, screenshot_days=0, dry_run=True).run(now=self.now)
+
+        self.assertEqual(report.logs['file_access'], 6)
+        self.assertEqual(BaseLog.objects.count(), 8)
+
+    def test_rollups_and_device_counters_are_kept(self):
+        hourly = list(LogHourlyRollup.objects.order_by('hour').values_list('hour', 'count'))
+        RetentionEngine(policies={'file_access': 5}, screenshot_days=0, pause=0).run(now=self.now)
+
+        self.assertEqual(list(LogHourlyRollup.objects.order_by('hour').values_list('hour', 'count')), hourly)
+        self.assertEqual(BaseLog.objects.count(), 2)
+
+    def test_unknown_log_type_is_refused(self):
+        with self.assertRaises(ValueError):
+            RetentionEngine(policies={'keystrokes': 1})
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        # Pairs of logs share a timestamp, so the id has to break the ties
+        for minutes in range(7):
+            ingest(file_access('dev-1', f'/a-{minutes}', f'/b-{minutes}'), now - timedelta(minutes=minutes))
+        self.expected = list(BaseLog.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+
+    def walk(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_pages_cover_every_row_once_in_order(self):
+        pages = self.walk(KeysetPaginator(BaseLog.objects.all(), per_page=3))
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 3, 2])
+        self.assertEqual([log.id for page in pages for log in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+    def test_previous_cursor_returns_the_previous_page(self):
+        paginator = KeysetPaginator(BaseLog.objects.all(), per_page=3)
+        pages = self.walk(paginator)
+
+        for before, page in zip(pages, pages[1:]):
+            previous = paginator.page(page.previous_cursor)
+            self.assertEqual([log.id for log in previous], [log.id for log in before])
+
+    def test_ascending_ordering(self):
+        pages = self.walk(KeysetPaginator(BaseLog.objects.all(), ordering=('timestamp', 'id'), per_page=4))
+
+        self.assertEqual([log.id for page in pages for log in page], list(reversed(self.expected)))
+
+    def test_mixed_directions_are_refused(self):
+        with self.assertRaises(ValueError):
+            KeysetPaginator(BaseLog.objects.all(), ordering=('-timestamp', 'id'))
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(BaseLog.objects.all(), per_page=3)
+        for cursor in ('not a cursor', 'eyJwIjpbMV0sInIiOjB9'):
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+
+    def test_logs_explorer_falls_back_to_the_first_page(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        # secure=True: SECURE_SSL_REDIRECT is on by default
+        response = self.client.get('/logs/', {'cursor': 'garbage'}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([log.id for log in response.context['page_obj']], self.expected)
+
+
+class LiveEventTests(TestCase):
+    def setUp(self):
+        # Running on-commit callbacks inside the test transaction also caches interned ids it rolls back
+        self.addCleanup(get_intern_cache().clear)
+
+    def event(self, id, age=0):
+        event = LiveEvent.objects.create(id=id, kind='counts', payload={'file_access': 1})
+        LiveEvent.objects.filter(id=id).update(created_at=timezone.now() - timedelta(seconds=age))
+        return event
+
+    def test_events_are_written_when_the_ingest_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            ingest(file_access('dev-1', '/a', '/b'), timezone.now())
+            self.assertFalse(LiveEvent.objects.exists())
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(
+            list(LiveEvent.objects.values_list('kind', 'payload')),
+            [('counts', {'file_access': 2}), ('heartbeat', mock.ANY)],
+        )
+
+    def test_rolled_back_ingest_publishes_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                ingest(file_access('dev-1', '/a'), timezone.now())
+                raise RuntimeError
+
+        self.assertFalse(LiveEvent.objects.exists())
+
+    def test_poll_waits_at_a_recent_gap(self):
+        self.event(1)
+        self.event(3)
+        stream = LiveEventStream(last_id=0)
+
+        self.assertIn(b'id: 1\n', stream.poll())
+        self.assertEqual(stream.poll(), b'')
+        self.assertEqual(stream.last_id, 1)
+
+        self.event(2)
+        self.assertEqual(stream.poll().count(b'id: '), 2)
+        self.assertEqual(stream.last_id, 3)
+
+    def test_poll_skips_a_gap_once_it_settled(self):
+        self.event(1, age=60)
+        self.event(3, age=GAP_GRACE_SECONDS + 1)
+        stream = LiveEventStream(last_id=0)
+
+        self.assertEqual(stream.poll().count(b'id: '), 2)
+        self.assertEqual(stream.last_id, 3)
+
+    def test_single_poll_ends_with_its_resume_point(self):
+        self.event(1)
+        self.event(2)
+
+        body = LiveEventStream(last_id=1, poll_interval=1).once()
+        self.assertTrue(body.startswith(b'retry: 2000\n\n'))
+        self.assertTrue(body.endswith(b'id: 2\n\n'))
+        self.assertNotIn(b'id: 1\n', body)
+
+    def test_new_subscriber_starts_after_the_latest_event(self):
+        self.event(1)
+        stream = LiveEventStream()
+        stream.start()
+
+        self.assertEqual(stream.poll(), b'')
+        self.assertEqual(stream.last_id, 1)
+
+
+class CachedSectionTests(TestCase):
+    def setUp(self):
+        self.addCleanup(get_intern_cache().clear)
+        self.computed = 0
+
+    def section(self, log_types):
+        def counted():
+            self.computed += 1
+            return self.computed
+        return CachedSection(counted, log_types, ttl=60)
+
+    def test_section_is_cached_until_a_log_type_it_reads_is_written(self):
+        section = self.section(['activity'])
+        self.assertEqual(section(), 1)
+        self.assertEqual(section(), 1)
+
+        bump_generations(['file_access'])
+        self.assertEqual(section(), 1)
+        bump_generations(['activity'])
+        self.assertEqual(section(), 2)
+
+    def test_ingest_invalidates_once_it_commits(self):
+        section = self.section(['file_access'])
+        section()
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest(file_access('dev-1', '/a'), timezone.now())
+            self.assertEqual(section(), 1)
+
+        self.assertEqual(section(), 2)
+
+    def test_every_bump_stores_a_new_generation(self):
+        seen = {current_generations(['activity'])}
+        for _ in range(5):
+            bump_generations(['activity'])
+            seen.add(current_generations(['activity']))
+
+        self.assertEqual(len(seen), 6)
+
+
+class ScreenshotDeduplicationTests(TemporaryDirectoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(
+            MEDIA_ROOT=self.tmp, SCREENSHOT_NEAR_DUPLICATE_DISTANCE=8, SCREENSHOT_NEAR_DUPLICATE_MAX_CHANGE=0.0001,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def png(self, image):
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        return ContentFile(buffer.getvalue(), name='screen.png')
+
+    def screen(self, colour=(30, 30, 30)):
+        return Image.new('RGB', (1280, 800), colour)
+
+    def test_identical_bytes_are_stored_once(self):
+        first, outcome = store_screenshot(self.png(self.screen()), 'dev-1', 'screen.png')
+        self.assertEqual(outcome, 'uploaded')
+
+        second, outcome = store_screenshot(self.png(self.screen()), 'dev-2', 'screen.png')
+        self.assertEqual(outcome, 'deduplicated')
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(ScreenshotBlob.objects.count(), 1)
+
+    def test_blinking_cursor_is_a_near_duplicate(self):
+        first, _ = store_screenshot(self.png(self.screen()), 'dev-1', 'screen.png')
+        cursor = self.screen()
+        cursor.putpixel((640, 400), (255, 255, 255))
+
+        blob, outcome = store_screenshot(self.png(cursor), 'dev-1', 'screen.png')
+        self.assertEqual(outcome, 'near_duplicates')
+        self.assertEqual(blob.pk, first.pk)
+
+    def test_other_device_screens_are_not_near_duplicates(self):
+        store_screenshot(self.png(self.screen()), 'dev-1', 'screen.png')
+        cursor = self.screen()
+        cursor.putpixel((640, 400), (255, 255, 255))
+
+        _, outcome = store_screenshot(self.png(cursor), 'dev-2', 'screen.png')
+        self.assertEqual(outcome, 'uploaded')
+
+    def test_frames_differing_only_in_colour_are_kept_apart(self):
+        # The same grey level, 76, once converted to greyscale
+        store_screenshot(self.png(self.screen((255, 0, 0))), 'dev-1', 'screen.png')
+
+        _, outcome = store_screenshot(self.png(self.screen((0, 130, 0))), 'dev-1', 'screen.png')
+        self.assertEqual(outcome, 'uploaded')
+        self.assertEqual(ScreenshotBlob.objects.count(), 2)
+
+    def test_greyscale_signatures_never_match(self):
+        blob, _ = store_screenshot(self.png(self.screen()), 'dev-1', 'screen.png')
+        blob.signature = zlib.compress(bytes(len(zlib.decompress(signature(self.screen()))) // 3))
+        blob.save()
+        cursor = self.screen()
+        cursor.putpixel((640, 400), (255, 255, 255))
+
+        _, outcome = store_screenshot(self.png(cursor), 'dev-1', 'screen.png')
+        self.assertEqual(outcome, 'uploaded')
+
+
+class ScreenshotPartsTests(TemporaryDirectoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(MEDIA_ROOT=self.tmp)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, name='screen.png', colour=(30, 30, 30)):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 40), colour).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def activity(self, part=None):
+        record = {'device_identifier': 'dev-1', 'window_title': 'Mail'}
+        return dict(record, screenshot_part=part) if part else record
+
+    def test_each_record_gets_the_part_it_names(self):
+        records = [self.activity('a'), self.activity('b'), self.activity('a'), self.activity()]
+        files = MultiValueDict({'a': [self.upload('a.png')], 'b': [self.upload('b.png')]})
+
+        pairs = screenshot_parts(records, files)
+        self.assertEqual([(upload.name, indexes) for upload, indexes in pairs], [('a.png', [0, 2]), ('b.png', [1])])
+        self.assertFalse(any('screenshot_part' in record for record in records))
+
+    def test_missing_parts_leave_their_records_without_screenshot(self):
+        records = [self.activity('a'), self.activity('b')]
+        with self.assertLogs('dashboard.screenshots', 'WARNING'):
+            pairs = screenshot_parts(records, MultiValueDict({'b': [self.upload('b.png')]}))
+
+        self.assertEqual([(upload.name, indexes) for upload, indexes in pairs], [('b.png', [1])])
+
+    def test_legacy_screenshot_parts(self):
+        records = [self.activity(), self.activity()]
+        single = MultiValueDict({LEGACY_SCREENSHOT_FIELD: [self.upload('all.png')]})
+        each = MultiValueDict({LEGACY_SCREENSHOT_FIELD: [self.upload('1.png'), self.upload('2.png')]})
+        extra = MultiValueDict({LEGACY_SCREENSHOT_FIELD: [self.upload(f'{i}.png') for i in range(3)]})
+
+        self.assertEqual([indexes for _, indexes in screenshot_parts(records, single)], [[0, 1]])
+        self.assertEqual([(upload.name, indexes) for upload, indexes in screenshot_parts(records, each)],
+                         [('1.png', [0]), ('2.png', [1])])
+        with self.assertLogs('dashboard.screenshots', 'WARNING'):
+            self.assertEqual(screenshot_parts(records, extra), [])
+
+    def test_bulk_upload_attaches_each_record_its_own_screenshot(self):
+        self.addCleanup(get_intern_cache().clear)
+        pipeline = ScreenshotPipeline(ScreenshotSpool(os.path.join(self.tmp, 'spool')), workers=0)
+        payload = {'activity_logs': [
+            dict(self.activity('red'), analysis='first'), dict(self.activity('blue'), analysis='second'),
+        ]}
+        with mock.patch('dashboard.screenshots._pipeline', pipeline), \
+                mock.patch('dashboard.screenshots.close_old_connections'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/bulk/', {
+                'data': json.dumps(payload),
+                'red': self.upload('red.png', (255, 0, 0)),
+                'blue': self.upload('blue.png', (0, 0, 255)),
+            }, secure=True)
+
+        self.assertEqual(response.status_code, 201)
+        logs = {log.analysis: log for log in ActivityLog.objects.select_related('screenshot_blob')}
+        self.assertNotEqual(logs['first'].screenshot_blob, logs['second'].screenshot_blob)
+        for analysis, colour in (('first', (255, 0, 0)), ('second', (0, 0, 255))):
+            with logs[analysis].screenshot.open('rb') as f:
+                self.assertEqual(Image.open(f).getpixel((0, 0)), colour)
+        self.assertEqual(pipeline.status()['uploaded'], 2)
+
+
+class RollupRebuildTests(TestCase):
+    def setUp(self):
+        seed_logs(FleetGenerator(devices=3, seed=1), 600, days=6, chunk_rows=40)
+
+    def snapshot(self):
+        return {
+            'hourly': sorted(LogHourlyRollup.objects.values_list('hour', 'device_identifier', 'log_type', 'count')),
+            'apps': sorted(AppUsageDailyRollup.objects.values_list(
+                'day', 'device_identifier', 'app_name_id', 'count', 'total_duration', 'active_duration',
+            )),
+            'websites': sorted(WebsiteDailyRollup.objects.values_list(
+                'day', 'device_identifier', 'url_id', 'count', 'total_duration', 'title_id',
+            )),
+            'keywords': sorted(KeywordCounter.objects.values_list('day', 'device_identifier', 'keyword', 'count')),
+        }
+
+    def rebuild(self, *args):
+        call_command('rebuild_rollups', *args, stdout=io.StringIO())
+
+    def test_rebuild_matches_incremental_rollups(self):
+        incremental = self.snapshot()
+        self.assertTrue(incremental['hourly'] and incremental['apps'] and incremental['websites'])
+
+        self.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_rebuild_keeps_the_history_retention_downsampled(self):
+        incremental = self.snapshot()
+        policies = {'activity': 3, 'app_usage': 3, 'website_visit': 3, 'file_access': 3, 'usb_device': 3}
+        RetentionEngine(policies=policies, screenshot_days=0, pause=0).run()
+        self.assertLess(BaseLog.objects.count(), 600)
+
+        with override_settings(LOG_RETENTION_POLICIES=policies):
+            self.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_since_rebuilds_from_the_raw_logs_left(self):
+        RetentionEngine(policies={'file_access': 3}, screenshot_days=0, pause=0).run()
+        self.rebuild('--since', '2000-01-01')
+
+        rebuilt = sum(count for _, _, log_type, count in self.snapshot()['hourly'] if log_type == 'file_access')
+        self.assertEqual(rebuilt, FileAccessLog.objects.count())
+
+    def test_device_counters_follow_the_rollups(self):
+        self.rebuild()
+        for device in ('bench-00000', 'bench-00001', 'bench-00002'):
+            logs = BaseLog.objects.filter(device_identifier=device)
+            registered = Device.objects.get(device_identifier=device)
+            self.assertEqual(registered.app_usage_count, logs.filter(log_type='app_usage').count())
+            self.assertEqual(registered.file_operations, logs.filter(log_type='file_access').count())
+            self.assertEqual(
+                registered.flagged_count,
+                ActivityLog.objects.filter(device_identifier=device, is_flagged=True).count(),
+            )
+
+
+class TopWebsitesTests(TestCase):
+    def visit(self, device, url, title, when):
+        ingest({'device_identifier': device, 'website_visits': [{
+            'device_identifier': device, 'url': url, 'title': title, 'duration': 30,
+        }]}, when)
+
+    def test_ranking_shows_the_latest_title(self):
+        day = timezone.now() - timedelta(days=3)
+        self.visit('dev-1', 'https://example.org/', 'Inbox', day)
+        self.visit('dev-1', 'https://example.com/', 'Drafts', day)
+        self.visit('dev-2', 'https://example.com/', 'Inbox', day + timedelta(days=1))
+
+        expected = [
+            {'url': 'https://example.com/', 'title': 'Inbox', 'visit_count': 2, 'total_duration': 60},
+            {'url': 'https://example.org/', 'title': 'Inbox', 'visit_count': 1, 'total_duration': 30},
+        ]
+        self.assertEqual(get_top_websites(), expected)
+        self.assertEqual(async_to_sync(aget_top_websites)(), expected)
+
+    def test_range_ends_before_the_latest_title(self):
+        day = timezone.now() - timedelta(days=3)
+        self.visit('dev-1', 'https://example.com/', 'Inbox', day)
+        self.visit('dev-1', 'https://example.com/', 'Drafts', day + timedelta(days=1))
+
+        self.assertEqual(get_top_websites(until=day.date())[0]['title'], 'Inbox')
+
+
+class RecordValidatorTests(TestCase):
+    RECORDS = {
+        'app_usage': {
+            'device_identifier': 'dev-1', 'app_name': 'Code', 'window_title': 'views.py', 'duration': 60,
+            'is_active': True,
+        },
+        'website_visits': {
+            'device_identifier': 'dev-1', 'url': 'https://example.com/', 'title': 'Example', 'duration': 30,
+        },
+        'file_access': {
+            'device_identifier': 'dev-1', 'file_path': '/a', 'operation': 'read', 'process_name': 'cat',
+        },
+        'usb_devices': {
+            'device_identifier': 'dev-1', 'device_name': 'Stick', 'vendor_id': '0781', 'product_id': '5567',
+            'action': 'connected',
+        },
+        'activity_logs': {
+            'device_identifier': 'dev-1', 'window_title': 'Mail', 'analysis': 'Routine work', 'is_flagged': False,
+            'keywords': ['salary'], 'confidence': 0.5,
+        },
+    }
+    # Changes to one record each: valid values DRF converts, and invalid ones
+    CHANGES = {
+        'app_usage': [
+            {'duration': '60'}, {'duration': 1.0}, {'duration': 1.5}, {'duration': True}, {'is_active': 'true'},
+            {'is_active': 'maybe'}, {'app_name': ''}, {'app_name': '  Code  '}, {'app_name': 'x' * 256},
+            {'app_name': 'a\x00b'}, {'app_name': 123}, {'app_name': ['Code']}, {'device_identifier': None},
+            {'unknown': 'ignored'},
+        ],
+        'website_visits': [{'url': 'not a url'}, {'url': 'https://' + 'a' * 200 + '.com/'}, {'title': None}],
+        'file_access': [{'file_path': 'x' * 513}, {'operation': ''}, {'process_name': '\ud800'}],
+        'usb_devices': [{'name': 'Renamed'}, {'vendor_id': '12345678901'}, {'serial_number': ''}],
+        'activity_logs': [
+            {'keywords': '["salary"]'}, {'keywords': [1, 2]}, {'keywords': []}, {'keywords': None},
+            {'keywords': [None]}, {'confidence': 1}, {'confidence': 'high'}, {'screenshot': None},
+            {'screenshot': 42}, {'is_flagged': None},
+        ],
+    }
+
+    def drf(self, serializer_class, record):
+        serializer = serializer_class(data=copy.deepcopy(record))
+        if serializer.is_valid():
+            return serializer.validated_data
+        return serializer.errors
+
+    def compiled(self, validator, record):
+        try:
+            return validator.validate(copy.deepcopy(record))
+        except ValidationError as e:
+            return e.detail
+
+    def test_records_validate_like_their_serializer(self):
+        for key, serializer_class in RECORD_SERIALIZERS.items():
+            validator = RecordValidator(serializer_class)
+            records = [self.RECORDS[key], {}, 'not an object']
+            records += [{**self.RECORDS[key], **change} for change in self.CHANGES[key]]
+            records += [{k: v for k, v in self.RECORDS[key].items() if k != field} for field in self.RECORDS[key]]
+            for record in records:
+                with self.subTest(key=key, record=record):
+                    self.assertEqual(self.compiled(validator, record), self.drf(serializer_class, record))
+
+    def test_bulk_payload_validates_like_the_bulk_serializer(self):
+        valid = {key: [record, record] for key, record in self.RECORDS.items()}
+        invalid = dict(valid, app_usage=[self.RECORDS['app_usage'], {'duration': 'long'}])
+        for payload in (valid, invalid, {'app_usage': 'not a list'}, []):
+            with self.subTest(payload=payload):
+                expected = self.drf(BulkMonitoringSerializer, payload)
+                self.assertEqual(self.compiled(get_bulk_validator(), payload), expected)
+
+
+class AsyncViewTests(TestCase):
+    def post_bulk(self, payload, **extra):
+        return self.async_client.post('/api/bulk/', {'data': json.dumps(payload)}, secure=True, **extra)
+
+    async def test_bulk_ingest_writes_the_payload_and_its_agent(self):
+        payload = app_usage('dev-1', 'Code', 'views.py', 60)
+        response = await self.post_bulk(payload, headers={'X-Agent-Version': '2.1'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await AppUsageLog.objects.acount(), 1)
+        device = await Device.objects.aget(device_identifier='dev-1')
+        self.assertEqual((device.app_usage_count, device.agent_version), (1, '2.1'))
+
+    async def test_bulk_ingest_reports_the_serializer_errors(self):
+        payload = {'app_usage': [{'device_identifier': 'dev-1', 'duration': 'long'}]}
+        response = await self.post_bulk(payload)
+
+        self.assertEqual(response.status_code, 400)
+        serializer = BulkMonitoringSerializer(data=payload)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(response.json(), json.loads(json.dumps(serializer.errors)))
+        self.assertFalse(await BaseLog.objects.aexists())
+
+    async def test_bulk_ingest_rejects_invalid_json(self):
+        response = await self.async_client.post('/api/bulk/', {'data': '{'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_device_stats(self):
+        await self.post_bulk(file_access('dev-1', '/a', '/b'))
+
+        response = await self.async_client.get('/api/device-stats/', secure=True)
+        self.assertEqual([row['device_identifier'] for row in response.json()], ['dev-1'])
+        response = await self.async_client.get('/api/device-stats/dev-1/', secure=True)
+        self.assertEqual(response.json()['file_operations'], 2)
+        response = await self.async_client.get('/api/device-stats/dev-2/', secure=True)
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.post('/api/device-stats/', secure=True)
+        self.assertEqual(response.status_code, 405)
+
+    async def test_leaderboards(self):
+        await self.post_bulk(app_usage('dev-1', 'Code', 'views.py', 60))
+        await self.post_bulk(app_usage('dev-2', 'Mail', 'Inbox', 30))
+
+        response = await self.async_client.get('/api/leaderboards/apps/', {'device': 'dev-2'}, secure=True)
+        self.assertEqual([row['app_name'] for row in response.json()], ['Mail'])
+        response = await self.async_client.get('/api/leaderboards/apps/', {'limit': 1}, secure=True)
+        self.assertEqual([row['app_name'] for row in response.json()], ['Code'])
+        response = await self.async_client.get('/api/leaderboards/apps/', {'since': 'yesterday'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get('/api/leaderboards/files/', secure=True)
+        self.assertEqual(response.status_code, 404)
+
+
+@skipIf(pyarrow is None, "pyarrow is not installed")
+class ExportTests(TemporaryDirectoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = (timezone.now() - timedelta(days=2)).replace(hour=12)
+        ingest(app_usage('dev-1', 'Code', 'views.py', 60), self.day)
+        ingest(file_access('dev-1', '/a', '/b'), self.day)
+        ingest(file_access('dev-2', '/c'), self.day + timedelta(days=1))
+
+    def test_file_holds_every_log_type_in_one_schema(self):
+        path = os.path.join(self.tmp, 'logs.parquet')
+        call_command('export_logs', path, '--batch-size', '1', stdout=io.StringIO())
+
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.schema, export_schema())
+        rows = sorted(table.to_pylist(), key=lambda row: row['id'])
+        self.assertEqual([row['log_type'] for row in rows], ['app_usage', 'file_access', 'file_access', 'file_access'])
+        self.assertEqual((rows[0]['app_name'], rows[0]['duration'], rows[0]['file_path']), ('Code', 60, None))
+        self.assertEqual([row['file_path'] for row in rows[1:]], ['/a', '/b', '/c'])
+
+    def test_filters_select_the_rows(self):
+        exporter = LogExporter(
+            since=parse_bound(self.day.date().isoformat()),
+            until=parse_bound(self.day.date().isoformat(), end=True),
+            device_identifiers=['dev-1'],
+            log_types=['file_access'],
+        )
+        path = os.path.join(self.tmp, 'logs.arrows')
+
+        self.assertEqual(exporter.write(path, 'arrow'), 2)
+        with pyarrow.ipc.open_stream(path) as reader:
+            self.assertEqual(reader.read_all().column('file_path').to_pylist(), ['/a', '/b'])
+
+    def test_view_streams_the_export(self):
+        response = self.client.get('/api/export/', {'format': 'arrow', 'device': 'dev-2'}, secure=True)
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="logs.arrows"')
+        table = pyarrow.ipc.open_stream(b''.join(response.streaming_content)).read_all()
+        self.assertEqual(table.column('file_path').to_pylist(), ['/c'])
+
+    def test_view_rejects_bad_parameters(self):
+        for params in ({'format': 'csv'}, {'log_type': 'email'}, {'since': 'last week'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/export/', params, secure=True).status_code, 400)
+
+
+class NDJSONIngestorTests(TestCase):
+    def body(self, *lines):
+        return io.BytesIO(b'\n'.join(lines) + b'\n')
+
+    def record(self, path):
+        return (
+            b'{"type": "file_access", "device_identifier": "dev-1", "file_path": "%s", '
+            b'"operation": "read", "process_name": "cat"}' % path.encode()
+        )
+
+    def test_records_are_written_in_chunks(self):
+        summary = NDJSONIngestor(chunk_size=2).ingest(self.body(*(self.record(f'/f{n}') for n in range(5))))
+
+        self.assertEqual((summary['accepted'], summary['chunks'], summary['rejected']), (5, 3, 0))
+        self.assertEqual(FileAccessLog.objects.count(), 5)
+
+    def test_invalid_lines_are_reported_and_skipped(self):
+        summary = NDJSONIngestor().ingest(self.body(
+            self.record('/a'), b'{not json', b'[1, 2]', b'{"type": "keystrokes"}', b'', self.record('/b'),
+        ))
+
+        self.assertEqual((summary['accepted'], summary['rejected']), (2, 3))
+        self.assertEqual([error['line'] for error in summary['errors']], [2, 3, 4])
+
+    def test_reported_errors_are_capped(self):
+        summary = NDJSONIngestor(max_errors=2).ingest(self.body(*[b'{not json'] * 5))
+
+        self.assertEqual(summary['rejected'], 5)
+        self.assertEqual(len(summary['errors']), 2)
+
+    def test_oversized_line_stops_the_stream_and_keeps_earlier_records(self):
+        summary = NDJSONIngestor(max_line_bytes=256).ingest(self.body(
+            self.record('/a'), b'{"type": "file_access", "file_path": "' + b'x' * 1024 + b'"}', self.record('/b'),
+        ))
+
+        self.assertIn('longer than 256 bytes', summary['stream_error'])
+        self.assertEqual(summary['accepted'], 1)
+        self.assertEqual(list(FileAccessLog.objects.values_list('file_path__value', flat=True)), ['/a'])
+
+    def test_gzip_body(self):
+        body = io.BytesIO(gzip.compress(self.record('/a') + b'\n' + self.record('/b')))
+        summary = NDJSONIngestor().ingest(body, 'gzip')
+
+        self.assertEqual(summary['accepted'], 2)
+
+    def test_truncated_gzip_body_keeps_what_was_read(self):
+        data = gzip.compress(b'\n'.join(self.record(f'/f{n}') for n in range(50)) + b'\n')
+        summary = NDJSONIngestor().ingest(io.BytesIO(data[:-12]), 'gzip')
+
+        self.assertEqual(summary['stream_error'], 'Truncated compressed body')
+        self.assertEqual(summary['accepted'], FileAccessLog.objects.count())
+
+    def test_gzip_bomb_is_decoded_in_bounded_pieces(self):
+        body = io.BytesIO(gzip.compress(b'\n' * 50_000_000))
+
+        self.assertLessEqual(max(len(piece) for piece in iter_body(body, 'gzip')), READ_SIZE * 4)
+
+    @skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_bomb_is_decoded_in_bounded_pieces(self):
+        body = io.BytesIO(zstandard.ZstdCompressor(level=19).compress(b'\n' * 50_000_000))
+        self.assertLess(len(body.getvalue()), 10_000)
+
+        sizes = [len(piece) for piece in iter_body(body, 'zstd')]
+        self.assertLessEqual(max(sizes), READ_SIZE * 4)
+        self.assertEqual(sum(sizes), 50_000_000)
+
+    @skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_body(self):
+        body = io.BytesIO(zstandard.ZstdCompressor().compress(self.record('/a') + b'\n' + self.record('/b')))
+        summary = NDJSONIngestor().ingest(body, 'zstd')
+
+        self.assertEqual((summary['accepted'], summary['stream_error']), (2, None))
+
+    @skipIf(zstandard is None, "zstandard is not installed")
+    def test_corrupt_zstd_body(self):
+        summary = NDJSONIngestor().ingest(io.BytesIO(b'not zstd at all'), 'zstd')
+
+        self.assertTrue(summary['stream_error'].startswith('Corrupt compressed body'))
@@ -8,7 +8,15 @@ from .views import (
     FileAccessLogViewSet,
     USBDeviceLogViewSet,
     BulkMonitoringViewSet,
+    IngestSpoolStatusView,
+    IngestStreamView,
+    ScreenshotPipelineStatusView,
+    bulk_ingest_view,
     dashboard_view,
+    device_stats_view,
+    export_logs_view,
+    leaderboard_view,
+    live_events_view,
     logs_explorer_view
 )
 
@@ -23,6 +31,16 @@ router.register(r'bulk', BulkMonitoringViewSet, basename='bulk')
 urlpatterns = [
     path('', RedirectView.as_view(url='dashboard/', permanent=False)),  # Redirect root to dashboard
     path('dashboard/', dashboard_view, name='dashboard'),
+    path('api/ingest/stream', IngestStreamView.as_view(), name='ingest-stream'),
+    # Async views: native under ASGI (monitoring_host/asgi.py), adapted under WSGI
+    path('api/bulk/', bulk_ingest_view, name='bulk-ingest'),
+    path('api/device-stats/', device_stats_view, name='device-stats-list'),
+    path('api/device-stats/<str:device_identifier>/', device_stats_view, name='device-stats-detail'),
+    path('api/leaderboards/<str:kind>/', leaderboard_view, name='leaderboard'),
+    path('api/export/', export_logs_view, name='export-logs'),
+    path('api/live/', live_events_view, name='live-events'),
+    path('api/ingest-spool/', IngestSpoolStatusView.as_view(), name='ingest-spool'),
+    path('api/screenshot-pipeline/', ScreenshotPipelineStatusView.as_view(), name='screenshot-pipeline'),
     path('api/', include(router.urls)),
     path('logs/', logs_explorer_view, name='logs_explorer'),
 ] 
\ No newline at end of file
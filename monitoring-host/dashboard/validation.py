@@ -0,0 +1,313 @@
+import re
+from collections.abc import Mapping
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import fields as drf_fields
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import SkipField, empty, get_error_detail
+
+from .serializers import (
+    ActivityLogSerializer,
+    BulkActivityLogSerializer,
+    AppUsageLogSerializer,
+    WebsiteVisitLogSerializer,
+    FileAccessLogSerializer,
+    USBDeviceLogSerializer,
+    BulkMonitoringSerializer,
+)
+
+SURROGATES_RE = re.compile('[\ud800-\udfff]')
+
+
+class Slow(Exception):
+    """Raised by a coercer when the value needs the full DRF field to decide"""
+
+
+class FieldCoercer:
+    """
+    Fast path for one serializer field.
+
+    ``coerce`` returns the value DRF would produce for the common, valid
+    inputs and raises Slow for everything else (missing values, unusual
+    types, anything invalid), which is then handed to the DRF field itself.
+    Invalid input therefore always gets DRF's own error messages.
+    """
+    __slots__ = ('name', 'field', 'required', 'allow_null', 'validators')
+    # Validators whose check ``coerce`` performs itself
+    inlined = ()
+
+    def __init__(self, field):
+        self.name = field.field_name
+        self.field = field
+        self.required = field.required
+        self.allow_null = field.allow_null
+        self.validators = [v for v in field.validators if type(v).__name__ not in self.inlined]
+
+    def coerce(self, value):
+        raise Slow
+
+    def run_validators(self, value):
+        for validator in self.validators:
+            try:
+                validator(value)
+            except (DjangoValidationError, ValidationError):
+                raise Slow
+        return value
+
+    def check(self, value):
+        return self.run_validators(self.coerce(value))
+
+    def run(self, value):
+        if value is empty:
+            if self.required:
+                raise Slow
+            raise SkipField
+        if value is None:
+            if self.allow_null:
+                return None
+            raise Slow
+        return self.check(value)
+
+
+class CharCoercer(FieldCoercer):
+    __slots__ = ('allow_blank', 'trim_whitespace', 'max_length')
+    inlined = ('MaxLengthValidator', 'ProhibitNullCharactersValidator', 'ProhibitSurrogateCharactersValidator')
+
+    def __init__(self, field):
+        super().__init__(field)
+        self.allow_blank = field.allow_blank
+        self.trim_whitespace = field.trim_whitespace
+        self.max_length = field.max_length
+
+    def coerce(self, value):
+        if type(value) is not str:
+            raise Slow
+        if self.trim_whitespace:
+            value = value.strip()
+        if not value:
+            if self.allow_blank:
+                return ''
+            raise Slow
+        if (self.max_length is not None and len(value) > self.max_length) or '\x00' in value:
+            raise Slow
+        if not value.isascii() and SURROGATES_RE.search(value):
+            raise Slow
+        return value
+
+    def check(self, value):
+        value = self.coerce(value)
+        # DRF skips validators for blank strings as well
+        return self.run_validators(value) if value else value
+
+
+class IntegerCoercer(FieldCoercer):
+    __slots__ = ('min_value', 'max_value')
+    inlined = ('MinValueValidator', 'MaxValueValidator')
+
+    def __init__(self, field):
+        super().__init__(field)
+        self.min_value = field.min_value
+        self.max_value = field.max_value
+
+    def coerce(self, value):
+        if type(value) is not int:
+            raise Slow
+        if (self.min_value is not None and value < self.min_value) or (
+                self.max_value is not None and value > self.max_value):
+            raise Slow
+        return value
+
+
+class FloatCoercer(FieldCoercer):
+    __slots__ = ()
+
+    def coerce(self, value):
+        if type(value) is float:
+            return value
+        if type(value) is int:
+            return float(value)
+        raise Slow
+
+
+class BooleanCoercer(FieldCoercer):
+    __slots__ = ()
+
+    def coerce(self, value):
+        if value is True or value is False:
+            return value
+        raise Slow
+
+
+class ListCoercer(FieldCoercer):
+    __slots__ = ('child', 'allow_empty')
+
+    def __init__(self, field):
+        super().__init__(field)
+        self.child = compile_field(field.child)
+        self.allow_empty = field.allow_empty
+
+    def coerce(self, value):
+        if type(value) is not list or (not value and not self.allow_empty):
+            raise Slow
+        check_item = self.child.check
+        return [check_item(item) for item in value]
+
+
+class DelegateCoercer(FieldCoercer):
+    """Field types without a fast path go through DRF unchanged"""
+    __slots__ = ()
+
+    def run(self, value):
+        return self.field.run_validation(value)
+
+
+COERCERS = {
+    drf_fields.CharField: CharCoercer,
+    drf_fields.BooleanField: BooleanCoercer,
+    drf_fields.IntegerField: IntegerCoercer,
+    drf_fields.FloatField: FloatCoercer,
+    drf_fields.ListField: ListCoercer,
+}
+
+
+def compile_field(field):
+    """Coercer for ``field``, falling back to DRF for subclasses that change how values are parsed"""
+    for field_class, coercer_class in COERCERS.items():
+        if isinstance(field, field_class):
+            if (type(field).to_internal_value is field_class.to_internal_value
+                    and type(field).run_validation is field_class.run_validation):
+                return coercer_class(field)
+            break
+    return DelegateCoercer(field)
+
+
+class RecordValidator:
+    """
+    Precompiled validator equivalent to ``serializer_class().run_validation``.
+
+    Built once from the serializer's own fields, so it accepts exactly what
+    the serializer accepts and raises the same ValidationError detail,
+    without instantiating serializers or deep-copying fields per record.
+    ``validate_<field>`` hooks and the serializer's ``FIELD_ALIASES`` are
+    honoured; serializers with object-level validation are used as-is.
+    """
+    __slots__ = ('serializer', 'coercers', 'hooks', 'aliases', 'delegate')
+
+    def __init__(self, serializer_class):
+        self.serializer = serializer_class()
+        self.coercers = [compile_field(field) for field in self.serializer._writable_fields]
+        self.hooks = {
+            coercer.name: getattr(self.serializer, f'validate_{coercer.name}')
+            for coercer in self.coercers if hasattr(self.serializer, f'validate_{coercer.name}')
+        }
+        self.aliases = getattr(serializer_class, 'FIELD_ALIASES', {})
+        overridden = (
+            type(self.serializer).validate is not serializers.Serializer.validate
+            or (type(self.serializer).to_internal_value is not serializers.Serializer.to_internal_value
+                and not self.aliases)
+            or self.serializer.get_validators()
+        )
+        self.delegate = bool(overridden)
+
+    def validate(self, data):
+        if self.delegate:
+            return self.serializer.run_validation(data)
+        if not isinstance(data, Mapping):
+            return self.serializer.run_validation(data)
+        for alias, name in self.aliases.items():
+            if alias in data:
+                data = dict(data)
+                data[name] = data.pop(alias)
+
+        validated = {}
+        errors = {}
+        for coercer in self.coercers:
+            name = coercer.name
+            try:
+                try:
+                    value = coercer.run(data.get(name, empty))
+                except Slow:
+                    value = coercer.field.run_validation(data.get(name, empty))
+                hook = self.hooks.get(name)
+                if hook is not None:
+                    value = hook(value)
+            except SkipField:
+                continue
+            except ValidationError as exc:
+                errors[name] = exc.detail
+            except DjangoValidationError as exc:
+                errors[name] = get_error_detail(exc)
+            else:
+                validated[name] = value
+        if errors:
+            raise ValidationError(errors)
+        return validated
+
+
+# Bulk payload key -> serializer of one record of that type
+RECORD_SERIALIZERS = {
+    'app_usage': AppUsageLogSerializer,
+    'website_visits': WebsiteVisitLogSerializer,
+    'file_access': FileAccessLogSerializer,
+    'usb_devices': USBDeviceLogSerializer,
+    'activity_logs': ActivityLogSerializer,
+}
+
+# The bulk endpoint's activity records may also name the file part of their screenshot
+BULK_RECORD_SERIALIZERS = {**RECORD_SERIALIZERS, 'activity_logs': BulkActivityLogSerializer}
+
+
+class BulkPayloadValidator:
+    """
+    Fast equivalent of ``BulkMonitoringSerializer`` for the bulk endpoint.
+
+    Well-formed payloads are validated record by record with the compiled
+    validators. As soon as anything is invalid the payload is handed to
+    BulkMonitoringSerializer, so clients get exactly the errors they always did.
+    """
+
+    def __init__(self):
+        self.validators = {key: RecordValidator(serializer) for key, serializer in BULK_RECORD_SERIALIZERS.items()}
+
+    def validate(self, data):
+        try:
+            return self._validate(data)
+        except (Slow, ValidationError):
+            serializer = BulkMonitoringSerializer(data=data)
+            if serializer.is_valid():
+                return serializer.validated_data
+            raise ValidationError(serializer.errors)
+
+    def _validate(self, data):
+        if not isinstance(data, dict):
+            raise Slow
+        validated = {}
+        for key, validator in self.validators.items():
+            records = data.get(key, empty)
+            if records is empty:
+                continue
+            if type(records) is not list:
+                raise Slow
+            validated[key] = [validator.validate(record) for record in records]
+        for record in validated.get('activity_logs', []):
+            # Mirrors BulkMonitoringSerializer.validate_activity_logs: the upload is handled separately
+            record.pop('screenshot', None)
+        return validated
+
+
+_bulk_validator = None
+_record_validators = {}
+
+
+def get_bulk_validator():
+    global _bulk_validator
+    if _bulk_validator is None:
+        _bulk_validator = BulkPayloadValidator()
+    return _bulk_validator
+
+
+def get_record_validator(key):
+    if key not in _record_validators:
+        _record_validators[key] = RecordValidator(RECORD_SERIALIZERS[key])
+    return _record_validators[key]
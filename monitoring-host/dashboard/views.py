@@ -1,8 +1,15 @@
 from django.shortcuts import render
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, filters, permissions, status
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
 from .models import ActivityLog, AppUsageLog, WebsiteVisitLog, FileAccessLog, USBDeviceLog, BaseLog
 from .serializers import (
     ActivityLogSerializer,
@@ -12,6 +19,20 @@ from .serializers import (
     USBDeviceLogSerializer,
     BulkMonitoringSerializer
 )
+from .ingest import BulkIngestor
+from .stats import DeviceStats
+from .fragments import cached_section
+from .live import LiveEventStream
+from .export import FORMATS, ExportUnavailable, LogExporter, parse_bound
+from .rollups import aget_top_apps, aget_top_websites, hourly_histogram, get_top_apps, get_top_keywords, get_top_websites
+from .pagination import KeysetPaginator, InvalidCursor
+from .loaders import attach_log_details
+from .search import search_logs
+from .partitions import id_bounds, prune_by_time
+from .screenshots import get_screenshot_pipeline
+from .spool import get_ingest_spool, spool_status
+from .streaming import NDJSONIngestor, UnsupportedEncoding, get_decoder
+from .validation import get_bulk_validator
 import json
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
@@ -19,15 +40,23 @@ import logging
 import os
 from django.views.generic import ListView
 from django.db.models import Q, Max, Count, Subquery, OuterRef
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
 from datetime import datetime, timedelta
 from rest_framework.permissions import IsAuthenticated
 from django.conf import settings
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 
 logger = logging.getLogger(__name__)
 
+
+def agent_details(request):
+    """Address and agent version of an ingest request, as recorded on the Device registry"""
+    return {
+        'ip_address': request.META.get('REMOTE_ADDR') or None,
+        'agent_version': request.headers.get('X-Agent-Version', ''),
+    }
+
 # Create your views here.
 
 class ActivityLogViewSet(viewsets.ModelViewSet):
@@ -36,17 +65,17 @@ class ActivityLogViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.AllowAny]
 
 class AppUsageLogViewSet(viewsets.ModelViewSet):
-    queryset = AppUsageLog.objects.all()
+    queryset = AppUsageLog.objects.select_related('app_name', 'window_title')
     serializer_class = AppUsageLogSerializer
     permission_classes = [permissions.AllowAny]
 
 class WebsiteVisitLogViewSet(viewsets.ModelViewSet):
-    queryset = WebsiteVisitLog.objects.all()
+    queryset = WebsiteVisitLog.objects.select_related('url', 'title')
     serializer_class = WebsiteVisitLogSerializer
     permission_classes = [permissions.AllowAny]
 
 class FileAccessLogViewSet(viewsets.ModelViewSet):
-    queryset = FileAccessLog.objects.all()
+    queryset = FileAccessLog.objects.select_related('file_path', 'process_name')
     serializer_class = FileAccessLogSerializer
     permission_classes = [permissions.AllowAny]
 
@@ -55,80 +84,228 @@ class USBDeviceLogViewSet(viewsets.ModelViewSet):
     serializer_class = USBDeviceLogSerializer
     permission_classes = [permissions.AllowAny]
 
+async def device_stats_view(request, device_identifier=None):
+    """Counters of every device, or of one, from the Device registry on the async ORM (see DeviceStats)"""
+    if request.method != 'GET':
+        return JsonResponse({"error": f"Method {request.method} not allowed"}, status=405)
+    if device_identifier is None:
+        return JsonResponse(await DeviceStats().aall(), safe=False, encoder=JSONEncoder)
+    stats = await DeviceStats().afor_device(device_identifier)
+    if stats is None:
+        return JsonResponse({"error": "Unknown device"}, status=404)
+    return JsonResponse(stats, encoder=JSONEncoder)
+
+
 class BulkMonitoringViewSet(viewsets.ModelViewSet):
+    """The bulk API's activity logs; POSTs to its list URL are ingested by bulk_ingest_view"""
     queryset = ActivityLog.objects.all()
     serializer_class = BulkMonitoringSerializer
     permission_classes = [permissions.AllowAny]
 
-    def create(self, request, *args, **kwargs):
-        logger.info(f"Received bulk data: {request.data}")
-        logger.info(f"Received files: {request.FILES}")
-        
-        # Parse the JSON data from the request
-        try:
-            data = json.loads(request.data.get('data', '{}'))
-            logger.info(f"Parsed JSON data: {data}")
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing JSON data: {e}")
-            return Response({"error": "Invalid JSON data"}, status=400)
-
-        # Create serializer with parsed data
-        serializer = self.get_serializer(data=data)
-        if not serializer.is_valid():
-            logger.error(f"Serializer errors: {serializer.errors}")
-            return Response(serializer.errors, status=400)
-
-        logger.info(f"Validated data: {serializer.validated_data}")
-        
-        # Process each type of log
+
+bulk_list_view = BulkMonitoringViewSet.as_view({'get': 'list'})
+
+
+@csrf_exempt
+async def bulk_ingest_view(request):
+    """
+    Ingest an agent's bulk payload: a multipart ``data`` field holding the
+    JSON payload, and a file part per screenshot named by the
+    ``screenshot_part`` of the activity records it belongs to.
+
+    Native async under ASGI. Parsing the form, spooling the screenshots and
+    appending to the ingest spool are blocking file I/O and run in the
+    thread pool; ingesting straight into the database runs on the request's
+    database thread. A slow upload or database therefore holds no worker
+    that other agents need. Other methods list activity logs like the rest
+    of the bulk API.
+    """
+    if request.method != 'POST':
+        return await sync_to_async(bulk_list_view)(request)
+
+    pipeline = get_screenshot_pipeline()
+    try:
+        raw_data, files = await sync_to_async(read_bulk_request, thread_sensitive=False)(request, pipeline)
+        data = json.loads(raw_data)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        logger.error("Error parsing JSON data: %s", e)
+        return JsonResponse({"error": "Invalid JSON data"}, status=400)
+
+    # Same rules and error messages as BulkMonitoringSerializer, without its per-record overhead
+    try:
+        validated_data = get_bulk_validator().validate(data)
+    except ValidationError as e:
+        logger.error("Bulk payload errors: %s", e.detail)
+        return JsonResponse(e.detail, status=400, safe=False)
+
+    spooled = settings.INGEST_SPOOL_ENABLED
+    screenshots = []
+    try:
+        # Spool each screenshot to local disk; background workers push it to the
+        # media storage and attach it to the activity logs naming its part
+        screenshots = await sync_to_async(pipeline.spool_parts, thread_sensitive=False)(
+            validated_data.get('activity_logs') or [], files, spooled,
+        )
+
+        if spooled:
+            # Accepted once on local disk; drain_ingest_spool writes it to the database
+            await sync_to_async(get_ingest_spool().append, thread_sensitive=False)({
+                'received_at': timezone.now(),
+                **agent_details(request),
+                'data': validated_data,
+                'screenshots': screenshots,
+            })
+            return HttpResponse(status=202)
+
+        await sync_to_async(ingest_bulk)(validated_data, agent_details(request), screenshots)
+        return HttpResponse(status=201)
+    except Exception as e:
+        for screenshot in screenshots:
+            await sync_to_async(pipeline.discard, thread_sensitive=False)(screenshot['job_id'])
+        logger.error(f"Error creating logs: {e}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+def read_bulk_request(request, pipeline):
+    """
+    The ``data`` JSON text and the uploaded files of a bulk request.
+
+    File parts of all but small requests are streamed into the screenshot
+    spool as they arrive (see ScreenshotPipeline.upload_handlers), so a
+    batch of screenshots is never held in memory.
+    """
+    if request.content_type == 'application/json':
+        body = json.loads(request.body or b'{}')
+        return (body.get('data', '{}') if isinstance(body, dict) else '{}'), MultiValueDict()
+    request.upload_handlers = pipeline.upload_handlers(request)
+    # Payloads are logged lazily: formatting them on every request cost more than validating them
+    logger.debug("Received bulk data with files %s", list(request.FILES))
+    return request.POST.get('data', '{}'), request.FILES
+
+
+def ingest_bulk(validated_data, agent, screenshots=()):
+    """Write a validated bulk payload, then hand the screenshots of ``spool_parts`` to the upload pipeline"""
+    with transaction.atomic():
+        logs = BulkIngestor(**agent).ingest(validated_data)
+        get_screenshot_pipeline().submit_parts(screenshots, logs['activity_logs'])
+
+
+class IngestStreamView(APIView):
+    """
+    Newline-delimited JSON ingestion, optionally gzip/deflate/zstd compressed.
+
+    The body is parsed while it is read and written in chunks, so an agent can
+    upload hours of offline backlog in one request without the server holding
+    it in memory. See NDJSONIngestor for the record format.
+    """
+    permission_classes = [permissions.AllowAny]
+    parser_classes = []
+    chunk_size = 500
+
+    def post(self, request):
+        content_encoding = request.META.get('HTTP_CONTENT_ENCODING', '')
         try:
-            # Process app usage logs
-            if 'app_usage' in serializer.validated_data:
-                for log_data in serializer.validated_data['app_usage']:
-                    logger.info(f"Creating app usage log: {log_data}")
-                    AppUsageLog.objects.create(**log_data)
-
-            # Process website visit logs
-            if 'website_visits' in serializer.validated_data:
-                for log_data in serializer.validated_data['website_visits']:
-                    logger.info(f"Creating website visit log: {log_data}")
-                    WebsiteVisitLog.objects.create(**log_data)
-
-            # Process file access logs
-            if 'file_access' in serializer.validated_data:
-                for log_data in serializer.validated_data['file_access']:
-                    logger.info(f"Creating file access log: {log_data}")
-                    FileAccessLog.objects.create(**log_data)
-
-            # Process USB device logs
-            if 'usb_devices' in serializer.validated_data:
-                for log_data in serializer.validated_data['usb_devices']:
-                    logger.info(f"Creating USB device log: {log_data}")
-                    USBDeviceLog.objects.create(**log_data)
-
-            # Process activity logs
-            if 'activity_logs' in serializer.validated_data:
-                for log_data in serializer.validated_data['activity_logs']:
-                    logger.info(f"Creating activity log: {log_data}")
-                    # Handle screenshot file if present
-                    if 'screenshot' in request.FILES:
-                        # Save the file to MEDIA_ROOT/screenshots
-                        file_content = request.FILES['screenshot']
-                        filename = file_content.name
-                        save_path = os.path.join('screenshots', filename)
-                        path = default_storage.save(save_path, file_content)
-                        log_data['screenshot'] = path
-                        logger.info(f"Saved screenshot to {path}")
-                    else:
-                        logger.warning("No screenshot file found in request.FILES")
-                        log_data['screenshot'] = ''  # Clear the path if file wasn't uploaded
-                    
-                    ActivityLog.objects.create(**log_data)
-
-            return Response(status=201)
-        except Exception as e:
-            logger.error(f"Error creating logs: {e}")
-            return Response({"error": str(e)}, status=500)
+            get_decoder(content_encoding)
+        except UnsupportedEncoding as e:
+            return Response({"error": str(e)}, status=415)
+
+        stream = request.stream
+        if stream is None:
+            return Response({"error": "Empty request body"}, status=400)
+
+        summary = NDJSONIngestor(chunk_size=self.chunk_size, **agent_details(request)).ingest(stream, content_encoding)
+        return Response(summary, status=400 if summary['stream_error'] else 201)
+
+
+# Leaderboard name -> async ranking function, served by leaderboard_view
+LEADERBOARDS = {
+    'apps': aget_top_apps,
+    'websites': aget_top_websites,
+}
+
+
+async def leaderboard_view(request, kind):
+    """
+    Top applications or websites, served from the daily rollups on the async ORM.
+
+    Optional ``since`` and ``until`` (YYYY-MM-DD, inclusive), repeated
+    ``device`` parameters and ``limit`` (default 10, at most 100).
+    """
+    if kind not in LEADERBOARDS:
+        return JsonResponse({"error": "Unknown leaderboard"}, status=404)
+    try:
+        since = datetime.strptime(request.GET['since'], '%Y-%m-%d').date() if request.GET.get('since') else None
+        until = datetime.strptime(request.GET['until'], '%Y-%m-%d').date() if request.GET.get('until') else None
+        limit = min(int(request.GET.get('limit', 10)), 100)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    devices = request.GET.getlist('device') or None
+    ranking = await LEADERBOARDS[kind](limit=limit, since=since, until=until, device_identifiers=devices)
+    return JsonResponse(ranking, safe=False, encoder=JSONEncoder)
+
+
+def export_logs_view(request):
+    """
+    Stream logs as Parquet (default) or Arrow IPC; see LogExporter.
+
+    Query parameters: ``format``, ``since`` and ``until`` (dates or ISO
+    datetimes), repeated ``device`` and ``log_type``.
+    """
+    fmt = request.GET.get('format', 'parquet')
+    if fmt not in FORMATS:
+        return JsonResponse({"error": f"Unknown format: {fmt}"}, status=400)
+    try:
+        exporter = LogExporter(
+            since=parse_bound(request.GET.get('since')),
+            until=parse_bound(request.GET.get('until'), end=True),
+            device_identifiers=request.GET.getlist('device') or None,
+            log_types=request.GET.getlist('log_type') or None,
+        )
+    except ExportUnavailable as e:
+        return JsonResponse({"error": str(e)}, status=501)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    content_type, extension = FORMATS[fmt]
+    response = StreamingHttpResponse(exporter.stream(fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="logs.{extension}"'
+    return response
+
+
+class IngestSpoolStatusView(APIView):
+    """Payloads of this host's ingest spool not loaded into the database yet, and how long the oldest has waited"""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        return Response(spool_status(get_ingest_spool()))
+
+
+class ScreenshotPipelineStatusView(APIView):
+    """Queue depth, spool backlog and upload counters of the screenshot pipeline in this process"""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        return Response(get_screenshot_pipeline().status())
+
+def live_events_view(request):
+    """
+    Server-Sent Events of the live dashboard updates (see LiveEventStream).
+
+    Streamed only under ASGI, where an open dashboard holds no worker. Under
+    WSGI each request answers a single poll, so open dashboards cannot tie
+    up the workers that serve ingest and pages; route /api/live/ to the ASGI
+    server to stream. ``Last-Event-ID`` resumes where the browser stopped.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    stream = LiveEventStream(last_id=int(last_event_id) if last_event_id.isdigit() else None)
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(stream.__aiter__(), content_type='text/event-stream')
+    else:
+        response = HttpResponse(stream.once(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 class LogsExplorerView(ListView):
     template_name = 'dashboard/logs_explorer.html'
@@ -160,31 +337,19 @@ class LogsExplorerView(ListView):
         website_logs = WebsiteVisitLog.objects.filter(timestamp__range=(date_from, date_to))
         file_logs = FileAccessLog.objects.filter(timestamp__range=(date_from, date_to))
         usb_logs = USBDeviceLog.objects.filter(timestamp__range=(date_from, date_to))
+
+        # On partitioned storage, also bound the child tables by the id range of the window
+        activity_logs, app_usage_logs, website_logs, file_logs, usb_logs = prune_by_time(
+            [activity_logs, app_usage_logs, website_logs, file_logs, usb_logs], date_from, date_to,
+        )
         
-        # Apply keyword filter if provided
+        # Apply keyword filter if provided, through the full-text search index
         if keyword:
-            activity_logs = activity_logs.filter(
-                Q(window_title__icontains=keyword) |
-                Q(keywords__icontains=keyword) |
-                Q(analysis__icontains=keyword)
-            )
-            app_usage_logs = app_usage_logs.filter(
-                Q(app_name__icontains=keyword) |
-                Q(window_title__icontains=keyword)
-            )
-            website_logs = website_logs.filter(
-                Q(url__icontains=keyword) |
-                Q(title__icontains=keyword)
-            )
-            file_logs = file_logs.filter(
-                Q(file_path__icontains=keyword) |
-                Q(operation__icontains=keyword)
-            )
-            usb_logs = usb_logs.filter(
-                Q(device_name__icontains=keyword) |
-                Q(vendor_id__icontains=keyword) |
-                Q(product_id__icontains=keyword)
-            )
+            activity_logs = search_logs(activity_logs, keyword, since=date_from, until=date_to)
+            app_usage_logs = search_logs(app_usage_logs, keyword, since=date_from, until=date_to)
+            website_logs = search_logs(website_logs, keyword, since=date_from, until=date_to)
+            file_logs = search_logs(file_logs, keyword, since=date_from, until=date_to)
+            usb_logs = search_logs(usb_logs, keyword, since=date_from, until=date_to)
         
         # Apply additional filters
         if flagged_only:
@@ -244,184 +409,139 @@ class LogsExplorerView(ListView):
         
         return context
 
-def dashboard_view(request):
-    # Get total counts for each log type
-    total_activity_logs = ActivityLog.objects.count()
-    total_app_usage = AppUsageLog.objects.count()
-    total_website_visits = WebsiteVisitLog.objects.count()
-    total_file_access = FileAccessLog.objects.count()
-    total_usb_events = USBDeviceLog.objects.count()
-
-    # Get unique devices using subquery for the latest timestamp
-    latest_activities = BaseLog.objects.values('device_identifier').annotate(
-        last_seen=Max('timestamp')
-    )
-    
-    total_devices = latest_activities.count()
-    
-    # Get activity statistics per unique device
-    device_stats = []
-    for activity in latest_activities:
-        device_id = activity['device_identifier']
-        
-        # Get all counts in a single query
-        stats = {
-            'device_identifier': device_id,
-            'last_seen': activity['last_seen'],
-            'activity_count': ActivityLog.objects.filter(device_identifier=device_id).count(),
-            'flagged_count': ActivityLog.objects.filter(device_identifier=device_id, is_flagged=True).count(),
-            'app_usage_count': AppUsageLog.objects.filter(device_identifier=device_id).count(),
-            'website_visits': WebsiteVisitLog.objects.filter(device_identifier=device_id).count(),
-            'file_operations': FileAccessLog.objects.filter(device_identifier=device_id).count(),
-            'usb_events': USBDeviceLog.objects.filter(device_identifier=device_id).count(),
-        }
-        
-        # Calculate total activities
-        stats['total_activities'] = (
-            stats['activity_count'] +
-            stats['app_usage_count'] +
-            stats['website_visits'] +
-            stats['file_operations'] +
-            stats['usb_events']
-        )
-        
-        device_stats.append(stats)
-    
-    # Sort device stats by total activities and last seen
-    device_stats.sort(key=lambda x: (-x['total_activities'], -x['last_seen'].timestamp()))
+# Dashboard sections, each cached until ingest writes one of the log types it reads
+
+@cached_section()
+def dashboard_totals():
+    # Total counts for each log type from the device registry counters
+    return DeviceStats().totals()
+
+@cached_section()
+def dashboard_device_stats():
+    # Activity statistics per device, one registry row each
+    return DeviceStats().all()
 
-    # Get recent flagged activities
-    recent_flagged = ActivityLog.objects.filter(
+@cached_section(log_types=['activity'])
+def dashboard_recent_flagged():
+    return list(ActivityLog.objects.filter(
         is_flagged=True
-    ).order_by('-timestamp')[:10]
-
-    # Get top keywords across all devices
-    keyword_stats = {}
-    for log in ActivityLog.objects.exclude(keywords__isnull=True):
-        if log.keywords:
-            for keyword in log.keywords:
-                if keyword in keyword_stats:
-                    keyword_stats[keyword] += 1
-                else:
-                    keyword_stats[keyword] = 1
-    
-    top_keywords = sorted(
-        [{'keyword': k, 'count': v} for k, v in keyword_stats.items()],
-        key=lambda x: x['count'],
-        reverse=True
-    )[:10]
+    ).order_by('-timestamp')[:10])
+
+@cached_section(log_types=['activity'])
+def dashboard_top_keywords():
+    # Top keywords across all devices from the keyword counters
+    return get_top_keywords(limit=10)
 
-    # Get recent screenshots with context
+@cached_section(log_types=['activity'])
+def dashboard_recent_screenshots():
     recent_screenshots = ActivityLog.objects.filter(
         screenshot__isnull=False,
         is_flagged=True
     ).exclude(
         screenshot=''
     ).order_by('-timestamp')[:6]
+    return [
+        {
+            'timestamp': log.timestamp,
+            'window_title': log.window_title,
+            'url': log.screenshot.url if log.screenshot else None,
+            # Pre-rendered JPEGs; screenshots stored before they existed fall back to the original
+            'thumbnail_url': log.thumbnail.url if log.thumbnail else (log.screenshot.url if log.screenshot else None),
+            'preview_url': log.preview.url if log.preview else (log.screenshot.url if log.screenshot else None),
+            'is_flagged': log.is_flagged,
+            'confidence': log.confidence,
+            'analysis': log.analysis,
+            'keywords': log.keywords,
+            'device_identifier': log.device_identifier,
+        } for log in recent_screenshots
+    ]
 
-    # Get active hours distribution (last 24 hours)
+@cached_section()
+def dashboard_hourly_activity():
+    # Active hours distribution (last 24 hours) from the hourly rollups
     now = timezone.now()
-    last_24h = now - timedelta(hours=24)
-    
-    # Create a list of all hours
-    hourly_activity = []
-    for hour in range(24):
-        hour_start = last_24h.replace(hour=hour, minute=0, second=0, microsecond=0)
-        hour_end = hour_start + timedelta(hours=1)
-        count = BaseLog.objects.filter(
-            timestamp__gte=hour_start,
-            timestamp__lt=hour_end
-        ).count()
-        hourly_activity.append({'hour': hour, 'count': count})
-
-    # Get file operations summary
-    file_operations = FileAccessLog.objects.values('operation').annotate(
+    return [
+        {'hour': bucket['hour'].hour, 'count': bucket['count']}
+        for bucket in hourly_histogram(now - timedelta(hours=23), now)
+    ]
+
+@cached_section(log_types=['file_access'])
+def dashboard_file_operations():
+    return list(FileAccessLog.objects.values('operation').annotate(
         count=models.Count('id')
-    ).order_by('-count')
+    ).order_by('-count'))
 
-    # Get USB device summary
-    usb_summary = USBDeviceLog.objects.values('action').annotate(
+@cached_section(log_types=['usb_device'])
+def dashboard_usb_summary():
+    return list(USBDeviceLog.objects.values('action').annotate(
         count=models.Count('id')
-    ).order_by('-count')
-
-    # Get top accessed websites
-    top_websites = WebsiteVisitLog.objects.values('url', 'title').annotate(
-        visit_count=models.Count('id'),
-        total_duration=models.Sum('duration')
-    ).order_by('-visit_count')[:5]
-
-    # Get top used applications
-    top_apps = AppUsageLog.objects.values('app_name').annotate(
-        usage_count=models.Count('id'),
-        total_duration=models.Sum('duration'),
-        active_time=models.Sum(models.Case(
-            models.When(is_active=True, then=models.F('duration')),
-            default=0,
-            output_field=models.IntegerField(),
-        ))
-    ).order_by('-total_duration')[:5]
+    ).order_by('-count'))
+
+@cached_section(log_types=['website_visit'])
+def dashboard_top_websites():
+    # Most visited websites from the daily website rollups
+    top_websites = get_top_websites(limit=5)
+    return [
+        {
+            'url': site['url'],
+            'title': site['title'],
+            'visit_count': site['visit_count'],
+            'total_duration': timedelta(seconds=site['total_duration'])
+        } for site in top_websites
+    ]
+
+@cached_section(log_types=['app_usage'])
+def dashboard_top_apps():
+    # Most used applications from the daily app usage rollups
+    top_apps = get_top_apps(limit=5)
+    return [
+        {
+            'name': app['app_name'],
+            'usage_count': app['usage_count'],
+            'total_duration': timedelta(seconds=app['total_duration']),
+            'active_time': timedelta(seconds=app['active_time']),
+            'idle_time': timedelta(seconds=app['total_duration'] - app['active_time'])
+        } for app in top_apps
+    ]
+
+def dashboard_view(request):
+    totals = dashboard_totals()
 
     context = {
         # Overview statistics
-        'total_activity_logs': total_activity_logs,
-        'total_app_usage': total_app_usage,
-        'total_website_visits': total_website_visits,
-        'total_file_access': total_file_access,
-        'total_usb_events': total_usb_events,
-        'total_devices': total_devices,
+        'total_activity_logs': totals['activity_count'],
+        'total_app_usage': totals['app_usage_count'],
+        'total_website_visits': totals['website_visits'],
+        'total_file_access': totals['file_operations'],
+        'total_usb_events': totals['usb_events'],
+        'total_devices': totals['devices'],
         
         # Device-specific statistics (now properly aggregated)
-        'device_stats': device_stats,
+        'device_stats': dashboard_device_stats(),
         
         # Recent flagged activities
-        'recent_flagged': recent_flagged,
+        'recent_flagged': dashboard_recent_flagged(),
         
         # Keyword analysis
-        'top_keywords': top_keywords,
+        'top_keywords': dashboard_top_keywords(),
         
         # Screenshots with context
-        'recent_screenshots': [
-            {
-                'timestamp': log.timestamp,
-                'window_title': log.window_title,
-                'url': log.screenshot.url if log.screenshot else None,
-                'is_flagged': log.is_flagged,
-                'confidence': log.confidence,
-                'analysis': log.analysis,
-                'keywords': log.keywords,
-                'device_identifier': log.device_identifier,
-            } for log in recent_screenshots
-        ],
+        'recent_screenshots': dashboard_recent_screenshots(),
         
         # Activity distribution
-        'hourly_activity': hourly_activity,
+        'hourly_activity': dashboard_hourly_activity(),
         
         # File operations summary
-        'file_operations': file_operations,
+        'file_operations': dashboard_file_operations(),
         
         # USB activity summary
-        'usb_summary': usb_summary,
+        'usb_summary': dashboard_usb_summary(),
         
         # Top websites
-        'top_websites': [
-            {
-                'url': site['url'],
-                'title': site['title'],
-                'visit_count': site['visit_count'],
-                'total_duration': timedelta(seconds=site['total_duration'])
-            } for site in top_websites
-        ],
+        'top_websites': dashboard_top_websites(),
         
         # Top applications
-        'top_apps': [
-            {
-                'name': app['app_name'],
-                'usage_count': app['usage_count'],
-                'total_duration': timedelta(seconds=app['total_duration']),
-                'active_time': timedelta(seconds=app['active_time']),
-                'idle_time': timedelta(seconds=app['total_duration'] - app['active_time'])
-            } for app in top_apps
-        ],
+        'top_apps': dashboard_top_apps(),
     }
     
     return render(request, 'dashboard/dashboard.html', context)
@@ -436,136 +556,91 @@ def logs_explorer_view(request):
     has_screenshot = request.GET.get('has_screenshot', '') == 'true'
     sort_by = request.GET.get('sort', '-timestamp')
     order = request.GET.get('order', 'desc')
-    page = request.GET.get('page', 1)
+    cursor = request.GET.get('cursor', '')
     per_page = 50
 
-    # Base queryset with select_related for better performance
-    queryset = BaseLog.objects.select_related(
-        'activitylog',
-        'appusagelog',
-        'websitevisitlog',
-        'fileaccesslog',
-        'usbdevicelog'
-    )
+    # Base queryset; the type-specific details are loaded per page below
+    queryset = BaseLog.objects.all()
 
     # Apply date filters if provided
+    since = until = None
     if date_from:
         try:
             date_from = datetime.strptime(date_from, '%Y-%m-%d')
-            queryset = queryset.filter(timestamp__date__gte=date_from)
+            # Compare against the raw column so the timestamp indexes stay usable
+            since = timezone.make_aware(date_from)
+            queryset = queryset.filter(timestamp__gte=since)
         except ValueError:
             pass
     
     if date_to:
         try:
             date_to = datetime.strptime(date_to, '%Y-%m-%d')
-            queryset = queryset.filter(timestamp__date__lte=date_to)
+            until = timezone.make_aware(date_to + timedelta(days=1))
+            queryset = queryset.filter(timestamp__lt=until)
         except ValueError:
             pass
 
+    # On partitioned storage the time filter prunes BaseLog; the id range of the window
+    # prunes the activity log partitions the filters below join
+    activity_bounds = id_bounds(since, until, field='activitylog__pk')
+    if activity_bounds is None:
+        queryset = queryset.none()
+        activity_bounds = {}
+
     # Apply log type filter
     if log_type:
         queryset = queryset.filter(log_type=log_type)
 
-    # Apply keyword filter
+    # Apply keyword filter through the full-text search index
     if keyword:
-        queryset = queryset.filter(
-            Q(description__icontains=keyword) |
-            Q(device_identifier__icontains=keyword)
-        )
+        queryset = search_logs(queryset, keyword, since=since, until=until)
 
     # Apply flagged filter (only for activity logs)
     if flagged_only:
         queryset = queryset.filter(
-            Q(log_type='activity', activitylog__is_flagged=True)
+            Q(log_type='activity', activitylog__is_flagged=True, **activity_bounds)
         )
 
     # Apply screenshot filter (only for activity logs)
     if has_screenshot:
         queryset = queryset.filter(
-            Q(log_type='activity', activitylog__screenshot__isnull=False)
+            Q(log_type='activity', activitylog__screenshot__isnull=False, **activity_bounds)
         ).exclude(
             Q(log_type='activity', activitylog__screenshot='')
         )
 
-    # Apply sorting
-    if sort_by.lstrip('-') in ['timestamp', 'device_identifier']:
+    # Apply sorting, with the id as tie-breaker so the keyset is unique
+    ordering = ('-timestamp', '-id')
+    if sort_by == 'relevance' and keyword:
+        ordering = ('-search_rank', '-id')
+    elif sort_by.lstrip('-') in ['timestamp', 'device_identifier']:
         if order == 'asc' and sort_by.startswith('-'):
             sort_by = sort_by.lstrip('-')
         elif order == 'desc' and not sort_by.startswith('-'):
             sort_by = f'-{sort_by}'
-        queryset = queryset.order_by(sort_by)
+        ordering = (sort_by, '-id' if sort_by.startswith('-') else 'id')
 
-    # Pagination
-    paginator = Paginator(queryset, per_page)
+    # Keyset pagination: every page is an index range scan, no COUNT(*) or OFFSET
+    paginator = KeysetPaginator(queryset, ordering=ordering, per_page=per_page)
     try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
-
-    # Get log details for the current page only
-    log_details = []
-    for log in page_obj:
-        detail = {
+        page_obj = paginator.page(cursor)
+    except InvalidCursor:
+        page_obj = paginator.page()
+
+    # Get log details for the current page only, one query per log type on the page
+    attach_log_details(page_obj.object_list)
+    log_details = [
+        {
             'id': log.id,
             'timestamp': log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
             'device_identifier': log.device_identifier,
             'log_type': log.log_type,
             'description': log.description,
-            'details': None
+            'details': log.details,
         }
-
-        # Get specific log details based on type
-        try:
-            if log.log_type == 'activity':
-                activity = log.activitylog
-                detail['details'] = {
-                    'window_title': activity.window_title,
-                    'is_flagged': activity.is_flagged,
-                    'has_screenshot': bool(activity.screenshot),
-                    'screenshot_url': activity.screenshot.url if activity.screenshot else None,
-                    'analysis': activity.analysis,
-                    'keywords': activity.keywords or []
-                }
-            elif log.log_type == 'app_usage':
-                app = log.appusagelog
-                detail['details'] = {
-                    'app_name': app.app_name,
-                    'window_title': app.window_title,
-                    'duration': app.duration,
-                    'is_active': app.is_active
-                }
-            elif log.log_type == 'website_visit':
-                website = log.websitevisitlog
-                detail['details'] = {
-                    'url': website.url,
-                    'title': website.title,
-                    'duration': website.duration
-                }
-            elif log.log_type == 'file_access':
-                file = log.fileaccesslog
-                detail['details'] = {
-                    'file_path': file.file_path,
-                    'operation': file.operation,
-                    'process_name': file.process_name
-                }
-            elif log.log_type == 'usb_device':
-                usb = log.usbdevicelog
-                detail['details'] = {
-                    'device_name': usb.device_name,
-                    'vendor_id': usb.vendor_id,
-                    'product_id': usb.product_id,
-                    'serial_number': usb.serial_number,
-                    'action': usb.action
-                }
-        except (ActivityLog.DoesNotExist, AppUsageLog.DoesNotExist,
-                WebsiteVisitLog.DoesNotExist, FileAccessLog.DoesNotExist,
-                USBDeviceLog.DoesNotExist):
-            pass
-
-        log_details.append(detail)
+        for log in page_obj
+    ]
 
     context = {
         'logs': json.dumps(log_details, default=str),  # Serialize to JSON for JavaScript
@@ -2,6 +2,11 @@
 ASGI config for monitoring_host project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Under ASGI the live dashboard stream (/api/live/) is served by an async
+iterator, so open EventSource connections do not each hold a worker thread,
+and bulk ingest (/api/bulk/), device stats and leaderboards are native async
+views: a request waiting on the database or on disk holds no worker either.
+supervisord runs it with uvicorn on port 8002, next to uWSGI on 8001.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -174,6 +174,104 @@ else:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.getenv('DJANGO_MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
 
+# Screenshot upload pipeline: uploads are spooled to local disk and pushed to
+# the media storage by background threads, so requests never wait on S3
+SCREENSHOT_SPOOL_DIR = os.getenv('DJANGO_SCREENSHOT_SPOOL_DIR', os.path.join(BASE_DIR, 'spool', 'screenshots'))
+SCREENSHOT_UPLOAD_WORKERS = int(os.getenv('SCREENSHOT_UPLOAD_WORKERS', '2'))  # 0 uploads inline after commit
+SCREENSHOT_UPLOAD_QUEUE_SIZE = int(os.getenv('SCREENSHOT_UPLOAD_QUEUE_SIZE', '100'))
+SCREENSHOT_UPLOAD_MAX_ATTEMPTS = int(os.getenv('SCREENSHOT_UPLOAD_MAX_ATTEMPTS', '5'))
+SCREENSHOT_UPLOAD_RETRY_BACKOFF = float(os.getenv('SCREENSHOT_UPLOAD_RETRY_BACKOFF', '2.0'))  # seconds, doubled per attempt
+# Seconds between the workers' scans of the spool for jobs a full queue or a restart left behind
+SCREENSHOT_UPLOAD_RESCAN_INTERVAL = float(os.getenv('SCREENSHOT_UPLOAD_RESCAN_INTERVAL', '60'))
+# A screenshot reuses the device's previous image when their perceptual hashes differ
+# in at most DISTANCE bits (of 256) and at most MAX_CHANGE of the low-resolution
+# pixels changed; -1 only deduplicates byte-identical images
+SCREENSHOT_NEAR_DUPLICATE_DISTANCE = int(os.getenv('SCREENSHOT_NEAR_DUPLICATE_DISTANCE', '8'))
+SCREENSHOT_NEAR_DUPLICATE_MAX_CHANGE = float(os.getenv('SCREENSHOT_NEAR_DUPLICATE_MAX_CHANGE', '0.0001'))
+
+# Write-ahead spool of the bulk endpoint: when enabled, accepted payloads are
+# fsync'd to segment files on local disk and answered 202, and
+# `manage.py drain_ingest_spool` loads them into the database in large batches.
+# Accepted payloads not yet loaded exist only in INGEST_SPOOL_DIR: enable it only
+# with that directory on a persistent volume, never a container's own filesystem
+INGEST_SPOOL_ENABLED = os.getenv('INGEST_SPOOL_ENABLED', 'False').lower() == 'true'
+INGEST_SPOOL_DIR = os.getenv('DJANGO_INGEST_SPOOL_DIR', os.path.join(BASE_DIR, 'spool', 'ingest'))
+INGEST_SPOOL_SEGMENT_BYTES = int(os.getenv('INGEST_SPOOL_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+INGEST_SPOOL_SEGMENT_SECONDS = int(os.getenv('INGEST_SPOOL_SEGMENT_SECONDS', '60'))  # before a writer starts a new one
+INGEST_SPOOL_BATCH_RECORDS = int(os.getenv('INGEST_SPOOL_BATCH_RECORDS', '500'))  # payloads per load transaction
+
+# Log table partitioning (PostgreSQL only): BaseLog is split into day or week
+# partitions, its child tables into blocks of ids; `manage.py manage_partitions`
+# creates upcoming partitions and drops the ones older than the retention
+LOG_PARTITION_INTERVAL = os.getenv('LOG_PARTITION_INTERVAL', 'day')  # 'day' or 'week'
+LOG_PARTITION_PREMAKE = int(os.getenv('LOG_PARTITION_PREMAKE', '7'))  # future periods kept ready
+LOG_PARTITION_ID_BLOCK = int(os.getenv('LOG_PARTITION_ID_BLOCK', '1000000'))  # ids per child table partition
+LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', '0'))  # 0 keeps logs forever
+
+# Retention per log type (`manage.py apply_retention`): raw logs older than their
+# number of days are deleted in small batches while the hourly and daily rollups,
+# keyword counters and device counters keep their history; 0 keeps a type forever.
+# LOG_RETENTION_DAYS above still drops whole partitions of every type on PostgreSQL
+LOG_RETENTION_POLICIES = {
+    'activity': int(os.getenv('ACTIVITY_LOG_RETENTION_DAYS', '0')),
+    'app_usage': int(os.getenv('APP_USAGE_LOG_RETENTION_DAYS', '0')),
+    'website_visit': int(os.getenv('WEBSITE_VISIT_LOG_RETENTION_DAYS', '0')),
+    'file_access': int(os.getenv('FILE_ACCESS_LOG_RETENTION_DAYS', '0')),
+    'usb_device': int(os.getenv('USB_DEVICE_LOG_RETENTION_DAYS', '0')),
+}
+SCREENSHOT_RETENTION_DAYS = int(os.getenv('SCREENSHOT_RETENTION_DAYS', '0'))  # unflagged activity only, 0 keeps them
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '1000'))  # rows per delete transaction
+RETENTION_BATCH_PAUSE = float(os.getenv('RETENTION_BATCH_PAUSE', '0.1'))  # seconds between batches
+
+# Consecutive app usage samples with the same app, window and activity (website
+# visits with the same URL) from a device are merged into one span row at ingest;
+# a span closes once the device has sent nothing for it in QUIET_SECONDS, 0 stores every sample
+LOG_SPAN_QUIET_SECONDS = int(os.getenv('LOG_SPAN_QUIET_SECONDS', '300'))
+
+# Interned log strings (app names, window titles, URLs, page titles, file paths,
+# process names) whose ids each worker keeps in its LRU cache; 0 disables it
+DIMENSION_CACHE_SIZE = int(os.getenv('DIMENSION_CACHE_SIZE', '50000'))
+
+# Caches: shared by all the processes of a host (uWSGI, uvicorn, the ingest
+# loader, retention), or the dashboard invalidations of one never reach the
+# others. REDIS_URL selects Redis (needs the 'redis' package), DJANGO_CACHE_DIR
+# a file-based cache; by default the DJANGO_CACHE_TABLE table of the database
+# is used, created by `manage.py migrate` (or createcachetable)
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        },
+    }
+elif os.getenv('DJANGO_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('DJANGO_CACHE_DIR'),
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': os.getenv('DJANGO_CACHE_TABLE', 'dashboard_cache'),
+        },
+    }
+
+# Dashboard sections are cached until ingest writes a log type they read, or
+# for at most DASHBOARD_CACHE_TTL seconds; 0 disables the cache
+DASHBOARD_CACHE_ALIAS = os.getenv('DASHBOARD_CACHE_ALIAS', 'default')
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '30'))
+DASHBOARD_CACHE_TTLS = {}  # per-section overrides by name, e.g. {'hourly_activity': 60}
+
+# Live dashboard updates: ingest records events that /api/live/ streams as
+# Server-Sent Events under ASGI (WSGI answers single polls); a stream ends
+# after MAX_SECONDS and the browser resumes it
+LIVE_EVENT_RETENTION = int(os.getenv('LIVE_EVENT_RETENTION', '600'))  # seconds events are kept for reconnects
+LIVE_STREAM_POLL_INTERVAL = float(os.getenv('LIVE_STREAM_POLL_INTERVAL', '1.0'))  # seconds
+LIVE_STREAM_MAX_SECONDS = int(os.getenv('LIVE_STREAM_MAX_SECONDS', '120'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -181,8 +279,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # File upload settings
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
+# Requests above this stream their file parts to disk (the bulk endpoint: into the
+# screenshot spool), and ASGI request bodies spill to a temporary file
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('DJANGO_FILE_UPLOAD_MAX_MEMORY_SIZE', '262144'))  # 256KB
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000
+DATA_UPLOAD_MAX_NUMBER_FILES = int(os.getenv('DJANGO_DATA_UPLOAD_MAX_NUMBER_FILES', '100'))  # screenshots per request
 
 # REST Framework settings
 REST_FRAMEWORK = {
@@ -194,6 +295,9 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    # Keyset pagination on (timestamp, id); deep pages cost the same as the first
+    'DEFAULT_PAGINATION_CLASS': 'dashboard.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
 # CORS settings